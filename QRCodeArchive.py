@@ -0,0 +1,171 @@
+"""历史记录保留策略和归档：过期记录按月追加到gzip压缩的NDJSON文件后分批删除，可在归档中搜索和恢复，不依赖GUI"""
+import os
+import glob
+import gzip
+import json
+import time
+
+import QRCodeHistory
+
+
+# 每批归档和删除的记录数（每批一个短事务，不长时间占用写锁）
+BATCH_SIZE = 1000
+
+# 归档文件名：按记录时间的年月分文件
+ARCHIVE_PREFIX = 'history_'
+ARCHIVE_SUFFIX = '.ndjson.gz'
+
+# 保存在db_info中的保留策略配置项
+POLICY_KEYS = ('retention_days', 'retention_rows')
+
+# 自动归档（空闲维护时）的最小间隔（秒）
+AUTO_INTERVAL = 24 * 3600
+
+
+def default_archive_dir(db_path) -> str:
+    """默认归档目录：数据库所在目录下的archives"""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), 'archives')
+
+
+def load_policy(store):
+    """读取保留策略(保留天数, 保留条数)，0表示不限"""
+    return tuple(int(store.get_info(key, 0) or 0) for key in POLICY_KEYS)
+
+
+def save_policy(store, max_age_days, max_rows):
+    with store.conn:
+        for key, value in zip(POLICY_KEYS, (max_age_days, max_rows)):
+            store.set_info(key, int(value or 0))
+
+
+def archive_path(archive_dir, month) -> str:
+    return os.path.join(archive_dir, f"{ARCHIVE_PREFIX}{month}{ARCHIVE_SUFFIX}")
+
+
+def archive_files(archive_dir):
+    """归档文件列表[(年月, 路径)]，按年月倒序（最新的在前）"""
+    files = []
+    for path in glob.glob(os.path.join(archive_dir, ARCHIVE_PREFIX + '*' + ARCHIVE_SUFFIX)):
+        month = os.path.basename(path)[len(ARCHIVE_PREFIX):-len(ARCHIVE_SUFFIX)]
+        files.append((month, path))
+    return sorted(files, reverse=True)
+
+
+def append_records(archive_dir, records):
+    """按年月把记录追加到归档文件（每次追加一个gzip成员并fsync，之后才能删除数据库中的记录）"""
+    months = {}
+    for record in records:
+        months.setdefault(record['timestamp'][:7], []).append(record)
+    os.makedirs(archive_dir, exist_ok=True)
+    for month, items in months.items():
+        data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in items).encode('utf-8')
+        with open(archive_path(archive_dir, month), 'ab') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6) as f:
+                f.write(data)
+            raw.flush()
+            os.fsync(raw.fileno())
+    return sorted(months)
+
+
+def apply_retention(db_path, archive_dir=None, max_age_days=None, max_rows=None, batch_size=BATCH_SIZE,
+                    progress=None, is_cancelled=None):
+    """按保留策略归档并删除过期记录（使用独立连接，可在后台线程调用）
+
+    max_age_days和max_rows都为None时使用数据库中保存的策略。每批先追加到归档文件并落盘，
+    再在一个事务中删除；中途退出时最多有一批记录既在归档中又在数据库中，
+    下次运行会再次归档，读取归档时按ID去重。progress(已归档, 总数)报告进度。
+    返回(归档条数, 涉及的年月列表)。
+    """
+    archive_dir = archive_dir or default_archive_dir(db_path)
+    store = QRCodeHistory.HistoryStore(db_path, check_same_thread=False)
+    try:
+        if max_age_days is None and max_rows is None:
+            max_age_days, max_rows = load_policy(store)
+        condition, params = store.expired_condition(max_age_days, max_rows)
+        months = set()
+        archived = 0
+        if condition:
+            total = store.conn.execute(f"SELECT COUNT(*) FROM history WHERE {condition}", params).fetchone()[0]
+            while archived < total and not (is_cancelled and is_cancelled()):
+                rows = store.expired_rows(condition, params, batch_size)
+                if not rows:
+                    break
+                ids = [row[0] for row in rows]
+                symbols = store.symbols_for(ids)
+                records = [{'id': id, 'timestamp': timestamp, 'content': content, 'image_path': image_path,
+                            'code_type': code_type, 'image_digest': digest, 'symbols': symbols.get(id, [])}
+                           for id, timestamp, content, image_path, code_type, digest in rows]
+                months.update(append_records(archive_dir, records))
+                store.delete_ids(ids)
+                archived += len(rows)
+                if progress:
+                    progress(archived, total)
+        with store.conn:
+            store.set_info('retention_last_run', int(time.time()))
+        return archived, sorted(months)
+    finally:
+        store.close()
+
+
+def apply_due_retention(db_path, archive_dir=None, is_cancelled=None):
+    """设置了保留策略且距上次归档超过AUTO_INTERVAL时按保存的策略归档（空闲维护时调用），返回归档条数"""
+    store = QRCodeHistory.HistoryStore(db_path, check_same_thread=False)
+    try:
+        policy = load_policy(store)
+        last_run = int(store.get_info('retention_last_run', 0) or 0)
+    finally:
+        store.close()
+    if not any(policy) or time.time() - last_run < AUTO_INTERVAL:
+        return 0
+    return apply_retention(db_path, archive_dir, *policy, is_cancelled=is_cancelled)[0]
+
+
+def iter_archive(path):
+    """逐条读取归档文件中的记录（末尾不完整的gzip成员会被忽略）"""
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield line
+    except (EOFError, gzip.BadGzipFile):
+        return  # 归档时中途退出留下的不完整数据
+
+
+def search_archives(archive_dir, query='', months=None, limit=200, is_cancelled=None):
+    """在归档中按内容搜索（空格分隔的词都要出现，不区分大小写），从最新的月份开始，返回记录列表
+
+    months为年月列表时只搜索这些月份；结果按ID去重，最多limit条。
+    """
+    terms = [term.lower() for term in query.split()]
+    # 粗筛在JSON编码后的原始行上进行，搜索词也按json.dumps的方式转义（引号、反斜杠、控制字符）
+    encoded_terms = [json.dumps(term, ensure_ascii=False)[1:-1] for term in terms]
+    seen = set()
+    results = []
+    for month, path in archive_files(archive_dir):
+        if months and month not in months:
+            continue
+        for line in iter_archive(path):
+            if is_cancelled and is_cancelled():
+                return results
+            # 先在原始行上粗筛，命中后再解析JSON并检查内容
+            lowered = line.lower()
+            if not all(term in lowered for term in encoded_terms):
+                continue
+            record = json.loads(line)
+            content = (record['content'] or '').lower()
+            if record['id'] in seen or not all(term in content for term in terms):
+                continue
+            seen.add(record['id'])
+            results.append(record)
+            if len(results) >= limit:
+                return results
+    return results
+
+
+def restore_records(db_path, records) -> int:
+    """把归档记录按原ID恢复到数据库，返回恢复条数（已存在的跳过）"""
+    store = QRCodeHistory.HistoryStore(db_path)
+    try:
+        return store.restore(records)
+    finally:
+        store.close()
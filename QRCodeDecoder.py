@@ -1,17 +1,101 @@
+import time
+_START = time.perf_counter()    # 启动计时起点（--startup-profile）
+
 import sys
-import sqlite3
 import os
-import csv
 import json
-import datetime
+import random
+import argparse
+import importlib
+import threading
+from collections import OrderedDict
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, 
                             QWidget, QLabel, QPushButton, QTextEdit, QFileDialog, 
-                            QMessageBox, QListWidget, QSplitter, QStatusBar,QListWidgetItem)
-from PyQt5.QtGui import QIcon, QPixmap, QColor, QPalette, QImage
-from PyQt5.QtCore import Qt, QSize,QTimer
-import cv2
-from pyzbar.pyzbar import decode
-import numpy as np
+                            QMessageBox, QListView, QSplitter, QStatusBar,
+                            QProgressBar, QAbstractItemView, QCheckBox, QLineEdit, QComboBox,
+                            QDialog, QTableWidget, QTableWidgetItem, QHeaderView,
+                            QSpinBox, QListWidget, QListWidgetItem)
+from PyQt5.QtGui import QIcon, QPixmap, QColor, QPalette, QImage, QPainter, QPen, QPolygonF, QFont
+from PyQt5.QtCore import (Qt, QSize,QTimer, QObject, QRunnable, QThreadPool, pyqtSignal,
+                          QAbstractListModel, QModelIndex, QItemSelectionModel, QPointF, QRectF)
+_QT_IMPORTED = time.perf_counter()
+
+import QRCodeHistory
+import QRCodeArchive
+import QRCodeMetrics as metrics
+
+
+class LazyModule:
+    """首次访问属性时才导入的模块（线程安全），用于把OpenCV、pyzbar、numpy的导入推迟到窗口显示之后"""
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+        self.load_time = None   # 导入耗时（秒），未导入时为None
+
+    def load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    self.load_time = time.perf_counter() - start
+                    self._module = module
+        return self._module
+
+    def __getattr__(self, name):
+        value = getattr(self.load(), name)
+        setattr(self, name, value)  # 之后直接从实例字典读取，不再经过__getattr__
+        return value
+
+
+# 解码相关模块按需导入：窗口显示后由PrewarmWorker在后台预先导入，首次解码前已就绪
+np = LazyModule('numpy')
+QRCodeEngine = LazyModule('QRCodeEngine')
+QRCodeDocument = LazyModule('QRCodeDocument')
+QRCodeStream = LazyModule('QRCodeStream')
+LAZY_MODULES = (np, QRCodeEngine, QRCodeDocument, QRCodeStream)
+
+
+class StartupProfile:
+    """启动各阶段的时间点（--startup-profile时输出到标准错误）"""
+    def __init__(self):
+        self.enabled = False
+        self.marks = [('导入PyQt5', _QT_IMPORTED)]
+        self.pending = set()
+
+    def mark(self, name):
+        self.marks.append((name, time.perf_counter()))
+
+    def wait_for(self, *names):
+        """报告需要等待的后台阶段"""
+        self.pending.update(names)
+
+    def done(self, name):
+        """后台阶段完成，全部完成后输出报告"""
+        self.mark(name)
+        self.pending.discard(name)
+        if self.enabled and not self.pending:
+            sys.stderr.write(self.report())
+            sys.stderr.flush()
+
+    def report(self) -> str:
+        lines = ["启动耗时（从模块开始执行计时，毫秒）:"]
+        for name, moment in self.marks:
+            lines.append(f"  {name:<16} {(moment - _START) * 1000:8.1f}")
+        for module in LAZY_MODULES:
+            if module.load_time is not None:
+                lines.append(f"  导入 {module._name:<12} {module.load_time * 1000:8.1f}（后台）")
+        return "\n".join(lines) + "\n"
+
+
+startup = StartupProfile()
+startup.mark('导入本模块')
+
+
+# 空闲维护的检查间隔，以及距上次操作多久视为空闲（秒）
+IDLE_MAINTENANCE_INTERVAL = 300
+IDLE_SECONDS = 60
 
 
 class ProjectInfo:
@@ -86,15 +170,785 @@ class MacaronColors:
             cls.APPLE_GREEN, cls.LILAC_MIST, cls.BUTTER_CREAM,
             cls.TARO_PURPLE, cls.CARAMEL_CREAM
         ]
-        return colors[np.random.randint(0, len(colors))]
+        return random.choice(colors)
+
+
+def load_thumbnails(cache, digests, size):
+    """后台线程：批量读取缩略图并缩放为列表图标大小的QImage{digest: QImage}"""
+    images = {}
+    with metrics.timer('thumbnail_load'):
+        for digest, data in cache.get_many(digests).items():
+            image = QImage.fromData(data)
+            if not image.isNull():
+                images[digest] = image.scaled(size, size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    return images
+
+
+class HistoryModel(QAbstractListModel):
+    """按页从数据库加载的历史记录模型（只保存ID、显示文本、收藏状态和图片哈希）
+
+    缩略图图标按需加载：视图只为可见行请求DecorationRole，请求先攒成一批，
+    由后台线程一次读出，加载完成前显示空白占位图标。
+    """
+    PAGE_SIZE = 200
+    ICON_SIZE = 48
+    ICON_CACHE = 512        # 内存中最多保留的图标数
+    IdRole = Qt.UserRole
+    FavoriteRole = Qt.UserRole + 1
+    DigestRole = Qt.UserRole + 2
+
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.rows = []           # [id, 显示文本, 是否收藏, 图片哈希]
+        self.last_key = None     # 已加载的最后一行排序键，用于键集分页
+        self.exhausted = False
+        self.query = ""          # 当前搜索条件
+        self.thumbnails = None   # QRCodeHistory.ThumbnailCache
+        self.icons = OrderedDict()      # 图片哈希 -> QIcon（LRU）
+        self.no_thumbnail = set()       # 已确认没有缩略图的哈希
+        self.icon_requests = set()      # 等待加载的哈希
+        self.icon_loading = False
+        self.placeholder = None
+        self.icon_timer = QTimer(self)
+        self.icon_timer.setSingleShot(True)
+        self.icon_timer.setInterval(30)     # 滚动时把同一批可见行的请求合并
+        self.icon_timer.timeout.connect(self.load_icons)
+
+    def set_thumbnails(self, cache):
+        self.thumbnails = cache
+
+    def reload(self):
+        """丢弃已加载的行，视图会按需重新分页加载"""
+        self.beginResetModel()
+        self.rows = []
+        self.last_key = None
+        self.exhausted = False
+        self.endResetModel()
+
+    def set_query(self, query):
+        """设置搜索条件并重新分页加载"""
+        self.query = query.strip()
+        self.reload()
+
+    @staticmethod
+    def make_text(timestamp, content):
+        """生成列表显示文本（多个码的内容合为一行，截断到100个字符）"""
+        content = (content or "").replace('\n', ' ')
+        return f"{timestamp}: {content[:100]}{'...' if len(content) > 100 else ''}"
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and not self.exhausted and self.store is not None
+
+    def set_store(self, store):
+        """数据库在后台打开完成后设置，之后按需分页加载"""
+        self.store = store
+        self.reload()
+
+    def fetchMore(self, parent):
+        """加载下一页（按收藏、时间倒序，使用键集分页避免OFFSET扫描）"""
+        if parent.isValid() or self.exhausted or self.store is None:
+            return
+        with metrics.timer('list_refresh'):
+            self._fetch_page()
+
+    def _fetch_page(self):
+        records = self.store.list_page(self.last_key, self.PAGE_SIZE, query=self.query)
+
+        if len(records) < self.PAGE_SIZE:
+            self.exhausted = True
+        if not records:
+            return
+        id, timestamp, content, is_favorite, _ = records[-1]
+        self.last_key = (is_favorite, timestamp, id)
+
+        first = len(self.rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(records) - 1)
+        self.rows.extend(
+            [id, self.make_text(timestamp, content), bool(is_favorite), digest]
+            for id, timestamp, content, is_favorite, digest in records
+        )
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.rows):
+            return None
+        id, text, is_favorite, digest = self.rows[index.row()]
+        if role == Qt.DisplayRole:
+            return text
+        if role == Qt.DecorationRole:
+            return self.icon(digest)
+        if role == Qt.BackgroundRole:
+            # 设置交替颜色，收藏项优先使用黄色
+            if is_favorite:
+                return MacaronColors.LEMON_YELLOW
+            # 使用模运算循环颜色列表
+            return MacaronColors.COLOR_CYCLE[index.row() % len(MacaronColors.COLOR_CYCLE)]
+        if role == Qt.ForegroundRole:
+            # 设置文字颜色与背景形成对比
+            return QColor(60, 60, 60)  # 深灰色文字
+        if role == self.IdRole:
+            return id
+        if role == self.FavoriteRole:
+            return is_favorite
+        if role == self.DigestRole:
+            return digest
+        return None
+
+    def icon(self, digest):
+        """返回缓存的缩略图图标；未加载时登记请求并先返回占位图标（保持各行文字对齐）"""
+        if self.thumbnails is None:
+            return None
+        icon = self.icons.get(digest)
+        if icon is not None:
+            self.icons.move_to_end(digest)
+            return icon
+        if digest and digest not in self.no_thumbnail:
+            self.icon_requests.add(digest)
+            if not self.icon_loading and not self.icon_timer.isActive():
+                self.icon_timer.start()
+        if self.placeholder is None:
+            pixmap = QPixmap(self.ICON_SIZE, self.ICON_SIZE)
+            pixmap.fill(Qt.transparent)
+            self.placeholder = QIcon(pixmap)
+        return self.placeholder
+
+    def load_icons(self):
+        """在后台读取一批缩略图"""
+        digests, self.icon_requests = list(self.icon_requests), set()
+        if not digests:
+            return
+        self.icon_loading = True
+        worker = BackgroundCall(lambda: load_thumbnails(self.thumbnails, digests, self.ICON_SIZE))
+        worker.signals.finished.connect(lambda images: self.on_icons_loaded(digests, images))
+        worker.signals.error.connect(lambda error: self.on_icons_loaded(digests, {}))
+        QThreadPool.globalInstance().start(worker)
+
+    def on_icons_loaded(self, digests, images):
+        self.icon_loading = False
+        for digest in digests:
+            if digest in images:
+                self.icons[digest] = QIcon(QPixmap.fromImage(images[digest]))
+            else:
+                self.no_thumbnail.add(digest)
+        while len(self.icons) > self.ICON_CACHE:
+            self.icons.popitem(last=False)
+        loaded = set(digests)
+        rows = [row for row, item in enumerate(self.rows) if item[3] in loaded]
+        if rows:
+            self.dataChanged.emit(self.index(rows[0]), self.index(rows[-1]), [Qt.DecorationRole])
+        if self.icon_requests:
+            self.load_icons()
+
+    def add_record(self, id):
+        """新增记录时增量插入到非收藏项的最前面，不重新加载整个列表"""
+        if self.query:
+            return  # 搜索结果中不插入新记录，清空搜索后会重新加载
+        record = self.store.get(id)
+        if record is None:
+            return
+        timestamp, content, _, digest = record
+        self.no_thumbnail.discard(digest)   # 新识别的图片刚生成了缩略图
+        position = 0
+        while position < len(self.rows) and self.rows[position][2]:
+            position += 1
+        if position == len(self.rows) and not self.exhausted:
+            return  # 收藏项还没加载完，新记录会在后续分页中出现
+        self.beginInsertRows(QModelIndex(), position, position)
+        self.rows.insert(position, [id, self.make_text(timestamp, content), False, digest])
+        self.endInsertRows()
+
+
+def qimage_to_gray(qimage):
+    """把QImage转换为灰度ndarray视图（按bytesPerLine处理行对齐，不经过RGB/BGR中间拷贝）
+
+    返回(灰度QImage, ndarray)，数组直接引用QImage的内存，使用期间需保持QImage存活。
+    """
+    if qimage.isNull() or qimage.width() <= 0 or qimage.height() <= 0:
+        raise ValueError("剪贴板图片无效")
+    if qimage.format() != QImage.Format_Grayscale8:
+        qimage = qimage.convertToFormat(QImage.Format_Grayscale8)
+        if qimage.isNull():
+            raise ValueError("图片格式转换失败")
+    
+    width, height, bytes_per_line = qimage.width(), qimage.height(), qimage.bytesPerLine()
+    buffer = qimage.constBits()
+    if buffer is None:
+        raise ValueError("无法获取图片数据")
+    buffer.setsize(bytes_per_line * height)
+    gray = np.ndarray((height, width), dtype=np.uint8, buffer=buffer, strides=(bytes_per_line, 1))
+    return qimage, gray
+
+
+def ndarray_to_qimage(img):
+    """把BGR或灰度ndarray零拷贝地包装为QImage（调用方需保证数组在使用期间存活）"""
+    height, width = img.shape[:2]
+    fmt = QImage.Format_Grayscale8 if img.ndim == 2 else QImage.Format_BGR888
+    return QImage(img.data, width, height, img.strides[0], fmt)
+
+
+class ImageLoadSignals(QObject):
+    """图片加载任务的信号"""
+    finished = pyqtSignal(int, object)    # 任务ID, LoadedImage
+    error = pyqtSignal(int, str)          # 任务ID, 错误信息
+
+
+class ImageLoadWorker(QRunnable):
+    """在线程池中读取图片文件：只解码一次，同时生成内容哈希和预览图"""
+    def __init__(self, job_id, path, preview_size):
+        super().__init__()
+        self.job_id = job_id
+        self.path = path
+        self.preview_size = preview_size
+        self.signals = ImageLoadSignals()
+
+    def run(self):
+        try:
+            if QRCodeDocument.is_document(self.path):
+                # 多页文档只读取第一页用于预览，解码时再逐页读取
+                loaded = QRCodeDocument.load_first_page(
+                    self.path, self.preview_size.width(), self.preview_size.height())
+            else:
+                loaded = QRCodeEngine.load_for_display(
+                    self.path, self.preview_size.width(), self.preview_size.height())
+            self.signals.finished.emit(self.job_id, loaded)
+        except Exception as e:
+            self.signals.error.emit(self.job_id, str(e))
+
+
+class TaskSignals(QObject):
+    """后台数据库任务的信号"""
+    progress = pyqtSignal(int, int)       # 已完成, 总数
+    finished = pyqtSignal(object)         # 任务返回值（取消时为None）
+    error = pyqtSignal(str)               # 错误信息
+
+
+class TaskWorker(QRunnable):
+    """在线程池中执行导出、备份等耗时数据库任务
+
+    func需接受progress(已完成, 总数)和is_cancelled()两个关键字参数。
+    """
+    def __init__(self, func, *args, **kwargs):
+        super().__init__()
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.cancelled = False
+        self.signals = TaskSignals()
+
+    def cancel(self):
+        """请求取消（由任务函数在分块之间检查）"""
+        self.cancelled = True
+
+    def run(self):
+        try:
+            result = self.func(
+                *self.args,
+                progress=self.signals.progress.emit,
+                is_cancelled=lambda: self.cancelled,
+                **self.kwargs
+            )
+            self.signals.finished.emit(result)
+        except Exception as e:
+            self.signals.error.emit(str(e))
+
+
+class BackgroundCall(QRunnable):
+    """在线程池中执行的无进度后台调用（启动时打开数据库和预先导入解码依赖、空闲维护），结果通过TaskSignals返回"""
+    def __init__(self, func):
+        super().__init__()
+        self.func = func
+        self.signals = TaskSignals()
+
+    def run(self):
+        try:
+            self.signals.finished.emit(self.func())
+        except Exception as e:
+            self.signals.error.emit(str(e))
+
+
+def open_history_store():
+    """打开历史记录数据库（大数据库首次运行新版本时的结构迁移可能较慢，放在后台执行）"""
+    return QRCodeHistory.HistoryStore(QRCodeHistory.DB_FILE, check_same_thread=False)
+
+
+def prewarm_decoder():
+    """导入OpenCV、pyzbar、numpy等解码依赖并打开解码结果缓存"""
+    for module in LAZY_MODULES:
+        module.load()
+    QRCodeEngine.get_decoder_chain()    # 创建默认后端时导入pyzbar
+    return QRCodeEngine.DecodeCache(QRCodeHistory.DB_FILE)
+
+
+class DecodeSignals(QObject):
+    """解码任务的信号（QRunnable本身不能定义信号）"""
+    progress = pyqtSignal(int, int, str)          # 任务ID, 进度百分比, 说明
+    finished = pyqtSignal(int, object, str)       # 任务ID, DecodeResult, 图片内容哈希（未计算时为空）
+    error = pyqtSignal(int, str)                  # 任务ID, 错误信息
+
+
+class DecodeWorker(QRunnable):
+    """在线程池中执行解码，通过信号把结果送回主线程（标记由PreviewLabel在显示时绘制）"""
+    def __init__(self, job_id, source, cache=None, thumbnails=None):
+        super().__init__()
+        self.job_id = job_id
+        self.source = source
+        self.cache = cache
+        self.thumbnails = thumbnails
+        self.cancelled = False
+        self.signals = DecodeSignals()
+
+    def cancel(self):
+        """请求取消（在各阶段之间检查）"""
+        self.cancelled = True
+
+    def run(self):
+        try:
+            # 文件图片在加载时已解码为数组并算好内容哈希，这里直接复用
+            self.signals.progress.emit(self.job_id, 10, "正在准备图片...")
+            if isinstance(self.source, QRCodeEngine.LoadedImage) and QRCodeDocument.is_document(self.source.path):
+                self.run_document()
+                return
+            if isinstance(self.source, QRCodeEngine.LoadedImage):
+                img, digest = self.source.image, self.source.digest
+            else:
+                # 剪贴板原图：gray_image持有数组引用的内存，必须在解码结束前保持存活
+                gray_image, img = qimage_to_gray(self.source)
+                # 启用缓存时本来就要按像素算哈希，提前算好供历史记录去重
+                digest = QRCodeEngine.content_hash(img) if self.cache else None
+
+            # 超大扫描图切成重叠分块并行解码，避免整图单次解码过慢和漏掉小码
+            tiles = None
+            if img.shape[0] * img.shape[1] >= QRCodeEngine.TILE_AUTO_PIXELS:
+                tiles = QRCodeEngine.TileConfig()
+
+            # 先按内容哈希查缓存，未命中时才真正解码
+            self.signals.progress.emit(self.job_id, 30, "正在分块解码..." if tiles else "正在解码...")
+            result = QRCodeEngine.decode_with_cache(img, self.cache, digest=digest, tiles=tiles)
+            if self.cancelled:
+                return
+            if result.symbols and digest and isinstance(self.source, QRCodeEngine.LoadedImage):
+                self.save_thumbnail(digest)
+
+            self.signals.progress.emit(self.job_id, 100, "解码完成")
+            self.signals.finished.emit(self.job_id, result, digest or '')
+        except Exception as e:
+            self.signals.error.emit(self.job_id, str(e))
+
+    def save_thumbnail(self, digest):
+        """由已缩小的预览图生成历史记录缩略图（已缓存时跳过），要在写入历史记录前完成"""
+        if self.thumbnails is None:
+            return
+        try:
+            if not self.thumbnails.contains(digest):
+                self.thumbnails.put(digest, QRCodeEngine.make_thumbnail(self.source.preview))
+        except Exception:
+            pass    # 缩略图只用于列表显示，失败不影响解码结果
+
+    def run_document(self):
+        """多页文档：逐页读取并解码（同时只处理少量页面）"""
+        def progress(page, total):
+            self.signals.progress.emit(self.job_id, 10 + 85 * page // total, f"正在解码第 {page}/{total} 页...")
+
+        result = QRCodeDocument.decode_document(
+            self.source.path, progress=progress, is_cancelled=lambda: self.cancelled)
+        if self.cancelled:
+            return
+        self.signals.progress.emit(self.job_id, 100, "解码完成")
+        self.signals.finished.emit(self.job_id, result, '')
+
+
+class StreamSignals(QObject):
+    """视频流解码任务的信号"""
+    frame = pyqtSignal(object, object, float)   # 预览QImage, 该帧的DecodedSymbol列表, 预览相对原帧的缩放比例
+    found = pyqtSignal(int, object)     # 帧序号, 去重后新出现的DecodedSymbol列表
+    stats = pyqtSignal(object)          # StreamStats
+    finished = pyqtSignal(object)       # 最终的StreamStats
+    error = pyqtSignal(str)
+
+
+class StreamWorker(QRunnable):
+    """在线程池中读取视频文件或摄像头并逐帧解码，预览按固定间隔节流发送"""
+    PREVIEW_INTERVAL = 1 / 15   # 预览最多每秒刷新15次
+    STATS_INTERVAL = 0.5
+
+    def __init__(self, source, preview_size, max_skip=8):
+        super().__init__()
+        self.source = source
+        self.preview_size = preview_size
+        self.max_skip = max_skip
+        self.cancelled = False
+        self.stats = QRCodeStream.StreamStats()
+        self.signals = StreamSignals()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        try:
+            last_preview = last_stats = 0.0
+            for frame in QRCodeStream.iter_stream(self.source, max_skip=self.max_skip, stats=self.stats,
+                                                  is_cancelled=lambda: self.cancelled):
+                if frame.new_symbols:
+                    self.signals.found.emit(frame.index, frame.new_symbols)
+                now = time.perf_counter()
+                if now - last_preview >= self.PREVIEW_INTERVAL:
+                    last_preview = now
+                    # 标记由PreviewLabel绘制，这里只缩小；copy()让QImage不再引用帧数组
+                    preview, scale = QRCodeEngine.make_preview(frame.image, *self.preview_size, upscale=False)
+                    self.signals.frame.emit(ndarray_to_qimage(preview).copy(), frame.symbols, scale)
+                if now - last_stats >= self.STATS_INTERVAL:
+                    last_stats = now
+                    self.signals.stats.emit(self.stats)
+            self.signals.finished.emit(self.stats)
+        except Exception as e:
+            self.signals.error.emit(str(e))
+
+
+def convex_hull(points):
+    """点集的凸包（单调链算法，条形码的多边形点较多时只画外轮廓）"""
+    points = sorted(set(map(tuple, points)))
+    if len(points) <= 2:
+        return points
+
+    def half(points):
+        hull = []
+        for p in points:
+            while len(hull) >= 2 and ((hull[-1][0] - hull[-2][0]) * (p[1] - hull[-2][1])
+                                      - (hull[-1][1] - hull[-2][1]) * (p[0] - hull[-2][0])) <= 0:
+                hull.pop()
+            hull.append(p)
+        return hull[:-1]
+
+    return half(points) + half(points[::-1])
+
+
+class PreviewLabel(QLabel):
+    """图片预览：按控件大小缓存缩放后的图，识别结果用QPainter在显示坐标中矢量绘制
+
+    设置的图片不会被修改或复制，缩放图只在控件大小变化时重新生成；
+    标记随窗口缩放保持清晰，也适用于未缩小的剪贴板原图。小图默认按原尺寸显示，不做平滑放大。
+    """
+    MARGIN = 10
+    CACHE_SIZES = 4     # 保留最近几种尺寸的缩放图（最大化/还原切换时不必重新缩放）
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.image = None       # 显示用的QImage（预览图或剪贴板原图）
+        self.scale = 1.0        # image相对原图的缩放比例（识别结果的坐标基于原图）
+        self.symbols = []
+        self.upscale = False    # 小于控件的图片是否放大到铺满（放大时用最近邻插值，码的边缘保持锐利）
+        self.scaled_cache = OrderedDict()   # 显示尺寸 -> QPixmap（按原尺寸显示时键为None）
+
+    def set_image(self, image, scale=1.0, symbols=(), upscale=False):
+        """显示新图片（image需在显示期间保持不变），symbols为要标记的识别结果"""
+        self.image = image
+        self.scale = scale
+        self.symbols = list(symbols)
+        self.upscale = upscale
+        self.scaled_cache.clear()
+        super().clear()
+        self.update()
+
+    def set_symbols(self, symbols):
+        """只更新标记，不重新缩放图片"""
+        self.symbols = list(symbols)
+        self.update()
+
+    def clear(self):
+        self.image = None
+        self.symbols = []
+        self.scaled_cache.clear()
+        super().clear()
+
+    def scaled_pixmap(self):
+        """当前控件大小下的缩放图（每种尺寸只缩放一次）"""
+        size = self.contentsRect().size() - QSize(2 * self.MARGIN, 2 * self.MARGIN)
+        fits = self.image.width() <= size.width() and self.image.height() <= size.height()
+        # 能完整显示的图片不放大，各种控件尺寸共用一张原尺寸的图
+        key = None if fits and not self.upscale else (size.width(), size.height())
+        pixmap = self.scaled_cache.get(key)
+        if pixmap is None:
+            with metrics.timer('pixmap_scale'):
+                if key is None:
+                    pixmap = QPixmap.fromImage(self.image)
+                else:
+                    # 先在QImage上缩放再转换，不为原图创建全尺寸的QPixmap；放大时平滑插值会让码的边缘发虚
+                    mode = Qt.FastTransformation if fits else Qt.SmoothTransformation
+                    pixmap = QPixmap.fromImage(self.image.scaled(size, Qt.KeepAspectRatio, mode))
+            self.scaled_cache[key] = pixmap
+            while len(self.scaled_cache) > self.CACHE_SIZES:
+                self.scaled_cache.popitem(last=False)
+        else:
+            self.scaled_cache.move_to_end(key)
+        return pixmap
+
+    def paintEvent(self, event):
+        super().paintEvent(event)   # 背景和边框（样式表）
+        if self.image is None or self.image.isNull() or min(self.width(), self.height()) <= 3 * self.MARGIN:
+            return
+        pixmap = self.scaled_pixmap()
+        rect = self.contentsRect()
+        x = rect.x() + (rect.width() - pixmap.width()) / 2
+        y = rect.y() + (rect.height() - pixmap.height()) / 2
+        painter = QPainter(self)
+        painter.drawPixmap(int(x), int(y), pixmap)
+        if self.symbols:
+            with metrics.timer('annotate'):
+                factor = pixmap.width() / self.image.width() * self.scale
+                self.draw_symbols(painter, x, y, factor)
+        painter.end()
+
+    def draw_symbols(self, painter, x0, y0, factor):
+        """在显示坐标中绘制每个码的轮廓和序号"""
+        painter.setRenderHint(QPainter.Antialiasing)
+        font = QFont(self.font())
+        font.setBold(True)
+        font.setPixelSize(16)
+        painter.setFont(font)
+        for i, symbol in enumerate(self.symbols):
+            points = convex_hull(symbol.polygon) if len(symbol.polygon) > 4 else []
+            painter.setPen(QPen(QColor(0, 200, 0), 2))
+            if len(points) >= 3:
+                painter.drawPolygon(QPolygonF([QPointF(x0 + px * factor, y0 + py * factor) for px, py in points]))
+            else:
+                rx, ry, rw, rh = symbol.rect
+                painter.drawRect(QRectF(x0 + rx * factor, y0 + ry * factor, rw * factor, rh * factor))
+            painter.setPen(QColor(230, 0, 0))
+            painter.drawText(QPointF(x0 + symbol.rect[0] * factor, y0 + symbol.rect[1] * factor - 6), str(i + 1))
+
+
+class DiagnosticsDialog(QDialog):
+    """诊断面板：各处理阶段最近耗时的分位数和分布、解码后端统计，可导出指标"""
+    SPARK = "▁▂▃▄▅▆▇█"
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("诊断")
+        self.resize(760, 420)
+        layout = QVBoxLayout(self)
+
+        option_layout = QHBoxLayout()
+        self.enable_check = QCheckBox("启用性能统计")
+        self.enable_check.setChecked(metrics.is_enabled())
+        self.enable_check.toggled.connect(metrics.enable)
+        option_layout.addWidget(self.enable_check)
+        option_layout.addStretch()
+        for text, handler in (("重置", self.reset), ("导出JSON", lambda: self.export('json')),
+                              ("导出Prometheus", lambda: self.export('prom'))):
+            button = QPushButton(text)
+            button.clicked.connect(handler)
+            option_layout.addWidget(button)
+        layout.addLayout(option_layout)
+
+        self.table = QTableWidget(0, 7)
+        self.table.setHorizontalHeaderLabels(["阶段", "次数", "P50(ms)", "P90(ms)", "P99(ms)", "最大(ms)", "分布（最近）"])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.verticalHeader().hide()
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        self.backend_label = QLabel()
+        layout.addWidget(self.backend_label)
+
+        # 面板打开时每秒刷新一次
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.start(1000)
+        self.refresh()
+
+    @classmethod
+    def sparkline(cls, counts):
+        """把分桶计数画成一行字符（只显示有数据的区间）"""
+        nonzero = [i for i, count in enumerate(counts) if count]
+        if not nonzero:
+            return ""
+        counts = counts[nonzero[0]:nonzero[-1] + 1]
+        peak = max(counts)
+        return "".join(cls.SPARK[(count * 8 - 1) // peak] if count else " " for count in counts)
+
+    def refresh(self):
+        snapshot = metrics.registry.snapshot()
+        names = [name for name in metrics.STAGES if name in snapshot]
+        names += sorted(name for name in snapshot if name not in metrics.STAGES)
+        self.table.setRowCount(len(names))
+        for row, name in enumerate(names):
+            stats = snapshot[name]
+            values = [metrics.STAGES.get(name, name), str(stats['count']),
+                      f"{stats['p50_ms']:.2f}", f"{stats['p90_ms']:.2f}", f"{stats['p99_ms']:.2f}",
+                      f"{stats['max_ms']:.2f}", self.sparkline(stats['window_buckets'])]
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(value))
+        backends = QRCodeEngine.get_decoder_chain().stats.format_text()
+        self.backend_label.setText(backends or "尚无解码后端统计")
+
+    def reset(self):
+        metrics.registry.reset()
+        QRCodeEngine.get_decoder_chain().stats.reset()
+        self.refresh()
+
+    def export(self, fmt):
+        suffix = 'prom' if fmt == 'prom' else 'json'
+        file_path, _ = QFileDialog.getSaveFileName(self, "导出指标", f"metrics.{suffix}", f"指标文件 (*.{suffix})")
+        if file_path:
+            if not file_path.endswith('.' + suffix):
+                file_path += '.' + suffix
+            metrics.registry.dump(file_path)
+
+
+class ArchiveDialog(QDialog):
+    """归档面板：设置保留策略、立即归档过期记录、在归档中搜索并恢复记录"""
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.setWindowTitle("历史记录归档")
+        self.resize(720, 480)
+        self.main = parent
+        self.archive_dir = QRCodeArchive.default_archive_dir(parent.store.db_path)
+        self.search_worker = None
+        layout = QVBoxLayout(self)
+
+        # 保留策略（0表示不限；收藏的记录不会被归档）
+        days, rows = QRCodeArchive.load_policy(parent.store)
+        policy_layout = QHBoxLayout()
+        policy_layout.addWidget(QLabel("保留天数"))
+        self.days_spin = QSpinBox()
+        self.days_spin.setRange(0, 36500)
+        self.days_spin.setSpecialValueText("不限")
+        self.days_spin.setValue(days)
+        policy_layout.addWidget(self.days_spin)
+        policy_layout.addWidget(QLabel("保留条数"))
+        self.rows_spin = QSpinBox()
+        self.rows_spin.setRange(0, 100000000)
+        self.rows_spin.setSingleStep(1000)
+        self.rows_spin.setSpecialValueText("不限")
+        self.rows_spin.setValue(rows)
+        policy_layout.addWidget(self.rows_spin)
+        policy_layout.addStretch()
+        save_button = QPushButton("保存策略")
+        save_button.clicked.connect(self.save_policy)
+        policy_layout.addWidget(save_button)
+        archive_button = QPushButton("立即归档")
+        archive_button.clicked.connect(self.archive_now)
+        policy_layout.addWidget(archive_button)
+        layout.addLayout(policy_layout)
+
+        search_layout = QHBoxLayout()
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("在归档中搜索内容（空格分隔多个词）")
+        self.search_edit.returnPressed.connect(self.search)
+        search_layout.addWidget(self.search_edit)
+        self.search_button = QPushButton("搜索归档")
+        self.search_button.clicked.connect(self.search)
+        search_layout.addWidget(self.search_button)
+        layout.addLayout(search_layout)
+
+        self.result_list = QListWidget()
+        self.result_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        layout.addWidget(self.result_list)
+
+        bottom_layout = QHBoxLayout()
+        self.info_label = QLabel(f"归档目录: {self.archive_dir}")
+        bottom_layout.addWidget(self.info_label)
+        bottom_layout.addStretch()
+        restore_button = QPushButton("恢复选中")
+        restore_button.clicked.connect(self.restore_selected)
+        bottom_layout.addWidget(restore_button)
+        layout.addLayout(bottom_layout)
+
+    def save_policy(self):
+        QRCodeArchive.save_policy(self.main.store, self.days_spin.value(), self.rows_spin.value())
+        self.info_label.setText("保留策略已保存，空闲时每天自动归档一次")
+
+    def archive_now(self):
+        days, rows = self.days_spin.value(), self.rows_spin.value()
+        if not days and not rows:
+            QMessageBox.warning(self, "警告", "请先设置保留天数或保留条数")
+            return
+
+        def finished(result):
+            count, months = result
+            self.info_label.setText(f"已归档 {count} 条记录" + (f"（{', '.join(months)}）" if months else ""))
+            self.main.load_history()
+            self.main.refresh_export_types()
+
+        worker = TaskWorker(QRCodeArchive.apply_retention, self.main.store.db_path, self.archive_dir, days, rows)
+        self.main.start_task(worker, "正在归档历史记录...", finished, "归档失败")
+
+    def search(self):
+        """在后台搜索归档（归档文件较大时解压需要一些时间）"""
+        if self.search_worker is not None:
+            return
+        query = self.search_edit.text()
+
+        def finished(records):
+            self.search_worker = None
+            self.search_button.setEnabled(True)
+            self.result_list.clear()
+            for record in records:
+                preview = (record['content'] or '').replace('\n', ' ')[:100]
+                item = QListWidgetItem(f"{record['timestamp']}  {preview}")
+                item.setData(Qt.UserRole, record)
+                self.result_list.addItem(item)
+            self.info_label.setText(f"找到 {len(records)} 条归档记录")
+
+        def failed(error):
+            self.search_worker = None
+            self.search_button.setEnabled(True)
+            QMessageBox.critical(self, "搜索失败", error)
+
+        self.search_worker = BackgroundCall(lambda: QRCodeArchive.search_archives(self.archive_dir, query))
+        self.search_worker.signals.finished.connect(finished)
+        self.search_worker.signals.error.connect(failed)
+        self.search_button.setEnabled(False)
+        self.info_label.setText("正在搜索归档...")
+        self.main.thread_pool.start(self.search_worker)
+
+    def restore_selected(self):
+        records = [item.data(Qt.UserRole) for item in self.result_list.selectedItems()]
+        if not records:
+            return
+        restored = QRCodeArchive.restore_records(self.main.store.db_path, records)
+        self.info_label.setText(f"已恢复 {restored} 条记录（{len(records) - restored} 条已在历史记录中）")
+        self.main.load_history()
 
 
 class QRCodeDecoder(QMainWindow):
     def __init__(self):
         super().__init__()
         
-        # 初始化数据库
-        self.init_db()
+        # 后台解码线程池（任务ID用于丢弃过期结果；视频流任务会长期占用一个线程）
+        self.thread_pool = QThreadPool()
+        self.thread_pool.setMaxThreadCount(3)
+        self.decode_job_id = 0
+        self.decode_worker = None
+        self.load_job_id = 0
+        self.load_worker = None
+        self.current_image = None
+        self.clipboard_image = None
+        self.stream_worker = None
+        self.stream_source = None
+        
+        # 数据库和解码缓存在窗口首次显示后于后台打开，期间识别的结果暂存在pending_history中
+        self.store = None
+        self.conn = None
+        self.cursor = None
+        self.decode_cache = None
+        self.thumbnail_cache = None
+        self.pending_history = []
+        self.startup_started = False
+
+        # 空闲维护：定期在后台做少量增量回收、PRAGMA optimize和到期的归档（最近有操作时跳过）
+        self.backup_keep = QRCodeHistory.BACKUP_KEEP
+        self.last_activity = time.monotonic()
+        self.maintenance_running = False
+        self.maintenance_cancelled = False
+        self.maintenance_timer = QTimer(self)
+        self.maintenance_timer.setInterval(IDLE_MAINTENANCE_INTERVAL * 1000)
+        self.maintenance_timer.timeout.connect(self.run_idle_maintenance)
         
         # 设置窗口属性
         self.setWindowTitle(f"{ProjectInfo.NAME} {ProjectInfo.VERSION}")
@@ -112,60 +966,84 @@ class QRCodeDecoder(QMainWindow):
         self.setAttribute(Qt.WA_AlwaysStackOnTop)
         QApplication.setAttribute(Qt.AA_EnableHighDpiScaling)
         QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps)
-        
-    def init_db(self):
-        """初始化SQLite数据库"""
-        self.conn = sqlite3.connect('qrcode_history.db')
+        startup.mark('创建主窗口')
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not self.startup_started:
+            # 等首次绘制完成后再开始后台初始化
+            self.startup_started = True
+            QTimer.singleShot(0, self.start_background_init)
+
+    def start_background_init(self):
+        """首次显示后在后台打开数据库并预先导入解码依赖"""
+        startup.mark('首次显示')
+        startup.wait_for('历史记录就绪', '解码依赖就绪')
+        self.status_bar.showMessage("正在加载历史记录...")
+
+        worker = BackgroundCall(open_history_store)
+        worker.signals.finished.connect(self.init_db)
+        worker.signals.error.connect(self.on_history_open_error)
+        self.thread_pool.start(worker)
+
+        worker = BackgroundCall(prewarm_decoder)
+        worker.signals.finished.connect(self.on_prewarm_finished)
+        worker.signals.error.connect(lambda error: startup.done('解码依赖就绪'))
+        self.thread_pool.start(worker)
+
+    def init_db(self, store):
+        """数据库已打开（表结构迁移和性能配置见QRCodeHistory）：加载历史并写入暂存的结果"""
+        self.store = store
+        self.conn = self.store.conn
         self.cursor = self.conn.cursor()
-        
-        # 检查表是否存在
-        self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='history'")
-        table_exists = self.cursor.fetchone()
-        
-        if table_exists:
-            # 检查现有表结构
-            self.cursor.execute("PRAGMA table_info(history)")
-            columns = [column[1] for column in self.cursor.fetchall()]
-            
-            # 添加缺失的列
-            if 'code_type' not in columns:
-                self.cursor.execute("ALTER TABLE history ADD COLUMN code_type TEXT")
-            if 'is_favorite' not in columns:
-                self.cursor.execute("ALTER TABLE history ADD COLUMN is_favorite BOOLEAN DEFAULT 0")
-        else:
-            # 创建新表
-            self.cursor.execute('''
-                CREATE TABLE history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    content TEXT,
-                    image_path TEXT,
-                    code_type TEXT,
-                    is_favorite BOOLEAN DEFAULT 0
-                )
-            ''')
-        
-        # 创建数据库信息表
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS db_info (
-                key TEXT PRIMARY KEY,
-                value TEXT
-            )
-        ''')
-        
-        # 检查是否需要初始化数据库信息
-        self.cursor.execute("SELECT value FROM db_info WHERE key='version'")
-        if not self.cursor.fetchone():
-            self.cursor.execute(
-                "INSERT INTO db_info (key, value) VALUES (?, ?)",
-                ('version', '1.0.0')
-            )
-            self.cursor.execute(
-                "INSERT INTO db_info (key, value) VALUES (?, ?)",
-                ('created_at', datetime.datetime.now().isoformat())
-            )
-        
-        self.conn.commit()
+        self.thumbnail_cache = QRCodeHistory.ThumbnailCache(self.store.db_path)
+        for content, image_path, symbols, digest in self.pending_history:
+            self.store.add_result(content, image_path, symbols, digest)
+        self.pending_history = []
+        self.history_model.set_thumbnails(self.thumbnail_cache)
+        self.history_model.set_store(self.store)
+        self.refresh_export_types()
+        self.load_history()
+        self.set_history_enabled(True)
+        self.maintenance_timer.start()
+        self.status_bar.showMessage("历史记录已加载", 2000)
+        startup.done('历史记录就绪')
+
+    def on_history_open_error(self, error):
+        startup.done('历史记录就绪')
+        QMessageBox.critical(self, "错误", f"无法打开历史记录数据库: {error}")
+
+    def on_prewarm_finished(self, cache):
+        """解码依赖已导入：启用结果缓存，码类型筛选框改用中文类型名"""
+        self.decode_cache = cache
+        if self.store is not None:
+            self.refresh_export_types()
+        startup.done('解码依赖就绪')
+
+    def refresh_export_types(self):
+        """按历史中实际出现过的码类型（附码数量）填充导出筛选框，保留当前选择"""
+        current = self.export_type_combo.currentData()
+        # 解码依赖导入前不为了类型名阻塞界面，先显示原始类型
+        names = QRCodeEngine.TYPE_MAPPING if QRCodeEngine.load_time is not None else {}
+        self.export_type_combo.clear()
+        self.export_type_combo.addItem("全部类型", None)
+        for code_type, count in self.store.symbol_types():
+            self.export_type_combo.addItem(f"{names.get(code_type, code_type)}（{count}）", code_type)
+        index = self.export_type_combo.findData(current)
+        self.export_type_combo.setCurrentIndex(max(index, 0))
+
+    def set_history_enabled(self, enabled):
+        """数据库打开前禁用历史记录相关控件"""
+        for widget in (self.history_search, self.history_list, self.backup_button, self.optimize_button,
+                       self.archive_button,
+                       self.export_csv_button, self.export_json_button, self.export_ndjson_button,
+                       self.export_type_combo, self.export_gzip_check, self.export_incremental_check,
+                       self.delete_button, self.favorite_button, self.select_all_button,
+                       self.clear_all_history_button):
+            widget.setEnabled(enabled)
+
+    def cache_stats_text(self):
+        return self.decode_cache.stats_text() if self.decode_cache else "缓存未就绪"
 
     
     def set_macron_style(self):
@@ -199,7 +1077,7 @@ class QRCodeDecoder(QMainWindow):
             QPushButton:pressed {
                 background-color: #d0d0d5;
             }
-            QTextEdit, QListWidget {
+            QTextEdit, QListView {
                 border: 1px solid #c0c0c0;
                 border-radius: 4px;
             }
@@ -230,7 +1108,7 @@ class QRCodeDecoder(QMainWindow):
         left_layout.setSpacing(10)
         
         # 图片显示区域
-        self.image_label = QLabel()
+        self.image_label = PreviewLabel()
         self.image_label.setAlignment(Qt.AlignCenter)
         self.image_label.setMinimumSize(400, 400)
         self.image_label.setStyleSheet("background-color: #ffffff; border: 1px solid #c0c0c0;")
@@ -251,12 +1129,29 @@ class QRCodeDecoder(QMainWindow):
         self.paste_button.clicked.connect(self.paste_from_clipboard)
         button_layout.addWidget(self.paste_button)
 
+        # 视频文件和摄像头流解码（运行时按钮变为"停止"）
+        self.video_button = QPushButton("打开视频")
+        self.video_button.setIcon(QIcon.fromTheme("video-x-generic"))
+        self.video_button.clicked.connect(self.open_video)
+        button_layout.addWidget(self.video_button)
+
+        self.camera_button = QPushButton("摄像头")
+        self.camera_button.setIcon(QIcon.fromTheme("camera-web"))
+        self.camera_button.clicked.connect(lambda: self.toggle_stream("0"))
+        button_layout.addWidget(self.camera_button)
+
         self.decode_button = QPushButton("解码二维码/条形码")
         self.decode_button.setIcon(QIcon.fromTheme("edit-find"))
         self.decode_button.clicked.connect(self.decode_qrcode)
         self.decode_button.setEnabled(False)
         button_layout.addWidget(self.decode_button)
         
+        self.cancel_button = QPushButton("取消解码")
+        self.cancel_button.setIcon(QIcon.fromTheme("process-stop"))
+        self.cancel_button.clicked.connect(lambda: self.cancel_decode())
+        self.cancel_button.setEnabled(False)
+        button_layout.addWidget(self.cancel_button)
+        
         self.clear_button = QPushButton("清除")
         self.clear_button.setIcon(QIcon.fromTheme("edit-clear"))
         self.clear_button.clicked.connect(self.clear_all)
@@ -290,9 +1185,27 @@ class QRCodeDecoder(QMainWindow):
         history_label = QLabel("历史记录:")
         right_layout.addWidget(history_label)
         
-        self.history_list = QListWidget()
-        self.history_list.setSelectionMode(QListWidget.ExtendedSelection)  # 添加这行以支持多选
-        self.history_list.itemDoubleClicked.connect(self.load_history_item)
+        # 历史记录搜索（输入停顿后再查询，避免每个按键都查库）
+        self.history_search = QLineEdit()
+        self.history_search.setPlaceholderText("搜索历史记录（如运单号片段）...")
+        self.history_search.setClearButtonEnabled(True)
+        self.history_search.textChanged.connect(lambda: self.search_timer.start())
+        right_layout.addWidget(self.history_search)
+        
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(250)
+        self.search_timer.timeout.connect(self.search_history)
+        
+        self.history_model = HistoryModel(self.store, self)
+        self.history_list = QListView()
+        self.history_list.setModel(self.history_model)
+        self.history_list.setSelectionMode(QAbstractItemView.ExtendedSelection)  # 添加这行以支持多选
+        self.history_list.setUniformItemSizes(True)  # 行高一致，滚动时无需逐行计算尺寸
+        self.history_list.setIconSize(QSize(HistoryModel.ICON_SIZE, HistoryModel.ICON_SIZE))
+        self.history_list.doubleClicked.connect(self.load_history_item)
+        self.history_list.selectionModel().selectionChanged.connect(self.on_history_selection_changed)
+        self.history_all_selected = False
         right_layout.addWidget(self.history_list)
 
         # 数据库操作按钮
@@ -309,6 +1222,11 @@ class QRCodeDecoder(QMainWindow):
         self.optimize_button.clicked.connect(self.optimize_database)
         db_button_layout.addWidget(self.optimize_button)
 
+        self.archive_button = QPushButton("归档")
+        self.archive_button.setIcon(QIcon.fromTheme("package-x-generic"))
+        self.archive_button.clicked.connect(self.show_archive_dialog)
+        db_button_layout.addWidget(self.archive_button)
+
         self.export_csv_button = QPushButton("导出CSV")
         self.export_csv_button.setIcon(QIcon.fromTheme("x-office-spreadsheet"))
         self.export_csv_button.clicked.connect(lambda: self.export_history('csv'))
@@ -319,8 +1237,31 @@ class QRCodeDecoder(QMainWindow):
         self.export_json_button.clicked.connect(lambda: self.export_history('json'))
         db_button_layout.addWidget(self.export_json_button)
 
+        self.export_ndjson_button = QPushButton("导出NDJSON")
+        self.export_ndjson_button.setIcon(QIcon.fromTheme("text-x-generic"))
+        self.export_ndjson_button.clicked.connect(lambda: self.export_history('ndjson'))
+        db_button_layout.addWidget(self.export_ndjson_button)
+
         right_layout.addLayout(db_button_layout)
 
+        # 导出选项
+        export_option_layout = QHBoxLayout()
+        export_option_layout.setSpacing(10)
+
+        self.export_gzip_check = QCheckBox("gzip压缩")
+        export_option_layout.addWidget(self.export_gzip_check)
+
+        self.export_incremental_check = QCheckBox("仅导出上次导出后的新记录")
+        export_option_layout.addWidget(self.export_incremental_check)
+
+        # 按码类型筛选导出（通过码明细表的类型索引）
+        self.export_type_combo = QComboBox()
+        self.export_type_combo.addItem("全部类型", None)  # 历史记录打开后按实际出现的码类型填充
+        export_option_layout.addWidget(self.export_type_combo)
+        export_option_layout.addStretch()
+
+        right_layout.addLayout(export_option_layout)
+
         # 历史记录操作按钮
         history_button_layout = QHBoxLayout()
         history_button_layout.setSpacing(5)
@@ -364,189 +1305,274 @@ class QRCodeDecoder(QMainWindow):
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
         
-        # 加载历史记录
-        self.load_history()
+        # 解码进度条
+        self.decode_progress = QProgressBar()
+        self.decode_progress.setRange(0, 100)
+        self.decode_progress.setMaximumWidth(200)
+        self.decode_progress.hide()
+        self.status_bar.addPermanentWidget(self.decode_progress)
+        
+        # 后台数据库任务（导出等）的进度条和取消按钮
+        self.task_worker = None
+        self.task_progress = QProgressBar()
+        self.task_progress.setMaximumWidth(200)
+        self.task_progress.hide()
+        self.status_bar.addPermanentWidget(self.task_progress)
+        
+        self.task_cancel_button = QPushButton("取消任务")
+        self.task_cancel_button.setIcon(QIcon.fromTheme("process-stop"))
+        self.task_cancel_button.clicked.connect(self.cancel_task)
+        self.task_cancel_button.hide()
+        self.status_bar.addPermanentWidget(self.task_cancel_button)
+
+        self.diagnostics_dialog = None
+        self.diagnostics_button = QPushButton("诊断")
+        self.diagnostics_button.setIcon(QIcon.fromTheme("utilities-system-monitor"))
+        self.diagnostics_button.clicked.connect(self.show_diagnostics)
+        self.status_bar.addPermanentWidget(self.diagnostics_button)
+
+        # 指定了--metrics时定期写入指标文件
+        self.metrics_path = None
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.timeout.connect(self.dump_metrics)
+        
+        # 历史记录在数据库后台打开后加载
+        self.set_history_enabled(False)
     
     def load_image(self):
         """加载图片"""
         file_path, _ = QFileDialog.getOpenFileName(
             self, "选择图片", "", 
-            "图片文件 (*.png *.jpg *.jpeg *.bmp *.gif)"
+            "图片和文档 (*.png *.jpg *.jpeg *.bmp *.gif *.tif *.tiff *.pdf)"
         )
         
         if file_path:
-            self.current_image_path = file_path
-            pixmap = QPixmap(file_path)
-            
-            # 缩放图片以适应显示区域
-            scaled_pixmap = pixmap.scaled(
-                self.image_label.size() - QSize(20, 20), 
-                Qt.KeepAspectRatio, 
-                Qt.SmoothTransformation
-            )
-            
-            self.image_label.setPixmap(scaled_pixmap)
-            self.decode_button.setEnabled(True)
-            self.update_background_colors()  # 添加这行
-            self.status_bar.showMessage(f"已加载图片: {file_path}", 3000)
+            self.start_image_load(file_path, f"已加载图片: {file_path}")
+    
+    def preview_size(self):
+        """预览图的尺寸上限：按屏幕大小生成，窗口放大后不必重新读取原图"""
+        screen = self.screen() or QApplication.primaryScreen()
+        return screen.availableSize().expandedTo(self.image_label.size())
+
+    def start_image_load(self, file_path, message, error_message=None, symbols=()):
+        """在后台读取图片（只解码一次），完成后显示预览；symbols为要标记的已有识别结果"""
+        self.cancel_decode(silent=True)
+        self.load_job_id += 1
+        self.decode_button.setEnabled(False)
+        self.load_message = message
+        self.load_error_message = error_message
+        self.load_symbols = symbols
+        
+        worker = ImageLoadWorker(self.load_job_id, file_path, self.preview_size())
+        worker.signals.finished.connect(self.on_image_loaded)
+        worker.signals.error.connect(self.on_image_load_error)
+        self.load_worker = worker
+        self.status_bar.showMessage(f"正在加载图片: {file_path}")
+        self.thread_pool.start(worker)
+    
+    def on_image_loaded(self, job_id, loaded):
+        """图片加载完成：显示预览并保存解码用的数组"""
+        if job_id != self.load_job_id:
+            return  # 已过期
+        self.load_worker = None
+        self.current_image_path = loaded.path
+        self.current_image = loaded
+        self.clipboard_image = None
+        
+        # 零拷贝包装预览数组（current_image保持其存活），按控件大小缩放和标记由PreviewLabel完成
+        self.image_label.set_image(ndarray_to_qimage(loaded.preview), loaded.scale,
+                                   self.page_symbols(self.load_symbols))
+        self.decode_button.setEnabled(True)
+        self.update_background_colors()  # 添加这行
+        self.status_bar.showMessage(self.load_message, 3000)
+    
+    def on_image_load_error(self, job_id, message):
+        """图片加载失败"""
+        if job_id != self.load_job_id:
+            return
+        self.load_worker = None
+        if self.load_error_message:
+            self.status_bar.showMessage(self.load_error_message, 3000)
+        else:
+            QMessageBox.critical(self, "错误", f"加载图片失败: {message}")
     
     def decode_qrcode(self):
-        """解码二维码和条形码"""
+        """解码二维码和条形码（在后台线程池中执行）"""
+        self.last_activity = time.monotonic()
         if not hasattr(self, 'current_image_path'):
             QMessageBox.warning(self, "警告", "请先加载图片")
             return
         
-        try:
-            # 处理剪贴板图片
-            if self.current_image_path == "clipboard":
-                # 检查剪贴板图片是否有效
-                if not hasattr(self, 'image_label') or not self.image_label.pixmap():
-                    raise ValueError("剪贴板中没有有效的图片")
-                
-                pixmap = self.image_label.pixmap()
-                if pixmap.isNull():
-                    raise ValueError("剪贴板图片无效")
-                
-                # 转换为QImage
-                qimage = pixmap.toImage()
-                if qimage.isNull():
-                    raise ValueError("图片转换失败")
-                
-                # 转换为RGB888格式
-                qimage = qimage.convertToFormat(QImage.Format_RGB888)
-                if qimage.isNull():
-                    raise ValueError("图片格式转换失败")
-                
-                # 获取图片尺寸和数据
-                width = qimage.width()
-                height = qimage.height()
-                bytes_per_line = qimage.bytesPerLine()
-                
-                if width <= 0 or height <= 0:
-                    raise ValueError("无效的图片尺寸")
-                
-                # 获取图片数据
-                buffer = qimage.constBits()
-                if buffer is None:
-                    raise ValueError("无法获取图片数据")
-                
-                buffer.setsize(qimage.byteCount())
-                
-                # 转换为numpy数组
-                try:
-                    arr = np.frombuffer(buffer, np.uint8)
-                    
-                    # 处理不同情况的行填充
-                    if bytes_per_line == width * 3:  # 无填充
-                        img = arr.reshape((height, width, 3))
-                    else:  # 有行填充
-                        # 计算实际每行像素数据大小
-                        img = arr.reshape((height, bytes_per_line))
-                        img = img[:, :width*3]  # 去除填充部分
-                        img = img.reshape((height, width, 3))
-                    
-                    # 转换颜色空间
-                    img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
-                    
-                except Exception as e:
-                    raise ValueError(f"图片数据转换失败: {str(e)}")
-            else:
-                # 使用OpenCV读取图片文件
-                img = cv2.imread(self.current_image_path)
-                if img is None:
-                    raise ValueError(f"无法加载图片文件: {self.current_image_path}")
-            
-            # 检查图片是否有效
-            if img is None or img.size == 0:
-                raise ValueError("无效的图片数据")
-            
-            # 解码二维码和条形码
-            decoded_objects = decode(img)
-            
-            if not decoded_objects:
-                QMessageBox.information(self, "提示", "未检测到二维码或条形码")
-                return
-            
-            # 创建带标记的图片副本用于显示
-            marked_img = img.copy()
-
-            # 支持的类型映射表
-            type_mapping = {
-                'AZTEC': 'Aztec码',
-                'CODE128': 'Code 128条形码',
-                'CODE39': 'Code 39条形码',
-                'CODE93': 'Code 93条形码',
-                'DATA MATRIX': 'Data Matrix码',
-                'EAN13': 'EAN-13条形码',
-                'EAN8': 'EAN-8条形码',
-                'ITF': 'ITF条形码',
-                'PDF417': 'PDF417码',
-                'QRCODE': '二维码',
-                'UPC-A': 'UPC-A条形码',
-                'UPC-E': 'UPC-E条形码'
-            }
-            
-            # 拼接所有解码结果，包含类型信息
-            results = []
-            print(f"[DEBUG] 解码结果数量: {len(decoded_objects)}")
-            for i, obj in enumerate(decoded_objects):
-                code_type = type_mapping.get(obj.type, obj.type)
-                try:
-                    content = obj.data.decode('utf-8')
-                except UnicodeDecodeError:
-                    content = str(obj.data)
-            
-                # 添加序号和更明显的分隔
-                results.append(f"=== 识别结果 {i+1} ===\n类型: {code_type}\n内容:\n{content}")
-                
-                # 在图片上标记二维码位置
-                points = obj.polygon
-                if len(points) > 4: 
-                    hull = cv2.convexHull(np.array([point for point in points], dtype=np.float32))
-                    cv2.polylines(marked_img, [hull], True, (0, 255, 0), 2)
-                else:
-                    # 绘制边界框
-                    x, y, w, h = obj.rect
-                    cv2.rectangle(marked_img, (x, y), (x+w, y+h), (0, 255, 0), 2)
-                
-                # 在图片上添加序号标签
-                cv2.putText(marked_img, str(i+1), (obj.rect[0], obj.rect[1]-10), 
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
-
-            # 显示带标记的图片
-            if self.current_image_path != "clipboard":  # 不修改剪贴板图片的显示
-                marked_img_rgb = cv2.cvtColor(marked_img, cv2.COLOR_BGR2RGB)
-                height, width, channel = marked_img_rgb.shape
-                bytes_per_line = 3 * width
-                q_image = QImage(marked_img_rgb.data, width, height, bytes_per_line, QImage.Format_RGB888)
-                self.image_label.setPixmap(QPixmap.fromImage(q_image).scaled(
-                    self.image_label.size() - QSize(20, 20), 
-                    Qt.KeepAspectRatio,
-                    Qt.SmoothTransformation
-                ))
-            
-            result = "\n\n".join(results)
-            self.result_text.setPlainText(result)
-            self.copy_button.setEnabled(True)
-            print(f"[DEBUG] 解码结果: {result}")
-
-            # 保存到历史记录（如果是文件则保存路径，剪贴板图片则不保存路径）
-            image_path = self.current_image_path if self.current_image_path != "clipboard" else ""
-            self.save_to_history(result, image_path)
-            self.load_history()
-            
-            # 解码成功后更新背景色
-            self.update_background_colors()
-            
-            self.status_bar.showMessage("解码成功", 3000)
-            
-        except Exception as e:
-            error_msg = f"解码失败: {str(e)}"
-            print(f"[DEBUG] {error_msg}")
-            QMessageBox.critical(self, "错误", error_msg)
-            self.status_bar.showMessage(error_msg, 3000)
+        # 剪贴板图片使用粘贴时保存的原始QImage（未缩放），在后台线程中转换为灰度数组
+        if self.current_image_path == "clipboard":
+            source = self.clipboard_image
+        else:
+            source = self.current_image
+        
+        # 新任务开始前取消仍在运行的旧任务
+        self.cancel_decode(silent=True)
+        
+        worker = DecodeWorker(
+            self.decode_job_id, source,
+            cache=self.decode_cache,
+            thumbnails=self.thumbnail_cache
+        )
+        worker.signals.progress.connect(self.on_decode_progress)
+        worker.signals.finished.connect(self.on_decode_finished)
+        worker.signals.error.connect(self.on_decode_error)
+        self.decode_worker = worker
+        
+        self.cancel_button.setEnabled(True)
+        self.decode_progress.setValue(0)
+        self.decode_progress.show()
+        self.thread_pool.start(worker)
+    
+    def cancel_decode(self, silent=False):
+        """取消正在进行的解码任务，过期任务的结果会被丢弃"""
+        self.decode_job_id += 1
+        if self.decode_worker is not None:
+            self.decode_worker.cancel()
+            self.decode_worker = None
+            if not silent:
+                self.status_bar.showMessage("已取消解码", 3000)
+        self.cancel_button.setEnabled(False)
+        self.decode_progress.hide()
+    
+    def on_decode_progress(self, job_id, percent, message):
+        """更新解码进度"""
+        if job_id != self.decode_job_id:
+            return
+        self.decode_progress.setValue(percent)
+        self.status_bar.showMessage(message)
+    
+    def on_decode_finished(self, job_id, result, digest):
+        """解码完成后在主线程更新界面和历史记录"""
+        if job_id != self.decode_job_id:
+            return  # 已过期（加载了新图片或被取消）
+        self.decode_worker = None
+        self.cancel_button.setEnabled(False)
+        self.decode_progress.hide()
+        
+        symbols = result.symbols
+        if not symbols:
+            self.status_bar.clearMessage()
+            QMessageBox.information(self, "提示", "未检测到二维码或条形码")
+            return
+        
+        # 在预览上标记识别结果（文件和剪贴板图片相同，不重新生成图片）
+        self.image_label.set_symbols(self.page_symbols(symbols))
+        
+        text = result.format_text()
+        self.result_text.setPlainText(text)
+        self.copy_button.setEnabled(True)
+
+        # 按码内容索引统计此前已识别过的码（在写入本次记录之前）
+        repeated = self.repeated_symbols(symbols)
+
+        # 保存到历史记录（如果是文件则保存路径，剪贴板图片则不保存路径）
+        # 缓存命中且历史中已有相同记录时不再重复插入
+        image_path = self.current_image_path if self.current_image_path != "clipboard" else ""
+        if not (result.cached and self.history_exists(result.payload_text(), image_path, digest)):
+            self.save_to_history(result, image_path, digest)
+        
+        # 解码成功后更新背景色
+        self.update_background_colors()
+        
+        extra = f"，其中 {repeated} 个码此前已识别过" if repeated else ""
+        if result.cached:
+            self.status_bar.showMessage(f"解码成功（来自缓存，{self.cache_stats_text()}{extra}）", 3000)
+        else:
+            self.status_bar.showMessage(
+                f"解码成功（分辨率阶梯: {result.ladder_step}，尝试 {result.attempts} 次，"
+                f"后端: {result.backend}，{self.cache_stats_text()}{extra}）", 3000)
 
+    def repeated_symbols(self, symbols):
+        """历史记录中已出现过相同内容的码的个数（走码明细的内容索引）"""
+        if self.store is None:
+            return 0
+        return sum(1 for symbol in symbols if symbol.text and self.store.find_payload(symbol.text, limit=1))
     
+    def page_symbols(self, symbols):
+        """预览显示的是文档第一页（单张图片页码为0）"""
+        return [symbol for symbol in symbols if symbol.page <= 1]
+
+    def on_decode_error(self, job_id, message):
+        """解码出错"""
+        if job_id != self.decode_job_id:
+            return
+        self.decode_worker = None
+        self.cancel_button.setEnabled(False)
+        self.decode_progress.hide()
+        
+        error_msg = f"解码失败: {message}"
+        QMessageBox.critical(self, "错误", error_msg)
+        self.status_bar.showMessage(error_msg, 3000)
+
+    def open_video(self):
+        """选择视频文件并开始流解码（运行中再次点击则停止）"""
+        if self.stream_worker:
+            self.stop_stream()
+            return
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "选择视频文件", "",
+            "视频文件 (*.mp4 *.avi *.mov *.mkv *.webm);;所有文件 (*)"
+        )
+        if file_path:
+            self.toggle_stream(file_path)
+
+    def toggle_stream(self, source):
+        """开始或停止视频流解码，source为视频文件路径或摄像头设备号"""
+        if self.stream_worker:
+            self.stop_stream()
+            return
+        self.cancel_decode(silent=True)
+        self.stream_source = source
+        self.result_text.clear()
+        self.stream_worker = StreamWorker(source, (self.image_label.width(), self.image_label.height()))
+        self.stream_worker.signals.frame.connect(self.on_stream_frame)
+        self.stream_worker.signals.found.connect(self.on_stream_found)
+        self.stream_worker.signals.stats.connect(self.on_stream_stats)
+        self.stream_worker.signals.finished.connect(self.on_stream_finished)
+        self.stream_worker.signals.error.connect(self.on_stream_error)
+        self.thread_pool.start(self.stream_worker)
+        for button in (self.video_button, self.camera_button):
+            button.setText("停止")
+        self.decode_button.setEnabled(False)
+        self.status_bar.showMessage(f"正在解码视频流: {source}")
+
+    def stop_stream(self):
+        """请求停止视频流解码（worker结束后发出finished）"""
+        if self.stream_worker:
+            self.stream_worker.cancel()
+
+    def reset_stream_buttons(self):
+        self.stream_worker = None
+        self.video_button.setText("打开视频")
+        self.camera_button.setText("摄像头")
+
+    def on_stream_frame(self, qimage, symbols, scale):
+        self.image_label.set_image(qimage, scale, symbols)
+
+    def on_stream_found(self, frame_index, symbols):
+        """流中新出现的码（已跨帧去重）：追加到结果并逐个写入历史记录"""
+        for symbol in symbols:
+            text = QRCodeEngine.format_symbols([symbol])
+            self.result_text.append(f"[第 {frame_index} 帧]\n{text}\n")
+            self.add_history(symbol.text, "", [symbol])
+        self.copy_button.setEnabled(True)
+
+    def on_stream_stats(self, stats):
+        self.status_bar.showMessage(stats.summary_text())
+
+    def on_stream_finished(self, stats):
+        self.reset_stream_buttons()
+        self.update_background_colors()
+        self.status_bar.showMessage(f"视频流解码结束: {stats.summary_text()}")
+
+    def on_stream_error(self, message):
+        self.reset_stream_buttons()
+        QMessageBox.critical(self, "错误", f"视频流解码失败: {message}")
+
     def copy_result(self):
         """复制解码结果"""
         result = self.result_text.toPlainText()
@@ -557,6 +1583,7 @@ class QRCodeDecoder(QMainWindow):
     
     def clear_all(self):
         """清除所有内容"""
+        self.cancel_decode(silent=True)
         self.image_label.clear()
         self.result_text.clear()
         self.decode_button.setEnabled(False)
@@ -565,89 +1592,81 @@ class QRCodeDecoder(QMainWindow):
         
         if hasattr(self, 'current_image_path'):
             del self.current_image_path
+        self.current_image = None
+        self.clipboard_image = None
+        self.load_job_id += 1
             
         self.status_bar.showMessage("已清除", 2000)
     
-    def save_to_history(self, content, image_path):
-        """保存到历史记录数据库"""
-        # 提取第一个二维码的类型
-        code_type = "未知"
-        if content.startswith("["):
-            code_type = content.split("]")[0][1:]
-        
-        self.cursor.execute(
-            "INSERT INTO history (content, image_path, code_type) VALUES (?, ?, ?)",
-            (content, image_path, code_type)
-        )
-        self.conn.commit()
+    def save_to_history(self, result, image_path, digest=None):
+        """保存到历史记录数据库（内容只保存码的原文，每个码单独保存一行明细，记录类型取第一个码的类型）"""
+        self.add_history(result.payload_text(), image_path, result.symbols, digest)
 
-    
-    def load_history(self):
-        """加载历史记录"""
-        self.history_list.clear()
-        self.cursor.execute("""
-            SELECT id, timestamp, content, image_path, code_type, is_favorite 
-            FROM history 
-            ORDER BY is_favorite DESC, timestamp DESC
-        """)
-        records = self.cursor.fetchall()
-        
-        for index, record in enumerate(records):
-            id, timestamp, content, image_path, code_type, is_favorite = record
-            item_text = f"{timestamp}: {content[:100]}{'...' if len(content) > 100 else ''}"
-            item = QListWidgetItem(item_text)
-            
-            # 设置交替颜色，收藏项优先使用黄色
-            if is_favorite:
-                item.setBackground(MacaronColors.LEMON_YELLOW)
-            else:
-                # 使用模运算循环颜色列表
-                color_index = index % len(MacaronColors.COLOR_CYCLE)
-                item.setBackground(MacaronColors.COLOR_CYCLE[color_index])
-            
-            # 设置文字颜色与背景形成对比
-            item.setForeground(QColor(60, 60, 60))  # 深灰色文字
-            
-            self.history_list.addItem(item)
-            item.setData(Qt.UserRole, record)
+    def add_history(self, content, image_path, symbols, digest=None):
+        """写入一条历史记录并插入列表；数据库还在后台打开时先暂存"""
+        self.last_activity = time.monotonic()
+        if self.store is None:
+            self.pending_history.append((content, image_path, symbols, digest))
+            return
+        history_id = self.store.add_result(content, image_path, symbols, digest)
+        if any(self.export_type_combo.findData(symbol.type) < 0 for symbol in symbols):
+            self.refresh_export_types()     # 出现了新的码类型
+        self.history_model.add_record(history_id)
 
+    
+    def history_exists(self, content, image_path, digest):
+        """检查历史记录中是否已有相同图片和内容的记录"""
+        return self.store is not None and self.store.exists(content, image_path, digest)
 
+    def load_history(self):
+        """加载历史记录（先加载第一页，其余在列表视图滚动时按页加载）"""
+        self.history_model.reload()
+        self.history_all_selected = False
+        self.history_model.fetchMore(QModelIndex())
+    
+    def search_history(self):
+        """按搜索框内容过滤历史记录"""
+        self.history_model.set_query(self.history_search.text())
+        self.history_all_selected = False
+        self.history_model.fetchMore(QModelIndex())
+        if self.history_model.query:
+            more = "+" if self.history_model.canFetchMore(QModelIndex()) else ""
+            self.status_bar.showMessage(f"找到 {self.history_model.rowCount()}{more} 条匹配的历史记录", 3000)
     
-    def load_history_item(self, item):
+    def load_history_item(self, index):
         """加载历史记录项"""
         # 保持其他项的选中状态
-        self.history_list.setCurrentItem(item)  # 只设置当前项为当前项，不影响其他选中项
+        self.history_list.selectionModel().setCurrentIndex(index, QItemSelectionModel.NoUpdate)  # 只设置当前项，不影响其他选中项
 
-        record = item.data(Qt.UserRole)
-        # 新结构包含6个字段
-        if len(record) == 6:
-            id, timestamp, content, image_path, code_type, is_favorite = record
-        else:  # 兼容旧结构
-            id, timestamp, content, image_path = record
+        history_id = index.data(HistoryModel.IdRole)
+        record = self.store.get(history_id)
+        if record is None:
+            self.status_bar.showMessage("该历史记录已不存在", 3000)
+            return
+        timestamp, content, image_path, digest = record
         
-        # 显示解码内容
-        self.result_text.setPlainText(content)
+        # 显示解码内容：由码明细生成带类型和页码的结果文本，没有明细的旧记录直接显示保存的文本
+        symbols = [QRCodeEngine.DecodedSymbol(*row) for row in self.store.get_symbols(history_id)]
+        self.result_text.setPlainText(QRCodeEngine.format_symbols(symbols) if symbols else content)
         self.copy_button.setEnabled(True)
         self.update_background_colors()  # 添加这行
         
-        # 显示图片
+        # 显示图片：先放大显示缓存的缩略图，原图在后台加载完成后替换
         if image_path:
-            try:
-                self.current_image_path = image_path
-                pixmap = QPixmap(image_path)
-                
-                # 缩放图片以适应显示区域
-                scaled_pixmap = pixmap.scaled(
-                    self.image_label.size() - QSize(20, 20), 
-                    Qt.KeepAspectRatio, 
-                    Qt.SmoothTransformation
-                )
-                
-                self.image_label.setPixmap(scaled_pixmap)
-                self.decode_button.setEnabled(True)
-                self.status_bar.showMessage(f"已加载历史记录: {timestamp}", 3000)
-            except:
-                self.status_bar.showMessage("无法加载历史图片", 3000)
+            self.show_thumbnail(digest)
+            self.start_image_load(image_path, f"已加载历史记录: {timestamp}", "无法加载历史图片", symbols)
+
+    def show_thumbnail(self, digest):
+        """用缓存的缩略图作为临时预览（没有缩略图时不改变当前显示）"""
+        data = self.thumbnail_cache.get(digest) if digest and self.thumbnail_cache else None
+        if not data:
+            return
+        image = QImage.fromData(data)
+        if image.isNull():
+            return
+        # 缩略图只是原图加载完成前的占位，按原图的显示大小放大（小于缩略图尺寸的就是原图大小，不放大）
+        upscale = max(image.width(), image.height()) >= QRCodeEngine.THUMBNAIL_SIZE
+        self.image_label.set_image(image, upscale=upscale)
 
 
 
@@ -660,17 +1679,12 @@ class QRCodeDecoder(QMainWindow):
             # 从剪贴板获取图片
             qimage = clipboard.image()
             if not qimage.isNull():
-                # 转换为QPixmap显示
-                pixmap = QPixmap.fromImage(qimage)
-                
-                # 缩放图片以适应显示区域
-                scaled_pixmap = pixmap.scaled(
-                    self.image_label.size() - QSize(20, 20), 
-                    Qt.KeepAspectRatio, 
-                    Qt.SmoothTransformation
-                )
-                
-                self.image_label.setPixmap(scaled_pixmap)
+                self.cancel_decode(silent=True)
+                self.load_job_id += 1
+                self.current_image = None
+                # 保留原始分辨率的图片用于解码；显示时按控件大小缩放，识别结果直接按原图坐标标记
+                self.clipboard_image = qimage
+                self.image_label.set_image(qimage)
                 self.decode_button.setEnabled(True)
                 self.update_background_colors()  # 添加这行
                 
@@ -690,122 +1704,195 @@ class QRCodeDecoder(QMainWindow):
             super().keyPressEvent(event)
 
     def backup_database(self):
-        """备份数据库"""
-        backup_path = os.path.join(os.path.dirname(__file__), 'backups')
-        os.makedirs(backup_path, exist_ok=True)
-        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_file = os.path.join(backup_path, f'qrcode_history_{timestamp}.db')
-        
-        try:
-            # 使用SQLite的备份API
-            new_conn = sqlite3.connect(backup_file)
-            self.conn.backup(new_conn)
-            new_conn.close()
-            self.status_bar.showMessage(f"数据库已备份到: {backup_file}", 5000)
-            return True
-        except Exception as e:
-            QMessageBox.critical(self, "备份失败", f"数据库备份失败: {str(e)}")
-            return False
+        """在后台分步备份数据库（在线备份API，备份期间可以继续使用），并按保留份数轮换旧备份"""
+        backup_path = QRCodeHistory.default_backup_dir(self.store.db_path)
+
+        def finished(result):
+            if result is None:
+                self.status_bar.showMessage("已取消备份", 3000)
+                return
+            backup_file, removed = result
+            extra = f"，已删除 {len(removed)} 份旧备份" if removed else ""
+            self.status_bar.showMessage(f"数据库已备份到: {backup_file}{extra}", 5000)
+
+        worker = TaskWorker(QRCodeHistory.backup_database, self.store.db_path, backup_path, keep=self.backup_keep)
+        self.start_task(worker, "正在备份数据库...", finished, "备份失败")
 
     def optimize_database(self):
-        """优化数据库"""
-        try:
-            self.cursor.execute("VACUUM")
-            self.cursor.execute("ANALYZE")
-            self.conn.commit()
-            self.status_bar.showMessage("数据库优化完成", 3000)
-            return True
-        except Exception as e:
-            QMessageBox.critical(self, "优化失败", f"数据库优化失败: {str(e)}")
+        """在后台优化数据库：增量回收空闲页并执行PRAGMA optimize（旧数据库首次会做一次VACUUM）"""
+        if QRCodeHistory.auto_vacuum_mode(self.conn) != 2:
+            reply = QMessageBox.question(
+                self, "优化数据库",
+                "首次优化需要做一次完整的VACUUM以启用增量回收，需要与数据库大小相当的临时磁盘空间，"
+                "期间无法写入历史记录。之后的优化和空闲维护都不再需要VACUUM。是否继续？",
+                QMessageBox.Yes | QMessageBox.No)
+            if reply != QMessageBox.Yes:
+                return
+
+        def finished(result):
+            freed, vacuumed = result
+            done = "已启用增量回收，" if vacuumed else ""
+            self.status_bar.showMessage(f"数据库优化完成（{done}回收 {freed} 页）", 5000)
+
+        worker = TaskWorker(QRCodeHistory.optimize_database, self.store.db_path)
+        self.start_task(worker, "正在优化数据库...", finished, "优化失败")
+
+    def show_archive_dialog(self):
+        ArchiveDialog(self).exec_()
+
+    def idle_maintenance(self):
+        """后台线程：增量回收和PRAGMA optimize，设置了保留策略时每天归档一次过期记录，返回归档条数"""
+        QRCodeHistory.idle_maintenance(self.store.db_path)
+        return QRCodeArchive.apply_due_retention(self.store.db_path, is_cancelled=lambda: self.maintenance_cancelled)
+
+    def run_idle_maintenance(self):
+        """空闲时在后台做少量增量回收、PRAGMA optimize和到期的归档"""
+        busy = self.task_worker or self.decode_worker or self.stream_worker or self.maintenance_running
+        if busy or time.monotonic() - self.last_activity < IDLE_SECONDS:
+            return
+
+        def done(archived):
+            self.maintenance_running = False
+            if archived:
+                # 已归档的记录从数据库删除了，列表中不能再显示
+                self.load_history()
+                self.refresh_export_types()
+                self.status_bar.showMessage(f"已按保留策略归档 {archived} 条历史记录", 5000)
+
+        def failed(error):
+            self.maintenance_running = False
+
+        self.maintenance_running = True
+        worker = BackgroundCall(self.idle_maintenance)
+        worker.signals.finished.connect(done)
+        worker.signals.error.connect(failed)
+        self.thread_pool.start(worker)
+
+    def start_task(self, worker, message, on_finished, error_title):
+        """在后台运行数据库任务（同一时间只运行一个），进度显示在状态栏"""
+        if self.task_worker is not None:
+            QMessageBox.warning(self, "警告", "已有后台任务正在运行，请稍候或先取消")
             return False
+        
+        def finished(result):
+            self.finish_task()
+            on_finished(result)
+        
+        def failed(error):
+            self.finish_task()
+            QMessageBox.critical(self, error_title, error)
+        
+        worker.signals.progress.connect(self.on_task_progress)
+        worker.signals.finished.connect(finished)
+        worker.signals.error.connect(failed)
+        self.task_worker = worker
+        self.task_progress.setRange(0, 0)  # 总数未知前显示忙碌状态
+        self.task_progress.show()
+        self.task_cancel_button.show()
+        self.status_bar.showMessage(message)
+        self.thread_pool.start(worker)
+        return True
+    
+    def on_task_progress(self, done, total):
+        """更新后台任务进度"""
+        if total > 0:
+            self.task_progress.setRange(0, total)
+            self.task_progress.setValue(done)
+    
+    def cancel_task(self):
+        """取消后台任务"""
+        if self.task_worker is not None:
+            self.task_worker.cancel()
+            self.status_bar.showMessage("正在取消后台任务...")
+    
+    def finish_task(self):
+        """后台任务结束后恢复状态栏"""
+        self.task_worker = None
+        self.task_progress.hide()
+        self.task_cancel_button.hide()
 
     def export_history(self, format='csv'):
-        """导出历史记录"""
+        """导出历史记录（在后台线程中分块流式写入，可选gzip压缩和增量导出）"""
+        compress = self.export_gzip_check.isChecked()
+        suffix = f"{format}.gz" if compress else format
         file_path, _ = QFileDialog.getSaveFileName(
             self, "导出历史记录", "", 
-            f"{format.upper()} 文件 (*.{format})"
+            f"{format.upper()} 文件 (*.{suffix})"
         )
         
         if not file_path:
             return
+        if compress and not file_path.endswith('.gz'):
+            file_path += '.gz'
         
-        try:
-            self.cursor.execute("SELECT timestamp, content, code_type FROM history ORDER BY timestamp")
-            records = self.cursor.fetchall()
-            
-            if format == 'csv':
-                with open(file_path, 'w', newline='', encoding='utf-8') as f:
-                    writer = csv.writer(f)
-                    writer.writerow(['时间戳', '内容', '类型'])
-                    writer.writerows(records)
-            elif format == 'json':
-                data = [{
-                    'timestamp': record[0],
-                    'content': record[1],
-                    'code_type': record[2]
-                } for record in records]
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, ensure_ascii=False, indent=2)
-                    
-            self.status_bar.showMessage(f"历史记录已导出到: {file_path}", 5000)
-            return True
-        except Exception as e:
-            QMessageBox.critical(self, "导出失败", f"历史记录导出失败: {str(e)}")
-            return False
+        # 增量导出：只导出上次导出水位线之后的记录
+        since_id = 0
+        if self.export_incremental_check.isChecked():
+            since_id = int(self.store.get_info('last_export_id', 0))
+        code_type = self.export_type_combo.currentData()
+        
+        def finished(result):
+            if result is None:
+                self.status_bar.showMessage("已取消导出", 3000)
+                return
+            count, max_id = result
+            # 记录导出水位线，供下次增量导出使用（按类型筛选的导出不完整，不推进水位线）
+            if code_type is None:
+                with self.conn:
+                    self.store.set_info('last_export_id', max_id)
+            self.status_bar.showMessage(f"已导出 {count} 条历史记录到: {file_path}", 5000)
+        
+        worker = TaskWorker(
+            QRCodeHistory.export_history, self.store.db_path, file_path,
+            fmt=format, compress=compress, since_id=since_id, code_type=code_type
+        )
+        self.start_task(worker, "正在导出历史记录...", finished, "导出失败")
+
+    def selected_history_ids(self):
+        """返回选中记录的ID；通过"全选"选中全部记录时返回None（包括尚未加载的分页）"""
+        if self.history_all_selected:
+            # 搜索状态下的全选只包括匹配的记录
+            return self.store.search_ids(self.history_model.query) if self.history_model.query else None
+        return [index.data(HistoryModel.IdRole) for index in self.history_list.selectionModel().selectedRows()]
+
+    def on_history_selection_changed(self, selected, deselected):
+        """手动修改选择后不再视为全选"""
+        self.history_all_selected = False
 
     def delete_history_item(self):
-        """删除选中的历史记录项（支持多选）"""
-        selected_items = self.history_list.selectedItems()
-        if not selected_items:
+        """删除选中的历史记录项（支持多选，在一个事务中批量删除）"""
+        ids = self.selected_history_ids()
+        count = self.store.count() if ids is None else len(ids)
+        if not count:
             QMessageBox.warning(self, "警告", "请先选择要删除的历史记录")
             return
         
         reply = QMessageBox.question(
             self, "确认删除",
-            f"确定要删除选中的 {len(selected_items)} 条历史记录吗？此操作不可撤销！",
+            f"确定要删除选中的 {count} 条历史记录吗？此操作不可撤销！",
             QMessageBox.Yes | QMessageBox.No
         )
         
         if reply == QMessageBox.Yes:
-            for item in selected_items:
-                record = item.data(Qt.UserRole)
-                self.cursor.execute("DELETE FROM history WHERE id=?", (record[0],))
-                self.history_list.takeItem(self.history_list.row(item))
-            
-            self.conn.commit()
-            self.status_bar.showMessage(f"已删除 {len(selected_items)} 条历史记录", 3000)
+            deleted = self.store.delete_ids(ids)
+            self.load_history()
+            self.status_bar.showMessage(f"已删除 {deleted} 条历史记录", 3000)
             
     def toggle_favorite(self):
-        """切换历史记录的收藏状态"""
-        selected_items = self.history_list.selectedItems()
-        if not selected_items:
+        """切换历史记录的收藏状态（在一个事务中批量更新）"""
+        ids = self.selected_history_ids()
+        if ids is not None and not ids:
             QMessageBox.warning(self, "警告", "请先选择历史记录")
             return
         
-        for item in selected_items:
-            record = item.data(Qt.UserRole)
-            new_state = not bool(record[5]) if len(record) > 5 else True
-            
-            self.cursor.execute(
-                "UPDATE history SET is_favorite=? WHERE id=?",
-                (int(new_state), record[0])
-            )
-            
-            # 更新显示
-            if new_state:
-                item.setBackground(MacaronColors.LEMON_YELLOW)
-            else:
-                item.setBackground(QColor(255, 255, 255))
-        
-        self.conn.commit()
+        self.store.toggle_favorite_ids(ids)
+        self.load_history()
         self.status_bar.showMessage("已更新收藏状态", 3000)
 
     def select_all_history_items(self):
-        """全选历史记录项"""
-        for i in range(self.history_list.count()):
-            item = self.history_list.item(i)
-            item.setSelected(True)
-        self.history_list.selectAll()  # 使用内置的selectAll方法更可靠
+        """全选历史记录项（包括尚未加载的分页）"""
+        self.history_list.selectAll()
+        self.history_all_selected = True
         self.status_bar.showMessage("已全选所有历史记录", 5000)
 
     def clear_all_history(self):
@@ -817,10 +1904,18 @@ class QRCodeDecoder(QMainWindow):
         )
         
         if reply == QMessageBox.Yes:
-            self.cursor.execute("DELETE FROM history")
-            self.conn.commit()
-            self.history_list.clear()
+            self.store.clear()
+            self.thumbnail_cache.reload_totals()
+            self.load_history()
+            self.refresh_export_types()
             self.status_bar.showMessage("已清空所有历史记录", 5000)
+            if self.task_worker is None:
+                # 在后台分步回收空出的页，不在界面线程做整库VACUUM（有其他任务时留给空闲维护回收）
+                worker = TaskWorker(QRCodeHistory.reclaim_free_pages, self.store.db_path)
+                self.start_task(worker, "正在回收数据库空间...",
+                                lambda freed: self.status_bar.showMessage(
+                                    f"已清空所有历史记录（回收 {freed or 0} 页）", 5000),
+                                "回收空间失败")
 
     def update_background_colors(self):
         """更新左右两侧背景色（确保两侧颜色不同）"""
@@ -841,27 +1936,183 @@ class QRCodeDecoder(QMainWindow):
             background-color: {right_color.name()};
             border: px solid #c0c0c0;
         """)
-        
-        # 可选：在状态栏显示当前颜色信息（调试用）
-        self.status_bar.showMessage(
-            f"背景色更新: 左侧 {left_color.name()}, 右侧 {right_color.name()}", 
-            2000
-        )
+
+    def show_diagnostics(self):
+        """打开诊断面板（非模态，可以边操作边观察）"""
+        if self.diagnostics_dialog is None:
+            self.diagnostics_dialog = DiagnosticsDialog(self)
+        self.diagnostics_dialog.show()
+        self.diagnostics_dialog.raise_()
+
+    def start_metrics_dump(self, path, interval):
+        """启用性能统计并每隔interval秒写入指标文件"""
+        metrics.enable()
+        self.metrics_path = path
+        self.metrics_timer.start(int(interval * 1000))
+
+    def dump_metrics(self):
+        if self.metrics_path:
+            try:
+                metrics.registry.dump(self.metrics_path)
+            except OSError as e:
+                self.status_bar.showMessage(f"写入指标文件失败: {e}", 3000)
 
 
     def closeEvent(self, event):
         """关闭窗口事件"""
-        self.conn.close()
+        self.cancel_decode(silent=True)
+        self.cancel_task()
+        self.stop_stream()
+        self.maintenance_cancelled = True
+        self.thread_pool.waitForDone()
+        QThreadPool.globalInstance().waitForDone()  # 列表缩略图加载
+        self.dump_metrics()
+        if self.decode_cache:
+            self.decode_cache.close()
+        if self.thumbnail_cache:
+            self.thumbnail_cache.close()
+        if self.conn:
+            self.conn.close()
         event.accept()
 
+def parse_args(argv):
+    """解析命令行参数（未识别的参数留给Qt处理）"""
+    parser = argparse.ArgumentParser(description=ProjectInfo.DESCRIPTION)
+    parser.add_argument('--batch', metavar='DIR', help='无界面批量解码目录中的图片，结果以NDJSON输出到标准输出')
+    parser.add_argument('--workers', type=int, default=None, help='批处理进程数（默认为CPU核心数）')
+    parser.add_argument('--recursive', action='store_true', help='批处理时递归扫描子目录')
+    parser.add_argument('--cache', metavar='DB', help='批处理时使用的解码结果缓存数据库（如 qrcode_history.db）')
+    parser.add_argument('--ladder', default='4,2,1',
+                        help='降分辨率解码阶梯（缩小倍数，逗号分隔，默认4,2,1；设为1则只用原始分辨率）')
+    parser.add_argument('--tile', type=int, default=0, metavar='SIZE',
+                        help='批处理时把图片切成边长SIZE的重叠分块并行解码（适合超大扫描图，0表示不分块）')
+    parser.add_argument('--tile-overlap', type=int, default=None,
+                        help='分块之间的重叠像素（需大于最大码的尺寸，默认256）')
+    parser.add_argument('--tile-workers', type=int, default=None, help='每张图片分块解码的线程数')
+    parser.add_argument('--dpi', type=int, default=None, help='PDF栅格化分辨率（默认200）')
+    parser.add_argument('--page-workers', type=int, default=1, help='批处理时每个多页文档同时解码的页数')
+    parser.add_argument('--backends', default='zbar',
+                        help="解码后端（逗号分隔，按顺序尝试；可选 zbar, opencv-qr, opencv-barcode）")
+    parser.add_argument('--strategy', default='fallback', choices=('fixed', 'fallback', 'race'),
+                        help='多个后端的组合方式：fixed只用第一个，fallback依次尝试，race并行取最快的非空结果')
+    parser.add_argument('--symbologies', default='',
+                        help='只识别这些码类型（逗号分隔，如QRCODE,EAN13），会跳过无法识别它们的后端')
+    parser.add_argument('--metrics', metavar='FILE',
+                        help='启用各阶段耗时统计并定期写入该文件（扩展名为.prom时为Prometheus文本格式，否则为JSON）')
+    parser.add_argument('--metrics-interval', type=float, default=10.0, help='写入指标文件的间隔（秒）')
+    parser.add_argument('--stream', metavar='SRC',
+                        help='无界面解码视频文件或摄像头（设备号，如0），去重后的结果以NDJSON输出到标准输出')
+    parser.add_argument('--max-skip', type=int, default=8, help='流解码时最多连续跳过的帧数（0表示解码每一帧）')
+    parser.add_argument('--dedup', type=float, default=5.0, help='流解码时同一内容在多少秒内再次出现视为重复')
+    parser.add_argument('--history', metavar='DB',
+                        help='流解码和HTTP服务时把结果写入历史记录数据库；监视目录和归档时使用的数据库（默认为qrcode_history.db）')
+    parser.add_argument('--serve', metavar='[HOST:]PORT', help='启动HTTP解码服务（POST /decode，GET /health、/metrics）')
+    parser.add_argument('--max-queue', type=int, default=16, help='HTTP服务在解码进程都忙时最多排队的请求数，超出返回429')
+    parser.add_argument('--watch', metavar='DIR', help='监视目录，自动解码新写入的图片并写入历史记录（按Ctrl+C停止）')
+    parser.add_argument('--poll', type=float, default=None, metavar='SEC',
+                        help='监视目录时改用轮询并指定间隔（网络共享上inotify收不到远端写入时使用）')
+    parser.add_argument('--settle', type=float, default=2.0, help='文件大小和修改时间持续多少秒不变视为写完')
+    parser.add_argument('--backup-keep', type=int, default=QRCodeHistory.BACKUP_KEEP,
+                        help='"备份数据库"保留的备份份数，超出时删除最旧的备份')
+    parser.add_argument('--archive', action='store_true',
+                        help='按保留策略把过期的历史记录归档到按月压缩的文件并从数据库删除（收藏的记录不归档）')
+    parser.add_argument('--retention-days', type=int, default=None,
+                        help='归档时保留最近多少天的记录（与--retention-rows都未指定时使用界面中保存的策略）')
+    parser.add_argument('--retention-rows', type=int, default=None, help='归档时保留最新的多少条非收藏记录')
+    parser.add_argument('--archive-dir', metavar='DIR', help='归档目录（默认为数据库所在目录下的archives）')
+    parser.add_argument('--search-archive', metavar='QUERY', help='在归档中搜索内容，结果以NDJSON输出到标准输出')
+    parser.add_argument('--restore-archive', metavar='FILE',
+                        help='把NDJSON文件（--search-archive的输出，-表示标准输入）中的归档记录按原ID恢复到历史记录')
+    parser.add_argument('--startup-profile', action='store_true',
+                        help='在标准错误输出界面启动各阶段的耗时（导入、创建窗口、首次显示、历史记录和解码依赖就绪）')
+    return parser.parse_known_args(argv)
+
+
+def make_tiles(args):
+    """按命令行参数生成分块配置（未指定--tile时返回None）"""
+    if not args.tile:
+        return None
+    overlap = QRCodeEngine.DEFAULT_TILE_OVERLAP if args.tile_overlap is None else args.tile_overlap
+    return QRCodeEngine.TileConfig(args.tile, overlap, args.tile_workers)
+
+
 if __name__ == "__main__":
+    args, qt_args = parse_args(sys.argv[1:])
+    ladder = tuple(int(v) for v in args.ladder.split(',') if v.strip())
+    decoders = (tuple(v.strip() for v in args.backends.split(',') if v.strip()), args.strategy,
+                tuple(v.strip() for v in args.symbologies.split(',') if v.strip()) or None)
+    headless = args.batch or args.serve or args.watch or args.stream
+    # 界面模式使用默认解码后端时不在启动时导入解码依赖
+    if headless or decoders != (('zbar',), 'fallback', None):
+        QRCodeEngine.configure_decoders(*decoders)
+    dumper = None
+    if args.metrics and (args.batch or args.stream or args.watch):
+        metrics.enable()
+        dumper = metrics.PeriodicDumper(args.metrics, args.metrics_interval)
+        dumper.start()
+    if args.batch:
+        import QRCodeService
+        QRCodeService.run_batch(args.batch, workers=args.workers, recursive=args.recursive,
+                                ladder=ladder, cache_path=args.cache, tiles=make_tiles(args),
+                                dpi=args.dpi or QRCodeDocument.DEFAULT_DPI, page_workers=args.page_workers,
+                                decoders=decoders)
+        if dumper:
+            dumper.stop()
+        sys.exit(0)
+    if args.serve:
+        import QRCodeService
+        host, _, port = args.serve.rpartition(':')
+        QRCodeService.run_server(host or '127.0.0.1', int(port), workers=args.workers, max_queue=args.max_queue,
+                                 ladder=ladder, tiles=make_tiles(args), cache_path=args.cache,
+                                 history_path=args.history, decoders=decoders)
+        sys.exit(0)
+    if args.watch:
+        import QRCodeService
+        QRCodeService.run_watch(args.watch, workers=args.workers, recursive=args.recursive, ladder=ladder,
+                                history_path=args.history or QRCodeHistory.DB_FILE, cache_path=args.cache,
+                                tiles=make_tiles(args), dpi=args.dpi or QRCodeDocument.DEFAULT_DPI,
+                                page_workers=args.page_workers, decoders=decoders,
+                                poll_interval=args.poll, settle=args.settle)
+        if dumper:
+            dumper.stop()
+        sys.exit(0)
+    if args.archive:
+        db_path = args.history or QRCodeHistory.DB_FILE
+        count, months = QRCodeArchive.apply_retention(db_path, args.archive_dir, args.retention_days,
+                                                      args.retention_rows)
+        print(f"已归档 {count} 条记录" + (f"（{', '.join(months)}）" if months else ""), file=sys.stderr)
+        sys.exit(0)
+    if args.search_archive is not None:
+        archive_dir = args.archive_dir or QRCodeArchive.default_archive_dir(args.history or QRCodeHistory.DB_FILE)
+        for record in QRCodeArchive.search_archives(archive_dir, args.search_archive, limit=sys.maxsize):
+            print(json.dumps(record, ensure_ascii=False))
+        sys.exit(0)
+    if args.restore_archive:
+        with (sys.stdin if args.restore_archive == '-' else open(args.restore_archive, encoding='utf-8')) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        restored = QRCodeArchive.restore_records(args.history or QRCodeHistory.DB_FILE, records)
+        print(f"已恢复 {restored} 条记录（{len(records) - restored} 条已在历史记录中）", file=sys.stderr)
+        sys.exit(0)
+    if args.stream:
+        import QRCodeService
+        QRCodeService.run_stream(args.stream, ladder=ladder, max_skip=args.max_skip,
+                                 dedup_seconds=args.dedup, history_path=args.history)
+        if dumper:
+            dumper.stop()
+        sys.exit(0)
+
     # 必须在QApplication创建前设置高DPI
     QApplication.setAttribute(Qt.AA_EnableHighDpiScaling)
     QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps)
     
-    app = QApplication(sys.argv)
+    startup.enabled = args.startup_profile
+    app = QApplication(sys.argv[:1] + qt_args)
     app.setStyle('Fusion')  # 使用Fusion样式以获得更好的跨平台体验
+    startup.mark('创建QApplication')
     
     decoder = QRCodeDecoder()
+    decoder.backup_keep = args.backup_keep
+    if args.metrics:
+        decoder.start_metrics_dump(args.metrics, args.metrics_interval)
     decoder.show()
     sys.exit(app.exec_())
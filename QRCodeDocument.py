@@ -0,0 +1,173 @@
+"""多页文档（TIFF、PDF）解码：逐页读取或栅格化，用有界线程池并行解码，从不一次加载整个文档"""
+import os
+import time
+import shutil
+import tempfile
+import threading
+import subprocess
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+import QRCodeEngine
+
+try:
+    import pymupdf as fitz
+except ImportError:
+    try:
+        import fitz  # 旧版PyMuPDF的模块名
+    except ImportError:
+        fitz = None
+
+
+# 多页文档扩展名
+TIFF_EXTENSIONS = ('.tif', '.tiff')
+PDF_EXTENSIONS = ('.pdf',)
+DOCUMENT_EXTENSIONS = TIFF_EXTENSIONS + PDF_EXTENSIONS
+
+# PDF栅格化的默认分辨率
+DEFAULT_DPI = 200
+
+# PyMuPDF不是线程安全的，栅格化需要串行执行（解码仍然并行）
+_fitz_lock = threading.Lock()
+
+
+def is_document(path) -> bool:
+    """是否为按页处理的文档（TIFF或PDF）"""
+    return isinstance(path, (str, os.PathLike)) and os.fspath(path).lower().endswith(DOCUMENT_EXTENSIONS)
+
+
+def is_pdf(path) -> bool:
+    return os.fspath(path).lower().endswith(PDF_EXTENSIONS)
+
+
+def pdf_backend():
+    """可用的PDF栅格化方式：PyMuPDF或poppler的pdftoppm，都没有时返回None"""
+    if fitz is not None:
+        return 'pymupdf'
+    if shutil.which('pdftoppm') and shutil.which('pdfinfo'):
+        return 'pdftoppm'
+    return None
+
+
+def page_count(path) -> int:
+    """文档页数（只读取文件头和目录，不解码页面）"""
+    path = os.fspath(path)
+    if not is_pdf(path):
+        count = cv2.imcount(path)
+        if count <= 0:
+            raise ValueError(f"无法读取TIFF文件: {path}")
+        return count
+
+    backend = pdf_backend()
+    if backend == 'pymupdf':
+        with _fitz_lock, fitz.open(path) as doc:
+            return doc.page_count
+    if backend == 'pdftoppm':
+        output = subprocess.run(['pdfinfo', path], capture_output=True, text=True, check=True).stdout
+        for line in output.splitlines():
+            if line.startswith('Pages:'):
+                return int(line.split(':', 1)[1])
+        raise ValueError(f"无法读取PDF页数: {path}")
+    raise ValueError("解码PDF需要安装PyMuPDF（pip install pymupdf）或poppler-utils（pdftoppm）")
+
+
+def render_page(path, page, dpi=DEFAULT_DPI):
+    """读取或栅格化第page页（从1开始）为灰度图"""
+    path = os.fspath(path)
+    if not is_pdf(path):
+        ok, images = cv2.imreadmulti(path, start=page - 1, count=1, flags=cv2.IMREAD_GRAYSCALE)
+        if not ok or not images:
+            raise ValueError(f"无法读取TIFF第 {page} 页: {path}")
+        return images[0]
+
+    if pdf_backend() == 'pymupdf':
+        with _fitz_lock, fitz.open(path) as doc:
+            pix = doc[page - 1].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+            # 按行跨度复制出独立的数组，不再引用Pixmap的内存
+            return np.frombuffer(pix.samples, np.uint8).reshape(pix.height, pix.stride)[:, :pix.width].copy()
+
+    if pdf_backend() is None:
+        raise ValueError("解码PDF需要安装PyMuPDF（pip install pymupdf）或poppler-utils（pdftoppm）")
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, 'page')
+        subprocess.run(['pdftoppm', '-f', str(page), '-l', str(page), '-r', str(dpi),
+                        '-gray', '-singlefile', path, root], capture_output=True, check=True)
+        gray = cv2.imread(root + '.pgm', cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        raise ValueError(f"无法栅格化PDF第 {page} 页: {path}")
+    return gray
+
+
+def decode_page(path, page, dpi=DEFAULT_DPI, ladder=QRCodeEngine.DEFAULT_LADDER, tiles=None):
+    """读取并解码一页，结果和每个码都带页码"""
+    gray = render_page(path, page, dpi)
+    if tiles:
+        result = QRCodeEngine.decode_tiled(gray, tiles)
+    else:
+        result = QRCodeEngine.decode_image(gray, ladder)
+    result.source = os.fspath(path)
+    result.page = page
+    for symbol in result.symbols:
+        symbol.page = page
+    return result
+
+
+def iter_document(path, dpi=DEFAULT_DPI, workers=2, ladder=QRCodeEngine.DEFAULT_LADDER,
+                  tiles=None, is_cancelled=None):
+    """按页码顺序逐页生成解码结果DecodeResult
+
+    每页在线程池中读取和解码，同时处理中的页数不超过workers，
+    所以内存占用只与workers和单页大小有关，与总页数无关。
+    """
+    total = page_count(path)
+    workers = max(1, workers or 1)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        next_page = 1
+        while pending or next_page <= total:
+            while next_page <= total and len(pending) < workers:
+                if is_cancelled and is_cancelled():
+                    break
+                pending.append(pool.submit(decode_page, path, next_page, dpi, ladder, tiles))
+                next_page += 1
+            if not pending:
+                break
+            result = pending.popleft().result()
+            yield result, total
+            if is_cancelled and is_cancelled():
+                for future in pending:
+                    future.cancel()
+                return
+
+
+def decode_document(path, dpi=DEFAULT_DPI, workers=2, ladder=QRCodeEngine.DEFAULT_LADDER,
+                    tiles=None, progress=None, is_cancelled=None) -> QRCodeEngine.DecodeResult:
+    """解码整个文档，把各页识别到的码合并为一个结果（码的page字段为所在页码）
+
+    progress(已完成页数, 总页数)报告进度；width/height为第一页的尺寸，attempts为页数。
+    """
+    start = time.perf_counter()
+    merged = QRCodeEngine.DecodeResult(source=os.fspath(path))
+    steps = set()
+    for result, total in iter_document(path, dpi, workers, ladder, tiles, is_cancelled):
+        if result.page == 1:
+            merged.width, merged.height = result.width, result.height
+        merged.symbols.extend(result.symbols)
+        merged.attempts += 1
+        if result.ladder_step:
+            steps.add(result.ladder_step)
+        if progress:
+            progress(result.page, total)
+    merged.ladder_step = ",".join(sorted(steps))
+    merged.elapsed = time.perf_counter() - start
+    return merged
+
+
+def load_first_page(path, max_width, max_height, dpi=DEFAULT_DPI) -> QRCodeEngine.LoadedImage:
+    """读取文档第一页用于显示（预览坐标与decode_document结果中第1页的坐标一致）"""
+    gray = render_page(path, 1, dpi)
+    preview, scale = QRCodeEngine.make_preview(gray, max_width, max_height, upscale=False)
+    return QRCodeEngine.LoadedImage(os.fspath(path), gray, '', preview, scale)
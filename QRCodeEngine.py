@@ -0,0 +1,928 @@
+"""二维码/条形码解码引擎（不依赖GUI，可在脚本、批处理和子进程中直接调用）"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+import QRCodeMetrics as metrics
+
+
+# 支持的类型映射表
+TYPE_MAPPING = {
+    'AZTEC': 'Aztec码',
+    'CODE128': 'Code 128条形码',
+    'CODE39': 'Code 39条形码',
+    'CODE93': 'Code 93条形码',
+    'DATA MATRIX': 'Data Matrix码',
+    'EAN13': 'EAN-13条形码',
+    'EAN8': 'EAN-8条形码',
+    'ITF': 'ITF条形码',
+    'PDF417': 'PDF417码',
+    'QRCODE': '二维码',
+    'UPC-A': 'UPC-A条形码',
+    'UPC-E': 'UPC-E条形码'
+}
+
+# 批处理时识别的图片和多页文档扩展名
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tif', '.tiff', '.pdf')
+
+# 降分辨率解码阶梯：依次尝试1/4、1/2灰度图，都失败时才使用原始分辨率
+DEFAULT_LADDER = (4, 2, 1)
+
+# 缩小后短边低于该值的阶梯级别直接跳过（图片本身较小时缩小没有意义）
+MIN_LADDER_SIDE = 320
+
+# 读取文件时可由解码器直接输出的缩小灰度图
+REDUCED_GRAYSCALE_FLAGS = {
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8
+}
+
+# 分块解码：默认分块边长和重叠宽度（重叠需大于最大码的尺寸，保证每个码至少完整落在一个分块中）
+DEFAULT_TILE_SIZE = 2048
+DEFAULT_TILE_OVERLAP = 256
+
+# 界面中超过该像素数的图片自动使用分块解码
+TILE_AUTO_PIXELS = 40_000_000
+
+# 历史记录缩略图的最长边（像素）和JPEG质量
+THUMBNAIL_SIZE = 256
+THUMBNAIL_QUALITY = 80
+
+
+@dataclass
+class DecodedSymbol:
+    """单个识别结果（坐标均为原图分辨率）"""
+    type: str
+    data: bytes
+    rect: tuple
+    polygon: list
+    quality: int = 0
+    page: int = 0       # 多页文档中的页码（从1开始），单张图片为0
+
+    @property
+    def type_name(self) -> str:
+        """类型的中文名称"""
+        return TYPE_MAPPING.get(self.type, self.type)
+
+    @property
+    def text(self) -> str:
+        """解码后的文本内容"""
+        try:
+            return self.data.decode('utf-8')
+        except UnicodeDecodeError:
+            return str(self.data)
+
+    def to_dict(self) -> dict:
+        """转换为可JSON序列化的字典"""
+        return {
+            'type': self.type,
+            'type_name': self.type_name,
+            'text': self.text,
+            'data': self.data.hex(),
+            'rect': list(self.rect),
+            'polygon': [list(point) for point in self.polygon],
+            'quality': self.quality,
+            'page': self.page
+        }
+
+    @classmethod
+    def from_dict(cls, d) -> 'DecodedSymbol':
+        """从to_dict生成的字典还原"""
+        return cls(
+            type=d['type'],
+            data=bytes.fromhex(d['data']),
+            rect=tuple(d['rect']),
+            polygon=[tuple(point) for point in d['polygon']],
+            quality=d.get('quality', 0),
+            page=d.get('page', 0)
+        )
+
+    def scaled(self, sx, sy) -> 'DecodedSymbol':
+        """把坐标按比例映射回原图分辨率"""
+        x, y, w, h = self.rect
+        return DecodedSymbol(
+            type=self.type,
+            data=self.data,
+            rect=(round(x * sx), round(y * sy), round(w * sx), round(h * sy)),
+            polygon=[(round(px * sx), round(py * sy)) for px, py in self.polygon],
+            quality=self.quality,
+            page=self.page
+        )
+
+    def translated(self, dx, dy) -> 'DecodedSymbol':
+        """把在裁剪区域中得到的坐标平移回整幅图像"""
+        x, y, w, h = self.rect
+        return DecodedSymbol(
+            type=self.type,
+            data=self.data,
+            rect=(x + dx, y + dy, w, h),
+            polygon=[(px + dx, py + dy) for px, py in self.polygon],
+            quality=self.quality,
+            page=self.page
+        )
+
+    @classmethod
+    def from_zbar(cls, obj) -> 'DecodedSymbol':
+        """从pyzbar的Decoded对象构造"""
+        return cls(
+            type=obj.type,
+            data=bytes(obj.data),
+            rect=tuple(int(v) for v in obj.rect),
+            polygon=[(int(p[0]), int(p[1])) for p in obj.polygon],
+            quality=int(getattr(obj, 'quality', 0) or 0)
+        )
+
+
+@dataclass
+class DecodeResult:
+    """一张图片的解码结果"""
+    source: str
+    symbols: list = field(default_factory=list)
+    width: int = 0
+    height: int = 0
+    elapsed: float = 0.0
+    error: str = ''
+    ladder_step: str = ''    # 识别成功的分辨率阶梯级别，如"1/4"；未识别到时为空
+    attempts: int = 0        # 实际尝试的阶梯级别数
+    cached: bool = False     # 是否来自解码结果缓存
+    page: int = 0            # 多页文档中的页码（从1开始），单张图片为0
+    backend: str = ''        # 识别出结果的解码后端
+
+    def to_dict(self) -> dict:
+        """转换为可JSON序列化的字典"""
+        return {
+            'source': self.source,
+            'width': self.width,
+            'height': self.height,
+            'elapsed_ms': round(self.elapsed * 1000, 3),
+            'error': self.error,
+            'ladder_step': self.ladder_step,
+            'attempts': self.attempts,
+            'cached': self.cached,
+            'page': self.page,
+            'backend': self.backend,
+            'symbols': [symbol.to_dict() for symbol in self.symbols]
+        }
+
+    @classmethod
+    def from_dict(cls, d) -> 'DecodeResult':
+        """从to_dict生成的字典还原"""
+        return cls(
+            source=d['source'],
+            symbols=[DecodedSymbol.from_dict(symbol) for symbol in d['symbols']],
+            width=d['width'],
+            height=d['height'],
+            elapsed=d['elapsed_ms'] / 1000,
+            error=d.get('error', ''),
+            ladder_step=d.get('ladder_step', ''),
+            attempts=d.get('attempts', 0),
+            page=d.get('page', 0),
+            backend=d.get('backend', '')
+        )
+
+    def format_text(self) -> str:
+        """生成界面中显示的结果文本"""
+        return format_symbols(self.symbols)
+
+    def payload_text(self) -> str:
+        """生成历史记录中保存的内容"""
+        return payload_text(self.symbols)
+
+
+def format_symbols(symbols) -> str:
+    """拼接所有解码结果，包含类型信息"""
+    results = []
+    for i, symbol in enumerate(symbols):
+        # 添加序号和更明显的分隔
+        page = f"页码: {symbol.page}\n" if symbol.page else ""
+        results.append(f"=== 识别结果 {i+1} ===\n类型: {symbol.type_name}\n{page}内容:\n{symbol.text}")
+    return "\n\n".join(results)
+
+
+def payload_text(symbols) -> str:
+    """只拼接各个码的内容（每个码一行），类型、页码等由码明细保存，显示时再格式化"""
+    return "\n".join(symbol.text for symbol in symbols)
+
+
+def source_name(source) -> str:
+    """生成输入源的描述名称"""
+    if isinstance(source, np.ndarray):
+        return "<ndarray>"
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return "<bytes>"
+    return os.fspath(source)
+
+
+def read_file(path) -> bytes:
+    """读取文件的原始字节（用于计算内容哈希并在内存中解码）"""
+    with metrics.timer('file_read'), open(path, 'rb') as f:
+        return f.read()
+
+
+def content_hash(data) -> str:
+    """计算文件字节或像素缓冲区的内容哈希"""
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(data, np.ndarray):
+        # 像素缓冲区：尺寸和类型也参与哈希，避免内容相同但形状不同的冲突
+        h.update(f"{data.shape}{data.dtype}".encode())
+        data = np.ascontiguousarray(data)
+    h.update(memoryview(data))
+    return h.hexdigest()
+
+
+def load_image(source):
+    """把文件路径、图片字节或ndarray统一转换为OpenCV图像"""
+    if isinstance(source, np.ndarray):
+        img = source
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        with metrics.timer('image_decode'):
+            img = cv2.imdecode(np.frombuffer(source, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError("无法解析图片数据")
+    else:
+        path = os.fspath(source)
+        with metrics.timer('image_decode'):
+            img = cv2.imread(path)
+        if img is None:
+            raise ValueError(f"无法加载图片文件: {path}")
+
+    # 检查图片是否有效
+    if img.size == 0:
+        raise ValueError("无效的图片数据")
+    return img
+
+
+def to_gray(img):
+    """转换为单通道灰度图（已是灰度图时直接返回）"""
+    if img.ndim == 2:
+        return img
+    with metrics.timer('color_convert'):
+        if img.shape[2] == 4:
+            return cv2.cvtColor(img, cv2.COLOR_BGRA2GRAY)
+        return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+
+def iter_ladder(source, ladder=DEFAULT_LADDER):
+    """按分辨率阶梯依次生成(缩小倍数, 灰度图, 原图宽, 原图高)，只在需要时才生成下一级"""
+    factors = sorted(set(ladder) | {1}, reverse=True)
+
+    if isinstance(source, np.ndarray):
+        img = load_image(source)
+        height, width = img.shape[:2]
+        # 只做一次灰度转换，各级都从灰度图缩小
+        gray = to_gray(img)
+        for factor in factors:
+            if factor == 1:
+                yield 1, gray, width, height
+                continue
+            w, h = width // factor, height // factor
+            if min(w, h) < MIN_LADDER_SIDE:
+                continue
+            yield factor, cv2.resize(gray, (w, h), interpolation=cv2.INTER_AREA), width, height
+        return
+
+    # 文件路径或图片字节：让图片解码器直接输出缩小的灰度图，省去全分辨率解码
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        buffer = np.frombuffer(source, np.uint8)
+        name = "图片数据"
+
+        def read(flag):
+            with metrics.timer('image_decode'):
+                return cv2.imdecode(buffer, flag)
+    else:
+        name = os.fspath(source)
+
+        def read(flag):
+            with metrics.timer('image_decode'):
+                return cv2.imread(name, flag)
+
+    full_size = None
+    for factor in factors:
+        if factor != 1:
+            if factor not in REDUCED_GRAYSCALE_FLAGS:
+                continue
+            if full_size and min(full_size) // factor < MIN_LADDER_SIDE:
+                continue
+            gray = read(REDUCED_GRAYSCALE_FLAGS[factor])
+            if gray is None or gray.size == 0:
+                raise ValueError(f"无法加载图片文件: {name}")
+            h, w = gray.shape
+            # 原图尺寸按缩小倍数估算（误差小于一个缩放单位）
+            full_size = (w * factor, h * factor)
+            if min(w, h) < MIN_LADDER_SIDE:
+                continue
+            yield factor, gray, full_size[0], full_size[1]
+        else:
+            gray = read(cv2.IMREAD_GRAYSCALE)
+            if gray is None or gray.size == 0:
+                raise ValueError(f"无法加载图片文件: {name}")
+            yield 1, gray, gray.shape[1], gray.shape[0]
+
+
+class DecoderBackend:
+    """解码后端接口：decode(灰度图)返回DecodedSymbol列表"""
+    name = ''
+    symbologies = None      # 能识别的码类型集合，None表示全部
+
+    def decode(self, gray) -> list:
+        raise NotImplementedError
+
+
+class ZbarBackend(DecoderBackend):
+    """pyzbar（zbar）：支持的码类型最全"""
+    name = 'zbar'
+
+    def __init__(self):
+        # 创建后端时才导入（需要zbar动态库），只用OpenCV后端时不依赖zbar
+        from pyzbar.pyzbar import decode
+        self.scan = decode
+
+    def decode(self, gray) -> list:
+        return [DecodedSymbol.from_zbar(obj) for obj in self.scan(gray)]
+
+
+def symbol_from_points(code_type, text, points) -> DecodedSymbol:
+    """由OpenCV检测器返回的角点构造DecodedSymbol"""
+    polygon = [(int(round(x)), int(round(y))) for x, y in points]
+    xs = [x for x, y in polygon]
+    ys = [y for x, y in polygon]
+    rect = (min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys))
+    return DecodedSymbol(type=code_type, data=text.encode('utf-8'), rect=rect, polygon=polygon)
+
+
+class OpenCVQRBackend(DecoderBackend):
+    """OpenCV二维码检测器（有ArUco版本时优先使用，对透视变形和模糊更稳健）"""
+    name = 'opencv-qr'
+    symbologies = {'QRCODE'}
+
+    def __init__(self):
+        # 检测器对象不是线程安全的，每个线程各自创建
+        self.local = threading.local()
+
+    def detector(self):
+        if not hasattr(self.local, 'detector'):
+            factory = getattr(cv2, 'QRCodeDetectorAruco', cv2.QRCodeDetector)
+            self.local.detector = factory()
+        return self.local.detector
+
+    def decode(self, gray) -> list:
+        ok, texts, points, _ = self.detector().detectAndDecodeMulti(gray)
+        if not ok or points is None:
+            return []
+        return [symbol_from_points('QRCODE', text, pts) for text, pts in zip(texts, points) if text]
+
+
+# OpenCV条形码类型名到zbar类型名的映射
+OPENCV_BARCODE_TYPES = {
+    'EAN_13': 'EAN13',
+    'EAN_8': 'EAN8',
+    'UPC_A': 'UPC-A',
+    'UPC_E': 'UPC-E',
+    'CODE_128': 'CODE128',
+    'CODE_39': 'CODE39',
+}
+
+
+class OpenCVBarcodeBackend(DecoderBackend):
+    """OpenCV一维条形码检测器（cv2.barcode）"""
+    name = 'opencv-barcode'
+    symbologies = set(OPENCV_BARCODE_TYPES.values())
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def detector(self):
+        if not hasattr(self.local, 'detector'):
+            self.local.detector = cv2.barcode.BarcodeDetector()
+        return self.local.detector
+
+    def decode(self, gray) -> list:
+        ok, texts, types, points = self.detector().detectAndDecodeWithType(gray)
+        if not ok or points is None:
+            return []
+        return [symbol_from_points(OPENCV_BARCODE_TYPES.get(code_type, code_type), text, pts)
+                for text, code_type, pts in zip(texts, types, points) if text]
+
+
+# 可用的解码后端
+BACKENDS = {
+    'zbar': ZbarBackend,
+    'opencv-qr': OpenCVQRBackend,
+    'opencv-barcode': OpenCVBarcodeBackend,
+}
+
+# 多个后端的组合方式：fixed只用第一个，fallback依次尝试直到有结果，race并行执行取最先返回的非空结果
+STRATEGIES = ('fixed', 'fallback', 'race')
+
+
+class BackendStats:
+    """各解码后端的调用次数、成功次数和耗时统计（线程安全）"""
+    SAMPLES = 1000      # 每个后端保留最近多少次耗时用于计算分位数
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.backends = {}
+
+    def record(self, name, elapsed, found, error=False):
+        with self.lock:
+            stats = self.backends.setdefault(name, {
+                'calls': 0, 'hits': 0, 'symbols': 0, 'errors': 0, 'wins': 0,
+                'total': 0.0, 'samples': deque(maxlen=self.SAMPLES)
+            })
+            stats['calls'] += 1
+            stats['hits'] += 1 if found else 0
+            stats['symbols'] += found
+            stats['errors'] += 1 if error else 0
+            stats['total'] += elapsed
+            stats['samples'].append(elapsed)
+
+    def record_win(self, name):
+        """记录该后端的结果被采用（race模式下最先返回）"""
+        with self.lock:
+            if name in self.backends:
+                self.backends[name]['wins'] += 1
+
+    def summary(self) -> dict:
+        """各后端的统计摘要（耗时单位为毫秒）"""
+        with self.lock:
+            result = {}
+            for name, stats in self.backends.items():
+                samples = sorted(stats['samples'])
+                result[name] = {
+                    'calls': stats['calls'],
+                    'hits': stats['hits'],
+                    'wins': stats['wins'],
+                    'symbols': stats['symbols'],
+                    'errors': stats['errors'],
+                    'success_rate': stats['hits'] / stats['calls'] if stats['calls'] else 0.0,
+                    'mean_ms': stats['total'] * 1000 / stats['calls'] if stats['calls'] else 0.0,
+                    'p50_ms': samples[len(samples) // 2] * 1000 if samples else 0.0,
+                    'p95_ms': samples[int(len(samples) * 0.95)] * 1000 if samples else 0.0,
+                }
+            return result
+
+    def format_text(self) -> str:
+        lines = []
+        for name, stats in self.summary().items():
+            lines.append(f"{name}: 调用 {stats['calls']} 次，成功 {stats['hits']} 次"
+                         f"（{stats['success_rate']:.0%}），采用 {stats['wins']} 次，"
+                         f"平均 {stats['mean_ms']:.1f} ms，P95 {stats['p95_ms']:.1f} ms")
+        return "\n".join(lines)
+
+    def reset(self):
+        with self.lock:
+            self.backends.clear()
+
+
+class DecoderChain:
+    """按策略组合多个解码后端
+
+    symbologies指定只需要的码类型时，不会调用无法识别这些类型的后端，结果也只保留这些类型。
+    """
+    def __init__(self, backends=('zbar',), strategy='fallback', symbologies=None, stats=None):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"不支持的解码策略: {strategy}")
+        unknown = [name for name in backends if name not in BACKENDS]
+        if unknown:
+            raise ValueError(f"未知的解码后端: {', '.join(unknown)}")
+        self.symbologies = set(symbologies) if symbologies else None
+        self.backends = [BACKENDS[name]() for name in backends]
+        if self.symbologies:
+            # 按码类型路由：跳过不可能识别到所需类型的后端
+            self.backends = [backend for backend in self.backends
+                             if backend.symbologies is None or backend.symbologies & self.symbologies]
+            if not self.backends:
+                raise ValueError("没有可以识别所需码类型的解码后端")
+        if strategy == 'fixed':
+            self.backends = self.backends[:1]
+        self.strategy = strategy
+        self.stats = stats or BackendStats()
+        self.local = threading.local()
+        self.pool = None
+        self.pool_lock = threading.Lock()
+
+    @property
+    def last_backend(self) -> str:
+        """当前线程最近一次解码得到结果的后端名"""
+        return getattr(self.local, 'last_backend', '')
+
+    def run_backend(self, backend, gray) -> list:
+        start = time.perf_counter()
+        try:
+            symbols = backend.decode(gray)
+        except Exception:
+            self.stats.record(backend.name, time.perf_counter() - start, 0, error=True)
+            return []
+        if self.symbologies:
+            symbols = [symbol for symbol in symbols if symbol.type in self.symbologies]
+        self.stats.record(backend.name, time.perf_counter() - start, len(symbols))
+        return symbols
+
+    def decode(self, gray) -> list:
+        self.local.last_backend = ''
+        if self.strategy == 'race' and len(self.backends) > 1:
+            return self.race(gray)
+        for backend in self.backends:
+            symbols = self.run_backend(backend, gray)
+            if symbols:
+                self.local.last_backend = backend.name
+                self.stats.record_win(backend.name)
+                return symbols
+        return []
+
+    def race(self, gray) -> list:
+        """所有后端并行执行，返回最先得到的非空结果（其余后端在后台完成并计入统计）"""
+        with self.pool_lock:
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(max_workers=len(self.backends) * (os.cpu_count() or 1),
+                                               thread_name_prefix='decode-race')
+        futures = {self.pool.submit(self.run_backend, backend, gray): backend for backend in self.backends}
+        for future in as_completed(futures):
+            symbols = future.result()
+            if symbols:
+                name = futures[future].name
+                self.local.last_backend = name
+                self.stats.record_win(name)
+                return symbols
+        return []
+
+    def describe(self) -> str:
+        return f"{self.strategy}:" + ",".join(backend.name for backend in self.backends)
+
+
+# 当前使用的解码后端组合（默认只用zbar，与原行为一致）
+_decoder_chain = None
+_decoder_chain_lock = threading.Lock()
+
+
+def get_decoder_chain() -> DecoderChain:
+    """当前的解码后端组合（未配置时首次调用创建默认的zbar后端）"""
+    global _decoder_chain
+    if _decoder_chain is None:
+        with _decoder_chain_lock:
+            if _decoder_chain is None:
+                _decoder_chain = DecoderChain()
+    return _decoder_chain
+
+
+def set_decoder_chain(chain):
+    """替换全局解码后端组合（影响之后的所有解码调用）"""
+    global _decoder_chain
+    _decoder_chain = chain
+
+
+def configure_decoders(backends=('zbar',), strategy='fallback', symbologies=None) -> DecoderChain:
+    """按后端名称列表和策略创建并启用解码后端组合"""
+    chain = DecoderChain(backends, strategy, symbologies)
+    set_decoder_chain(chain)
+    return chain
+
+
+def decode_array(img) -> list:
+    """对已加载的图像执行解码，返回DecodedSymbol列表"""
+    with metrics.timer('symbol_decode'):
+        return get_decoder_chain().decode(img)
+
+
+def decode_image(source, ladder=DEFAULT_LADDER) -> DecodeResult:
+    """解码路径、字节或ndarray中的二维码和条形码
+
+    先在缩小的灰度图上尝试，识别不到时再逐级提高分辨率，
+    结果坐标统一映射回原图分辨率。ladder=(1,)表示只用原始分辨率。
+    """
+    start = time.perf_counter()
+    result = DecodeResult(source=source_name(source))
+    for factor, gray, width, height in iter_ladder(source, ladder):
+        result.width, result.height = width, height
+        result.attempts += 1
+        symbols = decode_array(gray)
+        if symbols:
+            if factor != 1:
+                sx = width / gray.shape[1]
+                sy = height / gray.shape[0]
+                symbols = [symbol.scaled(sx, sy) for symbol in symbols]
+            result.symbols = symbols
+            result.ladder_step = f"1/{factor}"
+            result.backend = get_decoder_chain().last_backend
+            break
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+@dataclass
+class TileConfig:
+    """分块解码配置"""
+    size: int = DEFAULT_TILE_SIZE
+    overlap: int = DEFAULT_TILE_OVERLAP
+    workers: int = None     # 线程数，默认为CPU核心数
+
+    def tag(self) -> str:
+        return f"tile={self.size},{self.overlap}"
+
+
+def load_gray(source):
+    """以全分辨率灰度图加载路径、字节或ndarray"""
+    if isinstance(source, np.ndarray):
+        return to_gray(load_image(source))
+    with metrics.timer('image_decode'):
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            gray = cv2.imdecode(np.frombuffer(source, np.uint8), cv2.IMREAD_GRAYSCALE)
+        else:
+            gray = cv2.imread(os.fspath(source), cv2.IMREAD_GRAYSCALE)
+    if gray is None or gray.size == 0:
+        raise ValueError(f"无法加载图片文件: {source_name(source)}")
+    return gray
+
+
+def iter_tiles(width, height, size=DEFAULT_TILE_SIZE, overlap=DEFAULT_TILE_OVERLAP):
+    """生成覆盖整幅图像、相邻之间重叠overlap像素的分块(x, y, w, h)"""
+    if overlap >= size:
+        raise ValueError("分块重叠宽度必须小于分块边长")
+    step = size - overlap
+    xs = list(range(0, max(width - overlap, 1), step))
+    ys = list(range(0, max(height - overlap, 1), step))
+    for y in ys:
+        for x in xs:
+            yield x, y, min(size, width - x), min(size, height - y)
+
+
+def merge_symbols(symbols) -> list:
+    """合并各分块的结果：同类型同内容且位置重叠的只保留面积最大（最完整）的一个
+
+    内容相同但位置不重叠的码（如同一标签贴了两张）都会保留。
+    """
+    def overlaps(a, b):
+        ax, ay, aw, ah = a.rect
+        bx, by, bw, bh = b.rect
+        return ax < bx + bw and bx < ax + aw and ay < by + bh and by < ay + ah
+
+    merged = []
+    for symbol in sorted(symbols, key=lambda s: s.rect[2] * s.rect[3], reverse=True):
+        if not any(kept.type == symbol.type and kept.data == symbol.data and overlaps(kept, symbol)
+                   for kept in merged):
+            merged.append(symbol)
+    # 按从上到下、从左到右的阅读顺序排列
+    merged.sort(key=lambda s: (s.rect[1], s.rect[0]))
+    return merged
+
+
+def decode_tiled(source, tiles=None) -> DecodeResult:
+    """把大图切成重叠的分块，在线程池中并行解码后合并，坐标映射回原图
+
+    zbar通过ctypes调用时会释放GIL，线程池即可并行利用多核，且分块无需复制像素。
+    """
+    tiles = tiles or TileConfig()
+    start = time.perf_counter()
+    result = DecodeResult(source=source_name(source))
+    gray = load_gray(source)
+    height, width = gray.shape
+    result.width, result.height = width, height
+
+    def decode_tile(tile):
+        x, y, w, h = tile
+        symbols = [symbol.translated(x, y) for symbol in decode_array(gray[y:y + h, x:x + w])]
+        return symbols, get_decoder_chain().last_backend
+
+    boxes = list(iter_tiles(width, height, tiles.size, tiles.overlap))
+    workers = min(len(boxes), tiles.workers or os.cpu_count() or 1)
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(decode_tile, boxes))
+    else:
+        outcomes = [decode_tile(tile) for tile in boxes]
+
+    found = [symbol for symbols, backend in outcomes for symbol in symbols]
+    result.symbols = merge_symbols(found)
+    result.attempts = len(boxes)
+    result.backend = ",".join(sorted({backend for symbols, backend in outcomes if symbols}))
+    if result.symbols:
+        result.ladder_step = f"分块x{len(boxes)}"
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def config_tag(ladder=DEFAULT_LADDER, tiles=None) -> str:
+    """解码配置的标识（作为缓存键的一部分，包含解码后端组合）"""
+    if tiles:
+        tag = tiles.tag()
+    else:
+        tag = "ladder=" + ",".join(str(factor) for factor in sorted(set(ladder) | {1}, reverse=True))
+    chain = get_decoder_chain().describe()
+    # 默认后端组合不加入标识，保持已有缓存可用
+    return tag if chain == "fallback:zbar" else f"{tag};{chain}"
+
+
+def decode_with_cache(data, cache=None, ladder=DEFAULT_LADDER, digest=None, tiles=None) -> DecodeResult:
+    """先按内容哈希查询缓存，未命中时再解码并写入缓存
+
+    data为文件字节或像素数组；已算好内容哈希时可通过digest传入。
+    指定tiles（TileConfig）时使用分块并行解码，否则按分辨率阶梯解码。
+    """
+    def run():
+        with metrics.timer('decode_total'):
+            return decode_tiled(data, tiles) if tiles else decode_image(data, ladder)
+
+    if cache is None:
+        return run()
+    key = cache.make_key(digest or content_hash(data), config_tag(ladder, tiles))
+    result = cache.get(key)
+    if result is None:
+        result = run()
+        cache.put(key, result)
+    return result
+
+
+def annotate_image(img, symbols, scale=1.0):
+    """在图片上标记识别结果的位置和序号（直接修改传入的图像）
+
+    scale为img相对原图的缩放比例，用于在缩小的预览图上绘制，无需复制原图。
+    """
+    with metrics.timer('annotate'):
+        return _annotate(img, symbols, scale)
+
+
+def _annotate(img, symbols, scale):
+    for i, symbol in enumerate(symbols):
+        if scale != 1.0:
+            symbol = symbol.scaled(scale, scale)
+        points = symbol.polygon
+        if len(points) > 4:
+            hull = cv2.convexHull(np.array(points, dtype=np.int32))
+            cv2.polylines(img, [hull], True, (0, 255, 0), 2)
+        else:
+            # 绘制边界框
+            x, y, w, h = symbol.rect
+            cv2.rectangle(img, (x, y), (x+w, y+h), (0, 255, 0), 2)
+
+        # 在图片上添加序号标签
+        cv2.putText(img, str(i+1), (symbol.rect[0], symbol.rect[1]-10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
+    return img
+
+
+@dataclass
+class LoadedImage:
+    """只解码一次的图片：原图数组、文件内容哈希和显示用的预览图"""
+    path: str
+    image: np.ndarray
+    digest: str
+    preview: np.ndarray
+    scale: float    # 预览图相对原图的缩放比例
+
+
+def make_preview(img, max_width, max_height, upscale=True):
+    """按比例缩放到显示区域大小，返回(预览图, 缩放比例)
+
+    upscale=False时小图不放大，直接返回原数组（不复制）。
+    """
+    height, width = img.shape[:2]
+    scale = min(max_width / width, max_height / height)
+    if not upscale:
+        scale = min(scale, 1.0)
+    if scale <= 0 or scale == 1.0:
+        return img, 1.0
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+    with metrics.timer('pixmap_scale'):
+        return cv2.resize(img, size, interpolation=interpolation), scale
+
+
+def make_thumbnail(img, size=THUMBNAIL_SIZE) -> bytes:
+    """生成历史记录缩略图（JPEG字节）；传入已缩小的预览图即可，不需要全分辨率原图"""
+    thumbnail, _ = make_preview(img, size, size, upscale=False)
+    ok, data = cv2.imencode('.jpg', thumbnail, [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_QUALITY])
+    if not ok:
+        raise ValueError("缩略图编码失败")
+    return data.tobytes()
+
+
+def load_for_display(path, max_width, max_height) -> LoadedImage:
+    """读取文件并只做一次全分辨率解码，同时生成内容哈希和预览图
+
+    预览图只缩小不放大（显示时再按控件大小缩放），不超过上限的图片预览图就是原图本身。
+    """
+    data = read_file(path)
+    digest = content_hash(data)
+    img = load_image(data)
+    del data  # 尽早释放压缩数据
+    preview, scale = make_preview(img, max_width, max_height, upscale=False)
+    return LoadedImage(os.fspath(path), img, digest, preview, scale)
+
+
+def iter_image_files(directory, recursive=False):
+    """遍历目录中的图片文件（按文件名排序）"""
+    if recursive:
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield os.path.join(root, name)
+    else:
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if name.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(path):
+                yield path
+
+
+class DecodeCache:
+    """按内容哈希缓存解码结果（SQLite侧表，按条目数和字节数做LRU淘汰，可跨线程使用）"""
+    def __init__(self, db_path, max_entries=10000, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        # 与历史记录共用数据库文件时，由谁先建表都启用增量回收（对已有数据库无影响）
+        self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS decode_cache (
+                key TEXT PRIMARY KEY,
+                result TEXT,
+                size INTEGER,
+                last_used REAL
+            )
+        ''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_decode_cache_last_used ON decode_cache(last_used)")
+        self.conn.commit()
+        self.entries, self.total_bytes = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM decode_cache"
+        ).fetchone()
+
+    @staticmethod
+    def make_key(digest, tag='') -> str:
+        """组合内容哈希和解码配置（配置不同的结果分开缓存）"""
+        return f"{digest}|{tag}" if tag else digest
+
+    def get(self, key):
+        """查询缓存，命中时返回DecodeResult并刷新使用时间"""
+        with self.lock:
+            row = self.conn.execute("SELECT result FROM decode_cache WHERE key=?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute("UPDATE decode_cache SET last_used=? WHERE key=?", (time.time(), key))
+            self.conn.commit()
+        result = DecodeResult.from_dict(json.loads(row[0]))
+        result.cached = True
+        return result
+
+    def put(self, key, result):
+        """写入缓存并在超出限制时淘汰最久未使用的条目"""
+        data = json.dumps(result.to_dict(), ensure_ascii=False)
+        size = len(data.encode('utf-8'))
+        with self.lock:
+            old = self.conn.execute("SELECT size FROM decode_cache WHERE key=?", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO decode_cache (key, result, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, data, size, time.time())
+            )
+            if old:
+                self.total_bytes -= old[0]
+            else:
+                self.entries += 1
+            self.total_bytes += size
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        """淘汰最久未使用的条目，直到满足条目数和字节数限制"""
+        while self.entries > self.max_entries or self.total_bytes > self.max_bytes:
+            rows = self.conn.execute(
+                "SELECT key, size FROM decode_cache ORDER BY last_used LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self.entries, self.total_bytes = 0, 0
+                break
+            for key, size in rows:
+                self.conn.execute("DELETE FROM decode_cache WHERE key=?", (key,))
+                self.entries -= 1
+                self.total_bytes -= size
+                if self.entries <= self.max_entries and self.total_bytes <= self.max_bytes:
+                    break
+
+    def clear(self):
+        """清空缓存"""
+        with self.lock:
+            self.conn.execute("DELETE FROM decode_cache")
+            self.conn.commit()
+            self.entries, self.total_bytes = 0, 0
+
+    def stats_text(self) -> str:
+        """命中统计的描述文本"""
+        return f"缓存命中 {self.hits} / 未命中 {self.misses}（{self.entries} 条）"
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,880 @@
+"""历史记录数据库（SQLite）：表结构迁移、连接性能配置和常用读写操作，不依赖GUI"""
+import os
+import csv
+import gzip
+import json
+import glob
+import shutil
+import sqlite3
+import datetime
+import tempfile
+import itertools
+import threading
+import time
+
+import QRCodeMetrics as metrics
+
+
+# 默认数据库文件
+DB_FILE = 'qrcode_history.db'
+
+# 连接性能配置：WAL日志允许读写并发，NORMAL同步在WAL下既安全又省去每次提交的fsync
+PRAGMAS = (
+    "PRAGMA auto_vacuum=INCREMENTAL",  # 必须在建表（和切换WAL）之前设置才对新数据库生效；已有数据库需VACUUM一次
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",        # 64MB页缓存
+    "PRAGMA mmap_size=268435456",      # 256MB内存映射读取
+    "PRAGMA temp_store=MEMORY",
+)
+
+# 备份文件名前缀、默认保留份数和每步复制的页数（4KB页，约16MB）
+BACKUP_PREFIX = 'qrcode_history_'
+BACKUP_KEEP = 10
+BACKUP_STEP_PAGES = 4096
+
+# 空闲时每次增量回收的最多页数，保证写锁只占用很短时间
+IDLE_VACUUM_PAGES = 2048
+
+# 缩略图缓存的默认容量（约256像素的JPEG，每张十几KB，超出时淘汰最久未使用的）
+THUMBNAIL_MAX_BYTES = 32 * 1024 * 1024
+
+# 支持的导出格式
+EXPORT_FORMATS = ('csv', 'json', 'ndjson')
+
+# 历史列表的排序方式（与idx_history_list索引一致）
+LIST_ORDER = "is_favorite DESC, timestamp DESC, id DESC"
+
+
+def parse_version(version) -> tuple:
+    """把"1.2.0"形式的版本号转换为可比较的元组"""
+    return tuple(int(part) for part in version.split('.'))
+
+
+def connect(db_path=DB_FILE, check_same_thread=True):
+    """打开数据库连接并应用性能配置"""
+    conn = sqlite3.connect(db_path, timeout=30, check_same_thread=check_same_thread)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def migrate_1_1_0(cursor):
+    """1.1.0：为列表排序和按类型/时间筛选建立索引"""
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_history_list ON history({LIST_ORDER})")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_history_type_time ON history(code_type, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_history_time ON history(timestamp)")
+
+
+# 全文索引同步触发器（外部内容表，索引只保存分词数据，不重复存储内容）
+FTS_TRIGGERS = {
+    'history_fts_ai': """
+        CREATE TRIGGER IF NOT EXISTS history_fts_ai AFTER INSERT ON history BEGIN
+            INSERT INTO history_fts(rowid, content) VALUES (new.id, new.content);
+        END
+    """,
+    'history_fts_ad': """
+        CREATE TRIGGER IF NOT EXISTS history_fts_ad AFTER DELETE ON history BEGIN
+            INSERT INTO history_fts(history_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        END
+    """,
+    'history_fts_au': """
+        CREATE TRIGGER IF NOT EXISTS history_fts_au AFTER UPDATE OF content ON history BEGIN
+            INSERT INTO history_fts(history_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            INSERT INTO history_fts(rowid, content) VALUES (new.id, new.content);
+        END
+    """,
+}
+
+
+def migrate_1_2_0(cursor):
+    """1.2.0：建立历史内容的FTS5全文索引、同步触发器，并回填已有记录"""
+    try:
+        # trigram分词支持中文和任意子串（如运单号片段）搜索；旧版SQLite退回unicode61
+        try:
+            cursor.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS history_fts
+                USING fts5(content, content='history', content_rowid='id', tokenize='trigram')
+            """)
+        except sqlite3.OperationalError:
+            cursor.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS history_fts
+                USING fts5(content, content='history', content_rowid='id')
+            """)
+    except sqlite3.OperationalError:
+        return  # SQLite未编译FTS5，搜索退回LIKE扫描
+    for sql in FTS_TRIGGERS.values():
+        cursor.execute(sql)
+    cursor.execute("INSERT INTO history_fts(history_fts) VALUES ('rebuild')")
+
+
+# 删除历史记录时同步删除其识别结果明细
+SYMBOLS_TRIGGER = """
+    CREATE TRIGGER IF NOT EXISTS history_symbols_ad AFTER DELETE ON history BEGIN
+        DELETE FROM history_symbols WHERE history_id = old.id;
+    END
+"""
+
+
+def migrate_1_3_0(cursor):
+    """1.3.0：每个识别出的码单独一行的明细表，按类型和内容建立索引"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS history_symbols (
+            id INTEGER PRIMARY KEY,
+            history_id INTEGER NOT NULL REFERENCES history(id),
+            seq INTEGER NOT NULL,       -- 在该次识别结果中的序号
+            type TEXT,
+            data BLOB,                  -- 原始字节
+            text TEXT,                  -- 按UTF-8解码后的内容
+            rect TEXT,                  -- JSON [x, y, w, h]
+            polygon TEXT,               -- JSON [[x, y], ...]
+            quality INTEGER
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_symbols_history ON history_symbols(history_id, seq)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_symbols_type ON history_symbols(type, history_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_symbols_text ON history_symbols(text)")
+    cursor.execute(SYMBOLS_TRIGGER)
+
+
+def migrate_1_4_0(cursor):
+    """1.4.0：码明细记录所在的文档页码（单张图片为0）"""
+    cursor.execute("ALTER TABLE history_symbols ADD COLUMN page INTEGER DEFAULT 0")
+
+
+def migrate_1_5_0(cursor):
+    """1.5.0：监视目录模式已处理文件的检查点（文件大小或修改时间变化后会重新处理）"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS watch_checkpoint (
+            path TEXT PRIMARY KEY,
+            size INTEGER,
+            mtime_ns INTEGER,
+            history_id INTEGER,         -- 未识别出码或出错时为NULL
+            processed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def migrate_1_6_0(cursor):
+    """1.6.0：记录图片的内容哈希，以及按内容哈希保存的缩略图缓存表"""
+    cursor.execute("ALTER TABLE history ADD COLUMN image_digest TEXT")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS thumbnails (
+            digest TEXT PRIMARY KEY,
+            data BLOB,                  -- JPEG
+            size INTEGER,
+            last_used REAL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_thumbnails_last_used ON thumbnails(last_used)")
+
+
+def migrate_1_7_0(cursor):
+    """1.7.0：按图片内容哈希查找记录（缓存命中时检查是否已有相同记录）"""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_history_digest ON history(image_digest)")
+
+
+def migrate_1_8_0(cursor):
+    """1.8.0：content只保存各个码的内容（每个码一行），有码明细的旧记录按明细改写
+
+    带序号、类型和页码的结果文本在显示时由码明细生成，不再保存在content中。
+    """
+    rows = cursor.connection.execute("SELECT history_id, text FROM history_symbols ORDER BY history_id, seq")
+    cursor.executemany(
+        "UPDATE history SET content=? WHERE id=?",
+        (("\n".join(text or "" for _, text in group), history_id)
+         for history_id, group in itertools.groupby(rows, key=lambda row: row[0]))
+    )
+
+
+# 结构迁移列表：(目标版本, 迁移函数)，按版本顺序执行
+MIGRATIONS = [
+    ('1.1.0', migrate_1_1_0),
+    ('1.2.0', migrate_1_2_0),
+    ('1.3.0', migrate_1_3_0),
+    ('1.4.0', migrate_1_4_0),
+    ('1.5.0', migrate_1_5_0),
+    ('1.6.0', migrate_1_6_0),
+    ('1.7.0', migrate_1_7_0),
+    ('1.8.0', migrate_1_8_0),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+class HistoryStore:
+    """历史记录数据库"""
+    def __init__(self, db_path=DB_FILE, check_same_thread=True):
+        self.db_path = db_path
+        self.conn = connect(db_path, check_same_thread)
+        self.init_db()
+
+    def init_db(self):
+        """初始化表结构并执行未完成的迁移"""
+        cursor = self.conn.cursor()
+
+        # 检查表是否存在
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='history'")
+        table_exists = cursor.fetchone()
+
+        if table_exists:
+            # 检查现有表结构
+            cursor.execute("PRAGMA table_info(history)")
+            columns = [column[1] for column in cursor.fetchall()]
+
+            # 添加缺失的列
+            if 'code_type' not in columns:
+                cursor.execute("ALTER TABLE history ADD COLUMN code_type TEXT")
+            if 'is_favorite' not in columns:
+                cursor.execute("ALTER TABLE history ADD COLUMN is_favorite BOOLEAN DEFAULT 0")
+        else:
+            # 创建新表
+            cursor.execute('''
+                CREATE TABLE history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    content TEXT,
+                    image_path TEXT,
+                    code_type TEXT,
+                    is_favorite BOOLEAN DEFAULT 0
+                )
+            ''')
+
+        # 创建数据库信息表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS db_info (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
+
+        # 检查是否需要初始化数据库信息
+        cursor.execute("SELECT value FROM db_info WHERE key='version'")
+        if not cursor.fetchone():
+            cursor.execute(
+                "INSERT INTO db_info (key, value) VALUES (?, ?)",
+                ('version', '1.0.0')
+            )
+            cursor.execute(
+                "INSERT INTO db_info (key, value) VALUES (?, ?)",
+                ('created_at', datetime.datetime.now().isoformat())
+            )
+
+        self.conn.commit()
+        self.migrate()
+
+        # 检查全文索引是否可用及其分词方式
+        row = self.conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type='table' AND name='history_fts'"
+        ).fetchone()
+        self.fts_enabled = row is not None
+        self.fts_trigram = bool(row) and 'trigram' in row[0]
+
+    def migrate(self):
+        """按db_info中的版本号依次执行结构迁移"""
+        current = parse_version(self.get_info('version', '1.0.0'))
+        for version, migration in MIGRATIONS:
+            if parse_version(version) <= current:
+                continue
+            with self.conn:
+                migration(self.conn.cursor())
+                self.set_info('version', version)
+
+    def get_info(self, key, default=None):
+        """读取db_info中的配置项"""
+        row = self.conn.execute("SELECT value FROM db_info WHERE key=?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_info(self, key, value):
+        """写入db_info中的配置项（不提交，由调用方控制事务）"""
+        self.conn.execute("INSERT OR REPLACE INTO db_info (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def add_result(self, content, image_path, symbols, digest=None):
+        """在一个事务中插入一条历史记录及其每个码的明细，返回新记录ID
+
+        content为各个码的内容（QRCodeEngine.payload_text），供列表显示和全文搜索；
+        symbols为识别出的码（需有type、data、text、rect、polygon、quality、page属性），
+        记录的code_type取第一个码的类型；digest为图片文件的内容哈希（用于查找缩略图）。
+        """
+        with metrics.timer('history_insert'), self.conn:
+            return self._insert_result(content, image_path, symbols, digest)
+
+    def _insert_result(self, content, image_path, symbols, digest=None):
+        """插入记录和码明细（不提交，由调用方控制事务）"""
+        code_type = symbols[0].type if symbols else "未知"
+        cursor = self.conn.execute(
+            "INSERT INTO history (content, image_path, code_type, image_digest) VALUES (?, ?, ?, ?)",
+            (content, image_path, code_type, digest or None)
+        )
+        history_id = cursor.lastrowid
+        self.conn.executemany(
+            """INSERT INTO history_symbols (history_id, seq, type, data, text, rect, polygon, quality, page)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            ((history_id, seq, symbol.type, bytes(symbol.data), symbol.text,
+              json.dumps(list(symbol.rect)), json.dumps([list(p) for p in symbol.polygon]),
+              symbol.quality, symbol.page)
+             for seq, symbol in enumerate(symbols))
+        )
+        return history_id
+
+    def add_results(self, results, checkpoints=()):
+        """在一个事务中批量插入识别结果，并同时更新监视目录的检查点
+
+        results为[(content, image_path, symbols)]，checkpoints为[(path, size, mtime_ns)]；
+        检查点中与结果image_path相同的文件会记录对应的历史记录ID。
+        结果和检查点一起提交，中途退出后重启不会重复写入也不会漏掉文件。
+        """
+        with metrics.timer('history_insert'), self.conn:
+            ids = {image_path: self._insert_result(content, image_path, symbols)
+                   for content, image_path, symbols in results}
+            self.conn.executemany(
+                """INSERT OR REPLACE INTO watch_checkpoint (path, size, mtime_ns, history_id)
+                   VALUES (?, ?, ?, ?)""",
+                ((path, size, mtime_ns, ids.get(path)) for path, size, mtime_ns in checkpoints)
+            )
+        return list(ids.values())
+
+    def watch_checkpoints(self, directory):
+        """读取目录下已处理文件的检查点{path: (size, mtime_ns)}"""
+        prefix = os.path.join(os.path.abspath(directory), '')
+        # 按主键范围查找以prefix开头的路径（分隔符的下一个字符作为上界）
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return {path: (size, mtime_ns) for path, size, mtime_ns in self.conn.execute(
+            "SELECT path, size, mtime_ns FROM watch_checkpoint WHERE path >= ? AND path < ?",
+            (prefix, upper)
+        )}
+
+    def get_symbols(self, history_id):
+        """按识别顺序读取一条记录的码明细[(type, data, rect, polygon, quality, page)]"""
+        rows = self.conn.execute(
+            """SELECT type, data, rect, polygon, quality, page FROM history_symbols
+               WHERE history_id=? ORDER BY seq""",
+            (history_id,)
+        ).fetchall()
+        return [(type, bytes(data), tuple(json.loads(rect)), [tuple(p) for p in json.loads(polygon)],
+                 quality, page or 0)
+                for type, data, rect, polygon, quality, page in rows]
+
+    def symbol_types(self):
+        """历史中出现过的码类型及数量[(type, count)]"""
+        return self.conn.execute(
+            "SELECT type, COUNT(*) FROM history_symbols GROUP BY type ORDER BY COUNT(*) DESC"
+        ).fetchall()
+
+    def find_payload(self, text, limit=-1):
+        """按内容精确查找包含该码的记录ID（走idx_symbols_text索引，limit为-1时不限条数）"""
+        return [row[0] for row in self.conn.execute(
+            "SELECT DISTINCT history_id FROM history_symbols WHERE text=? LIMIT ?", (text, limit)
+        )]
+
+    def exists(self, content, image_path, digest):
+        """检查是否已有相同图片（按内容哈希，走idx_history_digest索引）和内容的记录"""
+        if not digest:
+            return False
+        row = self.conn.execute(
+            "SELECT 1 FROM history WHERE image_digest=? AND image_path=? AND content=? LIMIT 1",
+            (digest, image_path, content)
+        ).fetchone()
+        return row is not None
+
+    def search_condition(self, query):
+        """把搜索文本转换为WHERE条件和参数（能用全文索引的词都走索引）"""
+        terms = query.split()
+        if not self.fts_enabled:
+            fts_terms, like_terms = [], terms
+        elif self.fts_trigram:
+            # trigram分词要求每个词至少3个字符，更短的词只能在索引结果上再用LIKE过滤
+            fts_terms = [term for term in terms if len(term) >= 3]
+            like_terms = [term for term in terms if len(term) < 3]
+        else:
+            fts_terms, like_terms = terms, []
+
+        conditions, params = [], []
+        if fts_terms:
+            quoted = ['"' + term.replace('"', '""') + '"' for term in fts_terms]
+            if not self.fts_trigram:
+                quoted = [term + '*' for term in quoted]  # 按词前缀匹配
+            conditions.append("id IN (SELECT rowid FROM history_fts WHERE history_fts MATCH ?)")
+            params.append(" ".join(quoted))
+        for term in like_terms:
+            conditions.append("content LIKE ? ESCAPE '\\'")
+            params.append("%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        return " AND ".join(conditions), tuple(params)
+
+    def list_page(self, after_key=None, limit=200, preview_chars=101, query=None):
+        """按列表顺序读取一页(id, timestamp, 内容前缀, is_favorite, image_digest)
+
+        after_key为上一页最后一行的(is_favorite, timestamp, id)，使用键集分页，
+        翻页代价与页码无关。query不为空时只返回匹配搜索的记录。
+        """
+        sql = f"""
+            SELECT id, timestamp, substr(content, 1, {int(preview_chars)}), is_favorite, image_digest
+            FROM history
+        """
+        conditions, params = [], ()
+        if query:
+            condition, search_params = self.search_condition(query)
+            if condition:
+                conditions.append(condition)
+                params += search_params
+        if after_key is not None:
+            conditions.append("(is_favorite, timestamp, id) < (?, ?, ?)")
+            params += tuple(after_key)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY {LIST_ORDER} LIMIT ?"
+        return self.conn.execute(sql, params + (limit,)).fetchall()
+
+    def search_ids(self, query):
+        """返回匹配搜索的全部记录ID"""
+        condition, params = self.search_condition(query)
+        if not condition:
+            return [row[0] for row in self.conn.execute("SELECT id FROM history")]
+        return [row[0] for row in self.conn.execute(f"SELECT id FROM history WHERE {condition}", params)]
+
+    def get(self, id):
+        """读取一条完整记录(timestamp, content, image_path, image_digest)"""
+        return self.conn.execute(
+            "SELECT timestamp, content, image_path, image_digest FROM history WHERE id=?", (id,)
+        ).fetchone()
+
+    def count(self):
+        """历史记录总数"""
+        return self.conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+
+    def _load_ids(self, ids):
+        """把ID写入临时表，供集合操作做JOIN（避免逐条执行和IN参数个数限制）"""
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS selected_ids (id INTEGER PRIMARY KEY)")
+        self.conn.execute("DELETE FROM temp.selected_ids")
+        self.conn.executemany("INSERT OR IGNORE INTO temp.selected_ids (id) VALUES (?)", ((id,) for id in ids))
+
+    def _delete_all(self):
+        """删除全部记录（在调用方的事务中执行），返回删除条数
+
+        删除触发器会让SQLite无法使用整表清空优化，所以先临时去掉它们，
+        再一次性清空全文索引和码明细。
+        """
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN")  # 让删除触发器的DDL也在同一事务中
+        self.conn.execute("DROP TRIGGER IF EXISTS history_symbols_ad")
+        if self.fts_enabled:
+            self.conn.execute("DROP TRIGGER IF EXISTS history_fts_ad")
+        self.conn.execute("DELETE FROM history_symbols")
+        count = self.conn.execute("DELETE FROM history").rowcount
+        if self.fts_enabled:
+            self.conn.execute("INSERT INTO history_fts(history_fts) VALUES ('delete-all')")
+            self.conn.execute(FTS_TRIGGERS['history_fts_ad'])
+        self.conn.execute(SYMBOLS_TRIGGER)
+        return count
+
+    def delete_ids(self, ids=None):
+        """在一个事务中删除指定ID的记录（ids为None时删除全部），返回删除条数"""
+        with self.conn:
+            if ids is None:
+                return self._delete_all()
+            self._load_ids(ids)
+            cursor = self.conn.execute("DELETE FROM history WHERE id IN (SELECT id FROM temp.selected_ids)")
+        return cursor.rowcount
+
+    def expired_condition(self, max_age_days=None, max_rows=None):
+        """保留策略的过期条件(WHERE条件, 参数)，没有限制时条件为None
+
+        超过max_age_days天，或排在最新的max_rows条非收藏记录之后的记录过期；收藏记录永不过期。
+        """
+        conditions, params = [], ()
+        if max_age_days:
+            conditions.append("timestamp < datetime('now', ?)")
+            params += (f"-{int(max_age_days)} days",)
+        if max_rows:
+            # 第max_rows+1新的非收藏记录（沿idx_history_list索引定位）及更早的记录过期
+            row = self.conn.execute(
+                "SELECT timestamp, id FROM history WHERE is_favorite=0 "
+                "ORDER BY timestamp DESC, id DESC LIMIT 1 OFFSET ?",
+                (int(max_rows),)
+            ).fetchone()
+            if row:
+                conditions.append("(timestamp, id) <= (?, ?)")
+                params += tuple(row)
+        if not conditions:
+            return None, ()
+        return "is_favorite=0 AND (" + " OR ".join(conditions) + ")", params
+
+    def expired_rows(self, condition, params, limit):
+        """按时间顺序取一批过期记录[(id, timestamp, content, image_path, code_type, image_digest)]"""
+        return self.conn.execute(
+            f"""SELECT id, timestamp, content, image_path, code_type, image_digest FROM history
+                WHERE {condition} ORDER BY timestamp, id LIMIT ?""",
+            params + (limit,)
+        ).fetchall()
+
+    def symbols_for(self, ids):
+        """批量读取多条记录的码明细{history_id: [dict]}（字段与DecodedSymbol.to_dict一致）"""
+        self._load_ids(ids)
+        symbols = {}
+        for history_id, type, data, text, rect, polygon, quality, page in self.conn.execute(
+            """SELECT history_id, type, data, text, rect, polygon, quality, page FROM history_symbols
+               WHERE history_id IN (SELECT id FROM temp.selected_ids) ORDER BY history_id, seq"""
+        ):
+            symbols.setdefault(history_id, []).append({
+                'type': type, 'data': bytes(data).hex(), 'text': text, 'rect': json.loads(rect),
+                'polygon': json.loads(polygon), 'quality': quality, 'page': page or 0
+            })
+        return symbols
+
+    def restore(self, records):
+        """在一个事务中按原ID和时间恢复归档的记录及码明细，已存在的ID跳过，返回恢复条数
+
+        records为dict（id、timestamp、content、image_path、code_type、image_digest、symbols）。
+        """
+        restored = 0
+        with metrics.timer('history_insert'), self.conn:
+            for record in records:
+                cursor = self.conn.execute(
+                    """INSERT OR IGNORE INTO history (id, timestamp, content, image_path, code_type, image_digest)
+                       VALUES (?, ?, ?, ?, ?, ?)""",
+                    (record['id'], record['timestamp'], record['content'], record['image_path'],
+                     record['code_type'], record.get('image_digest'))
+                )
+                if not cursor.rowcount:
+                    continue
+                restored += 1
+                self.conn.executemany(
+                    """INSERT INTO history_symbols (history_id, seq, type, data, text, rect, polygon, quality, page)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    ((record['id'], seq, symbol['type'], bytes.fromhex(symbol['data']), symbol['text'],
+                      json.dumps(symbol['rect']), json.dumps(symbol['polygon']), symbol['quality'], symbol['page'])
+                     for seq, symbol in enumerate(record.get('symbols', [])))
+                )
+        return restored
+
+    def toggle_favorite_ids(self, ids=None):
+        """在一个事务中切换指定ID记录的收藏状态（ids为None时切换全部），返回更新条数"""
+        toggle = "UPDATE history SET is_favorite = CASE WHEN is_favorite THEN 0 ELSE 1 END"
+        with self.conn:
+            if ids is None:
+                cursor = self.conn.execute(toggle)
+            else:
+                self._load_ids(ids)
+                cursor = self.conn.execute(toggle + " WHERE id IN (SELECT id FROM temp.selected_ids)")
+        return cursor.rowcount
+
+    def clear(self):
+        """清空历史记录和缩略图（文件空间由reclaim_free_pages在后台分步回收）"""
+        with self.conn:
+            self._delete_all()
+            self.conn.execute("DELETE FROM thumbnails")
+
+    def close(self):
+        self.conn.close()
+
+
+class ThumbnailCache:
+    """按图片内容哈希缓存的缩略图（数据库中的BLOB表，按字节数做LRU淘汰，可跨线程使用）"""
+    def __init__(self, db_path=DB_FILE, max_bytes=THUMBNAIL_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = connect(db_path, check_same_thread=False)
+        self.reload_totals()
+
+    def reload_totals(self):
+        """重新统计已缓存的字节数（清空历史记录后调用）"""
+        with self.lock:
+            self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM thumbnails").fetchone()[0]
+
+    def contains(self, digest) -> bool:
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM thumbnails WHERE digest=?", (digest,)).fetchone() is not None
+
+    def get_many(self, digests):
+        """批量读取缩略图{digest: JPEG字节}，并在一个事务中刷新使用时间"""
+        digests = list(digests)
+        found = {}
+        with self.lock, self.conn:
+            for start in range(0, len(digests), 500):
+                chunk = digests[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                found.update(self.conn.execute(
+                    f"SELECT digest, data FROM thumbnails WHERE digest IN ({marks})", chunk))
+                self.conn.execute(f"UPDATE thumbnails SET last_used=? WHERE digest IN ({marks})",
+                                  [time.time()] + chunk)
+        return {digest: bytes(data) for digest, data in found.items()}
+
+    def get(self, digest):
+        return self.get_many([digest]).get(digest)
+
+    def put(self, digest, data):
+        """写入缩略图并在超出容量时淘汰最久未使用的"""
+        with self.lock, self.conn:
+            old = self.conn.execute("SELECT size FROM thumbnails WHERE digest=?", (digest,)).fetchone()
+            self.conn.execute("INSERT OR REPLACE INTO thumbnails (digest, data, size, last_used) VALUES (?, ?, ?, ?)",
+                              (digest, data, len(data), time.time()))
+            self.total_bytes += len(data) - (old[0] if old else 0)
+            self._evict()
+
+    def _evict(self):
+        """淘汰最久未使用的缩略图，直到满足容量限制"""
+        while self.total_bytes > self.max_bytes:
+            rows = self.conn.execute("SELECT digest, size FROM thumbnails ORDER BY last_used LIMIT 64").fetchall()
+            if not rows:
+                self.total_bytes = 0
+                break
+            for digest, size in rows:
+                self.conn.execute("DELETE FROM thumbnails WHERE digest=?", (digest,))
+                self.total_bytes -= size
+                if self.total_bytes <= self.max_bytes:
+                    break
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def export_history(db_path, file_path, fmt='csv', compress=False, since_id=0,
+                   chunk_size=2000, progress=None, is_cancelled=None, code_type=None):
+    """从游标分块读取历史记录并流式写入文件（使用独立连接，可在后台线程调用）
+
+    since_id用于增量导出（只导出id更大的记录）；code_type不为空时只导出包含该类型码的记录；
+    progress(已导出, 总数)报告进度，
+    is_cancelled()返回True时中止并删除未完成的文件。
+    返回(导出条数, 最大id)，取消时返回None。
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+
+    conn = connect(db_path)
+    tmp_path = file_path + '.part'
+    try:
+        condition, params = "id > ?", (since_id,)
+        if code_type:
+            # 通过码明细的类型索引筛选，不扫描内容
+            condition += " AND id IN (SELECT history_id FROM history_symbols WHERE type=? AND history_id > ?)"
+            params += (code_type, since_id)
+        total = conn.execute(f"SELECT COUNT(*) FROM history WHERE {condition}", params).fetchone()[0]
+        cursor = conn.execute(
+            f"SELECT id, timestamp, content, code_type FROM history WHERE {condition} ORDER BY timestamp, id",
+            params
+        )
+
+        if compress:
+            f = gzip.open(tmp_path, 'wt', encoding='utf-8', newline='', compresslevel=6)
+        else:
+            f = open(tmp_path, 'w', encoding='utf-8', newline='')
+
+        count, max_id = 0, since_id
+        with f:
+            writer = None
+            if fmt == 'csv':
+                writer = csv.writer(f)
+                writer.writerow(['时间戳', '内容', '类型'])
+            elif fmt == 'json':
+                f.write('[')
+
+            while True:
+                if is_cancelled and is_cancelled():
+                    break
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                if fmt == 'csv':
+                    writer.writerows(row[1:] for row in rows)
+                else:
+                    lines = [json.dumps({
+                        'timestamp': timestamp,
+                        'content': content,
+                        'code_type': code_type
+                    }, ensure_ascii=False) for id, timestamp, content, code_type in rows]
+                    if fmt == 'json':
+                        f.write((',' if count else '') + '\n  ' + ',\n  '.join(lines))
+                    else:
+                        f.write('\n'.join(lines) + '\n')
+                count += len(rows)
+                max_id = max(max_id, max(row[0] for row in rows))
+                if progress:
+                    progress(count, total)
+
+            if fmt == 'json':
+                f.write('\n]\n')
+
+        if is_cancelled and is_cancelled():
+            os.remove(tmp_path)
+            return None
+        os.replace(tmp_path, file_path)
+        return count, max_id
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        conn.close()
+
+
+class _Cancelled(Exception):
+    """在备份进度回调中抛出以中止备份"""
+
+
+def default_backup_dir(db_path) -> str:
+    """默认备份目录：数据库所在目录下的backups"""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), 'backups')
+
+
+def rotate_backups(backup_dir, keep=BACKUP_KEEP):
+    """只保留最新的keep份备份（按文件名中的时间戳排序，同一时刻的序号后缀排在后面），返回删除的文件"""
+    files = sorted(glob.glob(os.path.join(backup_dir, BACKUP_PREFIX + '*.db')))
+    removed = files[:-keep] if keep > 0 else []
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def reserve_backup_name(backup_dir):
+    """生成不与已有备份重名的(备份文件, 临时文件)，并独占创建临时文件占住这个名字
+
+    文件名带微秒时间戳，定长数字按字典序即为时间顺序；同一微秒内已有备份时追加_001、_002……
+    （"."排在"_"之前，追加序号的仍排在无序号的之后）。
+    """
+    timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    for counter in itertools.count():
+        suffix = f'_{counter:03d}' if counter else ''
+        backup_file = os.path.join(backup_dir, f'{BACKUP_PREFIX}{timestamp}{suffix}.db')
+        tmp_path = backup_file + '.part'
+        try:
+            os.close(os.open(tmp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            continue    # 另一个备份正在写入这个名字
+        # 先占住临时文件再检查，其他备份不会在检查之后再替换出同名文件
+        if not os.path.exists(backup_file):
+            return backup_file, tmp_path
+        os.remove(tmp_path)
+
+
+def backup_database(db_path, backup_dir=None, keep=BACKUP_KEEP, pages=BACKUP_STEP_PAGES,
+                    progress=None, is_cancelled=None):
+    """用SQLite在线备份API分步复制数据库（使用独立连接，可在后台线程调用）
+
+    backup_dir为None时备份到数据库所在目录下的backups。
+    每步复制pages页，步与步之间其他连接可以继续读写；progress(已复制页数, 总页数)报告进度，
+    is_cancelled()返回True时中止并删除未完成的文件。完成后按keep轮换旧备份。
+    返回(备份文件, 删除的旧备份列表)，取消时返回None。
+    """
+    backup_dir = backup_dir or default_backup_dir(db_path)
+    os.makedirs(backup_dir, exist_ok=True)
+    backup_file, tmp_path = reserve_backup_name(backup_dir)
+
+    def step(status, remaining, total):
+        if is_cancelled and is_cancelled():
+            raise _Cancelled()
+        if progress:
+            progress(total - remaining, total)
+
+    source = connect(db_path)
+    target = sqlite3.connect(tmp_path)
+    try:
+        source.backup(target, pages=pages, progress=step)
+        target.close()
+        os.replace(tmp_path, backup_file)
+    except BaseException as e:
+        target.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        if isinstance(e, _Cancelled):
+            return None
+        raise
+    finally:
+        source.close()
+    return backup_file, rotate_backups(backup_dir, keep)
+
+
+def auto_vacuum_mode(conn) -> int:
+    """0为不回收，1为FULL，2为INCREMENTAL"""
+    return conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+
+
+def incremental_vacuum(conn, max_pages=None, step=1024, progress=None, is_cancelled=None) -> int:
+    """分步回收空闲页（每步一个短事务），返回回收的页数；max_pages为None时回收全部"""
+    total = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if max_pages is not None:
+        total = min(total, max_pages)
+    freed = 0
+    while freed < total:
+        if is_cancelled and is_cancelled():
+            break
+        count = min(step, total - freed)
+        # execute()只会执行一步（只回收一页），executescript()才会把语句执行完
+        conn.executescript(f"PRAGMA incremental_vacuum({count})")
+        freed += count
+        if progress:
+            progress(freed, total)
+    return freed
+
+
+def vacuum_temp_dir() -> str:
+    """SQLite存放临时文件的目录（SQLITE_TMPDIR优先，其余与tempfile的查找顺序基本一致）"""
+    return os.environ.get('SQLITE_TMPDIR') or tempfile.gettempdir()
+
+
+def check_vacuum_space(db_path):
+    """检查VACUUM所需的磁盘空间，不足时抛出ValueError
+
+    VACUUM先在临时目录生成整库副本，再把它写回数据库（WAL模式下先写入-wal文件），
+    临时目录和数据库目录各需约一个数据库大小的空间；两者在同一磁盘上时需要两倍。
+    """
+    size = os.path.getsize(db_path)
+    required = {}   # 设备号 -> [目录, 需要的字节数]
+    for directory in (vacuum_temp_dir(), os.path.dirname(os.path.abspath(db_path))):
+        entry = required.setdefault(os.stat(directory).st_dev, [directory, 0])
+        entry[1] += size * 1.1
+    for directory, needed in required.values():
+        if shutil.disk_usage(directory).free < needed:
+            raise ValueError(f"切换到增量回收需要一次VACUUM，{directory} 所在磁盘剩余空间不足"
+                             f"（需要约 {needed / 1048576:.0f} MB）")
+
+
+def optimize_database(db_path, progress=None, is_cancelled=None):
+    """优化数据库（使用独立连接，可在后台线程调用）
+
+    已启用增量回收的数据库只分步回收空闲页并执行PRAGMA optimize，不需要整库VACUUM；
+    旧数据库先做一次VACUUM切换到增量回收模式（临时目录和数据库目录各需约一个数据库大小的磁盘空间）。
+    返回(回收的页数, 是否做了VACUUM)。
+    """
+    conn = connect(db_path)
+    try:
+        vacuumed = False
+        if auto_vacuum_mode(conn) != 2:
+            check_vacuum_space(db_path)
+            if progress:
+                progress(0, 0)
+            # 连接默认temp_store=MEMORY，VACUUM会在内存中生成整库副本；改为写到临时目录的文件
+            conn.execute("PRAGMA temp_store=FILE")
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+            vacuumed = True
+        freed = incremental_vacuum(conn, progress=progress, is_cancelled=is_cancelled)
+        conn.execute("PRAGMA optimize")
+        return freed, vacuumed
+    finally:
+        conn.close()
+
+
+def reclaim_free_pages(db_path, progress=None, is_cancelled=None) -> int:
+    """分步回收全部空闲页（清空历史后在后台调用，使用独立连接），返回回收的页数
+
+    未启用增量回收的旧数据库返回0，空闲页留给之后的写入复用（"优化数据库"可切换到增量回收）。
+    """
+    conn = connect(db_path)
+    try:
+        if auto_vacuum_mode(conn) != 2:
+            return 0
+        return incremental_vacuum(conn, progress=progress, is_cancelled=is_cancelled)
+    finally:
+        conn.close()
+
+
+def idle_maintenance(db_path, max_pages=IDLE_VACUUM_PAGES) -> int:
+    """空闲时的轻量维护：少量增量回收加PRAGMA optimize，返回回收的页数"""
+    conn = connect(db_path)
+    try:
+        freed = incremental_vacuum(conn, max_pages) if auto_vacuum_mode(conn) == 2 else 0
+        conn.execute("PRAGMA optimize")
+        return freed
+    finally:
+        conn.close()
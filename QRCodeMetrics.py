@@ -0,0 +1,216 @@
+"""各处理阶段的耗时统计（滚动直方图），可导出为JSON或Prometheus文本格式
+
+默认关闭；关闭时timer()返回共享的空计时器，热路径上只多一次函数调用和一次判断。
+"""
+import os
+import json
+import time
+import bisect
+import threading
+from collections import deque
+
+
+# 直方图桶上界（秒），与Prometheus的累计桶语义一致
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 每个阶段保留最近多少次耗时用于计算分位数
+WINDOW = 2048
+
+# 各阶段的中文说明（诊断面板中显示）
+STAGES = {
+    'file_read': '读取文件',
+    'frame_read': '读取视频帧',
+    'image_decode': '图片解码',
+    'color_convert': '颜色转换',
+    'symbol_decode': '码识别',
+    'annotate': '结果标记',
+    'pixmap_scale': '缩放显示',
+    'history_insert': '写入历史',
+    'list_refresh': '刷新列表',
+    'thumbnail_load': '加载缩略图',
+    'decode_total': '解码总耗时',
+    'http_request': '处理HTTP请求',
+}
+
+_enabled = False
+
+
+class Histogram:
+    """单个阶段的耗时：累计桶计数、总和，以及最近WINDOW次的滚动窗口"""
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)    # 最后一个为+Inf
+        self.count = 0
+        self.sum = 0.0
+        self.window = deque(maxlen=WINDOW)
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.window.append(seconds)
+
+    def snapshot(self) -> dict:
+        """滚动窗口的分位数（毫秒）和累计桶"""
+        ordered = sorted(self.window)
+
+        def pick(q):
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000, 3) if ordered else 0.0
+        return {
+            'count': self.count,
+            'sum_s': round(self.sum, 6),
+            'p50_ms': pick(0.5),
+            'p90_ms': pick(0.9),
+            'p99_ms': pick(0.99),
+            'max_ms': round(ordered[-1] * 1000, 3) if ordered else 0.0,
+            'window': len(ordered),
+            # 滚动窗口中各桶的计数（非累计），用于在面板中画分布
+            'window_buckets': self.window_buckets(ordered),
+            'buckets': list(self.counts),
+        }
+
+    @staticmethod
+    def window_buckets(ordered) -> list:
+        counts = [0] * (len(BUCKETS) + 1)
+        for seconds in ordered:
+            counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        return counts
+
+
+class MetricsRegistry:
+    """按阶段名保存直方图（线程安全）"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.started = time.time()
+
+    def observe(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {name: histogram.snapshot() for name, histogram in self.histograms.items()}
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.started = time.time()
+
+    def drain(self) -> dict:
+        """取出并清空各阶段的耗时样本{阶段: [秒, ...]}（子进程每个任务结束时交给主进程汇总）"""
+        with self.lock:
+            samples = {name: list(histogram.window) for name, histogram in self.histograms.items()}
+            self.histograms.clear()
+        return samples
+
+    def merge(self, samples):
+        """并入drain()取出的样本"""
+        with self.lock:
+            for name, values in samples.items():
+                histogram = self.histograms.get(name)
+                if histogram is None:
+                    histogram = self.histograms[name] = Histogram()
+                for seconds in values:
+                    histogram.observe(seconds)
+
+    def to_json(self) -> str:
+        return json.dumps({'started': self.started, 'time': time.time(), 'stages': self.snapshot()},
+                          ensure_ascii=False, indent=2)
+
+    def to_prometheus(self) -> str:
+        """Prometheus文本格式（可供node_exporter的textfile收集器读取）"""
+        lines = [
+            "# HELP qrcode_stage_seconds 各处理阶段的耗时",
+            "# TYPE qrcode_stage_seconds histogram",
+        ]
+        for name, stats in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (float('inf'),), stats['buckets']):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'qrcode_stage_seconds_bucket{{stage="{name}",le="{le}"}} {cumulative}')
+            lines.append(f'qrcode_stage_seconds_sum{{stage="{name}"}} {stats["sum_s"]}')
+            lines.append(f'qrcode_stage_seconds_count{{stage="{name}"}} {stats["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """原子地写入指标文件：扩展名为.prom时用Prometheus文本格式，否则为JSON"""
+        text = self.to_prometheus() if path.endswith('.prom') else self.to_json()
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+
+registry = MetricsRegistry()
+
+
+class _Timer:
+    """计时上下文：退出时把耗时记入registry"""
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        registry.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    """关闭统计时使用的空计时器（单例，不分配对象）"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(name):
+    """with metrics.timer('stage'): ... 统计一个阶段的耗时"""
+    return _Timer(name) if _enabled else _NULL_TIMER
+
+
+def observe(name, seconds):
+    """直接记录一次已测得的耗时"""
+    if _enabled:
+        registry.observe(name, seconds)
+
+
+def enable(flag=True):
+    global _enabled
+    _enabled = bool(flag)
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+class PeriodicDumper(threading.Thread):
+    """后台线程：每隔interval秒把指标写入文件（用于命令行模式）"""
+    def __init__(self, path, interval=10.0):
+        super().__init__(daemon=True)
+        self.path = path
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            registry.dump(self.path)
+
+    def stop(self):
+        """停止并写入最后一次"""
+        self.stopped.set()
+        registry.dump(self.path)
@@ -0,0 +1,213 @@
+"""HTTP解码服务（仅用标准库）：POST图片字节返回JSON识别结果，进程池解码，队列满时返回429"""
+import json
+import time
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+
+import QRCodeEngine
+import QRCodeService
+import QRCodeHistory
+import QRCodeMetrics as metrics
+
+
+# 单个请求允许的最大图片字节数
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+# 请求在队列和解码中等待的最长时间（秒），超时返回504
+DEFAULT_TIMEOUT = 30.0
+
+
+class DecodeServer(ThreadingHTTPServer):
+    """解码服务：每个连接一个线程接收请求，解码交给进程池
+
+    同时接受的解码请求不超过workers + max_queue个（正在解码的加上排队的），
+    超出时立即返回429，不会在内存中无限积压图片。
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, workers=1, max_queue=16, ladder=QRCodeEngine.DEFAULT_LADDER,
+                 tiles=None, cache_path=None, history_path=None, decoders=None,
+                 max_bytes=DEFAULT_MAX_BYTES, timeout=DEFAULT_TIMEOUT):
+        super().__init__(address, DecodeHandler)
+        self.workers = workers
+        self.capacity = workers + max_queue
+        self.slots = threading.BoundedSemaphore(self.capacity)
+        self.ladder = ladder
+        self.tiles = tiles
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=QRCodeService.init_daemon_worker,
+                                        initargs=(cache_path, decoders, metrics.is_enabled()))
+        # 历史记录由各请求线程写入，共用一个连接并加锁
+        self.store = QRCodeHistory.HistoryStore(history_path, check_same_thread=False) if history_path else None
+        self.store_lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.active = 0
+        self.responses = {}     # 状态码 -> 次数
+        self.started = time.time()
+
+    def acquire(self) -> bool:
+        """占用一个处理名额，已满时返回False"""
+        if not self.slots.acquire(blocking=False):
+            return False
+        with self.lock:
+            self.active += 1
+        return True
+
+    def release(self):
+        with self.lock:
+            self.active -= 1
+        self.slots.release()
+
+    def count_response(self, code):
+        with self.lock:
+            self.responses[code] = self.responses.get(code, 0) + 1
+
+    def submit(self, data):
+        """把已占用名额的请求交给进程池解码
+
+        名额在解码任务真正结束时才释放：超时返回504后子进程可能仍在解码，
+        此时释放名额会让新请求继续堆积到进程池的无界队列中。
+        """
+        future = self.pool.submit(QRCodeService.decode_bytes_record, data, self.ladder, self.tiles)
+        future.add_done_callback(lambda _: self.release())
+        return future
+
+    def wait(self, future) -> dict:
+        """等待解码结果，返回DecodeResult.to_dict()的结果；超时抛出FutureTimeoutError"""
+        try:
+            record = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()     # 还在排队时直接取消；已在解码的会继续占用名额直到结束
+            raise
+        # 子进程各有自己的统计，各阶段耗时随结果带回主进程汇总
+        return QRCodeService.merge_metrics(record)
+
+    def save(self, record, source):
+        """把识别结果写入历史记录，返回记录ID（未启用或未识别出码时为None）"""
+        if not self.store or not record['symbols']:
+            return None
+        result = QRCodeEngine.DecodeResult.from_dict(record)
+        with self.store_lock:
+            return self.store.add_result(result.payload_text(), source, result.symbols)
+
+    def health(self) -> dict:
+        with self.lock:
+            active = self.active
+            responses = dict(self.responses)
+        return {
+            'status': 'ok',
+            'workers': self.workers,
+            'capacity': self.capacity,
+            'active': active,
+            'queued': max(0, active - self.workers),
+            'uptime': round(time.time() - self.started, 1),
+            'responses': {str(code): count for code, count in sorted(responses.items())},
+            'decoders': QRCodeEngine.get_decoder_chain().describe(),
+        }
+
+    def prometheus(self) -> str:
+        """各阶段耗时加上服务自身的计数（Prometheus文本格式）"""
+        health = self.health()
+        lines = [
+            "# HELP qrcode_http_active 正在解码和排队的请求数",
+            "# TYPE qrcode_http_active gauge",
+            f"qrcode_http_active {health['active']}",
+            "# HELP qrcode_http_capacity 同时接受的解码请求上限",
+            "# TYPE qrcode_http_capacity gauge",
+            f"qrcode_http_capacity {health['capacity']}",
+            "# HELP qrcode_http_responses_total 按状态码统计的响应数",
+            "# TYPE qrcode_http_responses_total counter",
+        ]
+        lines += [f'qrcode_http_responses_total{{code="{code}"}} {count}'
+                  for code, count in health['responses'].items()]
+        return metrics.registry.to_prometheus() + "\n".join(lines) + "\n"
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        if self.store:
+            self.store.close()
+
+
+class DecodeHandler(BaseHTTPRequestHandler):
+    """POST /decode：请求体为图片文件字节；GET /health、GET /metrics"""
+    protocol_version = 'HTTP/1.1'
+    server_version = 'QRCodeDecoder'
+
+    def log_message(self, format, *args):
+        pass    # 访问日志太多，状态码统计见/health和/metrics
+
+    def send_body(self, code, body, content_type='application/json; charset=utf-8', headers=()):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body, ensure_ascii=False)
+        data = body.encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+        self.server.count_response(code)
+
+    def send_error_json(self, code, message, headers=()):
+        self.send_body(code, {'error': message}, headers=headers)
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == '/health':
+            self.send_body(200, self.server.health())
+        elif path == '/metrics':
+            self.send_body(200, self.server.prometheus(), 'text/plain; version=0.0.4; charset=utf-8')
+        else:
+            self.send_error_json(404, "未知路径")
+
+    def do_POST(self):
+        start = time.perf_counter()
+        if urlsplit(self.path).path != '/decode':
+            self.close_connection = True    # 未读取请求体，不能继续复用连接
+            self.send_error_json(404, "未知路径")
+            return
+        try:
+            length = int(self.headers.get('Content-Length', ''))
+        except ValueError:
+            self.close_connection = True
+            self.send_error_json(411, "需要Content-Length")
+            return
+        if length <= 0 or length > self.server.max_bytes:
+            self.close_connection = True
+            self.send_error_json(413, f"图片大小应在1到{self.server.max_bytes}字节之间")
+            return
+        # 名额已满时直接拒绝，请求体分块读出丢弃（不占内存，连接可以继续复用）
+        if not self.server.acquire():
+            while length > 0:
+                chunk = self.rfile.read(min(length, 64 * 1024))
+                if not chunk:
+                    break
+                length -= len(chunk)
+            self.send_error_json(429, "服务繁忙，请稍后重试", headers=[('Retry-After', '1')])
+            return
+        try:
+            try:
+                data = self.rfile.read(length)
+                future = self.server.submit(data)   # 之后名额由解码任务结束时释放
+            except BaseException:
+                self.server.release()
+                raise
+            try:
+                record = self.server.wait(future)
+            except FutureTimeoutError:
+                self.send_error_json(504, "解码超时")
+                return
+            if record['error']:
+                self.send_error_json(422, record['error'])
+                return
+            source = self.headers.get('X-Source', '')
+            record['history_id'] = self.server.save(record, source)
+            self.send_body(200, record)
+        finally:
+            metrics.observe('http_request', time.perf_counter() - start)
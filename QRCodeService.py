@@ -0,0 +1,333 @@
+"""无界面运行模式（批处理等），供命令行调用"""
+import os
+import sys
+import json
+import time
+import signal
+from collections import deque
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import QRCodeEngine
+import QRCodeStream
+import QRCodeDocument
+import QRCodeMetrics as metrics
+import QRCodeHistory
+import QRCodeWatch
+
+
+# 子进程中的解码结果缓存（由init_worker按需创建）
+_worker_cache = None
+
+# 子进程是否把各阶段耗时随结果交给主进程（由init_worker设置）
+_collect_metrics = False
+
+
+def init_worker(cache_path=None, decoders=None, collect_metrics=False):
+    """进程池初始化：每个子进程打开自己的缓存连接并配置解码后端
+
+    decoders为configure_decoders的参数(backends, strategy, symbologies)。
+    collect_metrics为True时子进程启用性能统计，每个结果的metrics字段带回本次任务的各阶段耗时。
+    """
+    global _worker_cache, _collect_metrics
+    if cache_path:
+        _worker_cache = QRCodeEngine.DecodeCache(cache_path)
+    if decoders:
+        QRCodeEngine.configure_decoders(*decoders)
+    if collect_metrics:
+        _collect_metrics = True
+        metrics.enable()
+
+
+def attach_metrics(record) -> dict:
+    """子进程中把本次任务的各阶段耗时样本附到结果上"""
+    if _collect_metrics:
+        record['metrics'] = metrics.registry.drain()
+    return record
+
+
+def merge_metrics(record) -> dict:
+    """主进程中取出结果附带的耗时样本并入统计（结果本身不再带metrics字段）"""
+    samples = record.pop('metrics', None)
+    if samples:
+        metrics.registry.merge(samples)
+    return record
+
+
+def decode_file_record(path, ladder=QRCodeEngine.DEFAULT_LADDER, tiles=None,
+                       dpi=QRCodeDocument.DEFAULT_DPI, page_workers=1) -> dict:
+    """在子进程中解码单个文件，返回可序列化的结果（出错时不抛异常）
+
+    多页文档逐页解码，各码的page字段为所在页码。
+    """
+    try:
+        if QRCodeDocument.is_document(path):
+            record = QRCodeDocument.decode_document(path, dpi, page_workers, ladder, tiles).to_dict()
+        else:
+            data = QRCodeEngine.read_file(path)
+            result = QRCodeEngine.decode_with_cache(data, _worker_cache, ladder=ladder, tiles=tiles)
+            result.source = path
+            record = result.to_dict()
+    except Exception as e:
+        record = {'source': path, 'symbols': [], 'error': str(e)}
+    return attach_metrics(record)
+
+
+def decode_bytes_record(data, ladder=QRCodeEngine.DEFAULT_LADDER, tiles=None) -> dict:
+    """在子进程中解码收到的图片字节，返回可序列化的结果（出错时不抛异常）"""
+    try:
+        record = QRCodeEngine.decode_with_cache(data, _worker_cache, ladder=ladder, tiles=tiles).to_dict()
+    except Exception as e:
+        record = {'source': '', 'symbols': [], 'error': str(e)}
+    return attach_metrics(record)
+
+
+def run_batch(directory, workers=None, recursive=False, out=None, err=None,
+              ladder=QRCodeEngine.DEFAULT_LADDER, cache_path=None, tiles=None,
+              dpi=QRCodeDocument.DEFAULT_DPI, page_workers=1, decoders=None) -> dict:
+    """用进程池批量解码目录中的图片，以NDJSON格式逐行输出结果
+
+    指定cache_path时按文件内容哈希缓存结果，重复扫描同一批文件可直接返回。
+    指定tiles（TileConfig）时每张图片分块并行解码。TIFF和PDF文档按dpi逐页读取，
+    每个文档同时解码的页数不超过page_workers。decoders为(后端列表, 策略, 码类型)，
+    结束时按后端统计识别成功次数和平均耗时。
+    """
+    out = out or sys.stdout
+    err = err or sys.stderr
+    if not os.path.isdir(directory):
+        raise ValueError(f"目录不存在: {directory}")
+
+    workers = workers or os.cpu_count() or 1
+    if tiles and not tiles.workers:
+        # 进程数和每张图片的分块线程数相乘不超过CPU核心数
+        tiles.workers = max(1, (os.cpu_count() or 1) // workers)
+    files = list(QRCodeEngine.iter_image_files(directory, recursive))
+    stats = {'files': 0, 'decoded': 0, 'symbols': 0, 'errors': 0, 'cache_hits': 0, 'ladder': {}, 'backends': {}}
+    start = time.perf_counter()
+
+    # 按文件数拆分任务块，减少进程间通信次数
+    chunksize = max(1, min(64, len(files) // (workers * 4)))
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(cache_path, decoders, metrics.is_enabled())) as pool:
+        for record in pool.map(partial(decode_file_record, ladder=ladder, tiles=tiles,
+                                           dpi=dpi, page_workers=page_workers), files, chunksize=chunksize):
+            # 子进程各有自己的统计，各阶段耗时随结果带回主进程汇总
+            merge_metrics(record)
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            stats['files'] += 1
+            stats['symbols'] += len(record['symbols'])
+            if record.get('cached'):
+                stats['cache_hits'] += 1
+            if record['error']:
+                stats['errors'] += 1
+            elif record['symbols']:
+                stats['decoded'] += 1
+                # 统计各分辨率阶梯的命中次数，便于调整阶梯配置
+                step = record['ladder_step']
+                stats['ladder'][step] = stats['ladder'].get(step, 0) + 1
+                if not record.get('cached'):
+                    backend = stats['backends'].setdefault(record.get('backend') or '-', [0, 0.0])
+                    backend[0] += 1
+                    backend[1] += record.get('elapsed_ms', 0.0)
+
+    elapsed = time.perf_counter() - start
+    stats['elapsed'] = elapsed
+    stats['throughput'] = stats['files'] / elapsed if elapsed > 0 else 0.0
+    err.write(
+        f"已处理 {stats['files']} 个文件，识别成功 {stats['decoded']} 个，"
+        f"共 {stats['symbols']} 个码，失败 {stats['errors']} 个，"
+        f"耗时 {elapsed:.2f} 秒，吞吐量 {stats['throughput']:.1f} 张/秒\n"
+    )
+    if cache_path:
+        misses = stats['files'] - stats['errors'] - stats['cache_hits']
+        err.write(f"缓存命中 {stats['cache_hits']} / 未命中 {misses}\n")
+    if stats['ladder']:
+        steps = "，".join(f"{step}: {count}" for step, count in sorted(stats['ladder'].items()))
+        err.write(f"分辨率阶梯命中: {steps}\n")
+    if stats['backends']:
+        backends = "，".join(f"{name}: {count} 张（平均 {total / count:.1f} ms）"
+                             for name, (count, total) in sorted(stats['backends'].items()))
+        err.write(f"解码后端命中: {backends}\n")
+    return stats
+
+
+def run_stream(source, out=None, err=None, ladder=QRCodeEngine.DEFAULT_LADDER, max_skip=8,
+               dedup_seconds=5.0, history_path=None, is_cancelled=None) -> QRCodeStream.StreamStats:
+    """解码视频文件或摄像头，每个去重后的码输出一行NDJSON
+
+    指定history_path时同时写入历史记录数据库（每个码一条记录）。
+    """
+    out = out or sys.stdout
+    err = err or sys.stderr
+    decoder = QRCodeStream.StreamDecoder(ladder=ladder, dedup_seconds=dedup_seconds)
+    stats = QRCodeStream.StreamStats()
+    store = QRCodeHistory.HistoryStore(history_path) if history_path else None
+    try:
+        for frame in QRCodeStream.iter_stream(source, decoder, max_skip=max_skip,
+                                              stats=stats, is_cancelled=is_cancelled):
+            for symbol in frame.new_symbols:
+                record = {'source': str(source), 'frame': frame.index,
+                          'time': round(frame.time, 3), 'symbol': symbol.to_dict()}
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                if store:
+                    store.add_result(symbol.text, "", [symbol])
+            out.flush()
+    finally:
+        if store:
+            store.close()
+    err.write(stats.summary_text() + f"，耗时 {stats.elapsed:.2f} 秒\n")
+    return stats
+
+
+def init_daemon_worker(cache_path=None, decoders=None, collect_metrics=False):
+    """常驻模式（监视目录、HTTP服务）的子进程忽略Ctrl+C，由主进程处理完已完成的任务后统一退出"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    init_worker(cache_path, decoders, collect_metrics)
+
+
+def run_watch(directory, workers=None, recursive=False, out=None, err=None,
+              ladder=QRCodeEngine.DEFAULT_LADDER, history_path=QRCodeHistory.DB_FILE, cache_path=None,
+              tiles=None, dpi=QRCodeDocument.DEFAULT_DPI, page_workers=1, decoders=None,
+              poll_interval=None, settle=2.0, batch_size=100, flush_interval=1.0,
+              report_interval=60.0, is_cancelled=None) -> dict:
+    """监视目录，新文件写完后用进程池解码，识别结果分批写入历史记录数据库，直到取消或Ctrl+C
+
+    poll_interval为None时优先用inotify，否则按该间隔（秒）轮询；文件收到关闭写入事件，
+    或大小和修改时间持续settle秒不变才视为写完。同时解码的文件不超过进程数的2倍，
+    新文件积压时只排队路径，不会读入更多图片。结果每batch_size条或每flush_interval秒
+    在一个事务中提交，并同时写入检查点，重启后跳过大小和修改时间未变的已处理文件。
+    每个文件的结果以NDJSON输出，每report_interval秒输出一次进度。
+    """
+    out = out or sys.stdout
+    err = err or sys.stderr
+    directory = os.path.abspath(directory)
+    if not os.path.isdir(directory):
+        raise ValueError(f"目录不存在: {directory}")
+
+    workers = workers or os.cpu_count() or 1
+    if tiles and not tiles.workers:
+        tiles.workers = max(1, (os.cpu_count() or 1) // workers)
+    max_inflight = workers * 2
+    store = QRCodeHistory.HistoryStore(history_path)
+    done = store.watch_checkpoints(directory)   # 路径 -> (大小, 修改时间)
+    watcher = QRCodeWatch.create_watcher(directory, QRCodeEngine.IMAGE_EXTENSIONS, recursive, poll_interval)
+    settler = QRCodeWatch.FileSettler(settle)
+    queue = deque()     # 已写完、等待解码的(路径, 大小, 修改时间)
+    busy = set()        # 排队或解码中的路径
+    inflight = {}       # future -> (路径, 大小, 修改时间)
+    results, checkpoints = [], []
+    stats = {'files': 0, 'decoded': 0, 'symbols': 0, 'errors': 0, 'skipped': len(done)}
+    start = last_flush = last_report = last_settle = time.monotonic()
+    err.write(f"开始监视 {directory}（{'inotify' if isinstance(watcher, QRCodeWatch.InotifyWatcher) else '轮询'}），"
+              f"已处理 {len(done)} 个文件，按Ctrl+C停止\n")
+
+    def flush():
+        nonlocal last_flush
+        if checkpoints:
+            store.add_results(results, checkpoints)
+            results.clear()
+            checkpoints.clear()
+        last_flush = time.monotonic()
+
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=init_daemon_worker,
+                               initargs=(cache_path, decoders, metrics.is_enabled()))
+    try:
+        while not (is_cancelled and is_cancelled()):
+            now = time.monotonic()
+            # 有任务在解码时不阻塞等待文件事件，下面改为等待任务完成
+            for path, closed in watcher.poll(0 if inflight else 0.2):
+                if path in busy:
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if done.get(path) != (stat.st_size, stat.st_mtime_ns):
+                    settler.add(path, closed, stat, now)
+
+            # 检查文件是否写完需要逐个stat，限制检查频率
+            if settler and now - last_settle >= min(0.5, settle / 2):
+                last_settle = now
+                for item in settler.ready(now):
+                    if item[0] not in busy:
+                        busy.add(item[0])
+                        queue.append(item)
+
+            while queue and len(inflight) < max_inflight:
+                item = queue.popleft()
+                future = pool.submit(decode_file_record, item[0], ladder, tiles, dpi, page_workers)
+                inflight[future] = item
+
+            if inflight:
+                finished, _ = wait(inflight, timeout=0.2, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    path, size, mtime_ns = inflight.pop(future)
+                    busy.discard(path)
+                    record = merge_metrics(future.result())
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    stats['files'] += 1
+                    if record['error']:
+                        stats['errors'] += 1
+                    elif record['symbols']:
+                        result = QRCodeEngine.DecodeResult.from_dict(record)
+                        results.append((result.payload_text(), path, result.symbols))
+                        stats['decoded'] += 1
+                        stats['symbols'] += len(result.symbols)
+                    # 出错的文件也记录检查点，避免反复重试；文件被改写后会重新处理
+                    checkpoints.append((path, size, mtime_ns))
+                    done[path] = (size, mtime_ns)
+                out.flush()
+
+            now = time.monotonic()
+            if len(checkpoints) >= batch_size or (checkpoints and now - last_flush >= flush_interval):
+                flush()
+            if now - last_report >= report_interval:
+                last_report = now
+                err.write(f"已处理 {stats['files']} 个文件，识别成功 {stats['decoded']} 个，"
+                          f"解码中 {len(inflight)} 个，排队 {len(queue)} 个，等待写完 {len(settler)} 个\n")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # 已完成的结果写入数据库；未完成的文件不记录检查点，下次启动时重新处理
+        pool.shutdown(wait=True, cancel_futures=True)
+        flush()
+        watcher.close()
+        store.close()
+
+    elapsed = time.monotonic() - start
+    stats['elapsed'] = elapsed
+    err.write(
+        f"已处理 {stats['files']} 个文件，识别成功 {stats['decoded']} 个，"
+        f"共 {stats['symbols']} 个码，失败 {stats['errors']} 个，运行 {elapsed:.0f} 秒\n"
+    )
+    return stats
+
+
+def run_server(host='127.0.0.1', port=8080, workers=None, max_queue=16, err=None,
+               ladder=QRCodeEngine.DEFAULT_LADDER, tiles=None, cache_path=None, history_path=None,
+               decoders=None, max_bytes=None, timeout=None):
+    """启动HTTP解码服务，直到Ctrl+C
+
+    POST /decode的请求体为图片文件字节，返回DecodeResult的JSON（每个码含type、text、data、polygon等）；
+    同时解码workers个，另外最多排队max_queue个，超出时返回429。
+    指定history_path时识别结果写入历史记录数据库（请求头X-Source作为图片路径）。
+    """
+    import QRCodeServer
+
+    err = err or sys.stderr
+    workers = workers or os.cpu_count() or 1
+    metrics.enable()
+    server = QRCodeServer.DecodeServer(
+        (host, port), workers=workers, max_queue=max_queue, ladder=ladder, tiles=tiles,
+        cache_path=cache_path, history_path=history_path, decoders=decoders,
+        max_bytes=max_bytes or QRCodeServer.DEFAULT_MAX_BYTES, timeout=timeout or QRCodeServer.DEFAULT_TIMEOUT)
+    host, port = server.server_address[:2]
+    err.write(f"解码服务已启动: http://{host}:{port}/decode（{workers} 个解码进程，最多排队 {max_queue} 个），"
+              f"按Ctrl+C停止\n")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,190 @@
+"""视频文件和摄像头流解码：自适应跳帧、按上一帧位置搜索（ROI跟踪）和跨帧去重，不依赖GUI"""
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import cv2
+import numpy as np
+
+import QRCodeEngine
+import QRCodeMetrics as metrics
+
+
+# 视频帧率未知时（部分摄像头和容器格式）按此帧率估算
+DEFAULT_FPS = 30.0
+
+
+@dataclass
+class StreamStats:
+    """流解码统计"""
+    frames_read: int = 0      # 读取（含跳过）的帧数
+    frames_decoded: int = 0   # 实际解码的帧数
+    roi_hits: int = 0         # 在上一帧位置附近就找到码的帧数
+    full_scans: int = 0       # 整帧扫描次数
+    symbols: int = 0          # 各帧识别到的码总数（含重复）
+    unique: int = 0           # 去重后写出的码数
+    elapsed: float = 0.0
+
+    @property
+    def ingest_fps(self) -> float:
+        return self.frames_read / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def decode_fps(self) -> float:
+        return self.frames_decoded / self.elapsed if self.elapsed > 0 else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            'frames_read': self.frames_read,
+            'frames_decoded': self.frames_decoded,
+            'roi_hits': self.roi_hits,
+            'full_scans': self.full_scans,
+            'symbols': self.symbols,
+            'unique': self.unique,
+            'elapsed': round(self.elapsed, 3),
+            'ingest_fps': round(self.ingest_fps, 1),
+            'decode_fps': round(self.decode_fps, 1)
+        }
+
+    def summary_text(self) -> str:
+        return (f"读取 {self.frames_read} 帧（{self.ingest_fps:.1f} 帧/秒），"
+                f"解码 {self.frames_decoded} 帧（{self.decode_fps:.1f} 帧/秒），"
+                f"区域跟踪命中 {self.roi_hits} 次，整帧扫描 {self.full_scans} 次，"
+                f"识别 {self.symbols} 个码，去重后 {self.unique} 个")
+
+
+@dataclass
+class StreamFrame:
+    """一帧的解码结果"""
+    index: int                # 帧序号（从0开始）
+    time: float               # 流内时间（秒）
+    image: np.ndarray
+    symbols: list = field(default_factory=list)
+    new_symbols: list = field(default_factory=list)   # 去重后首次出现的码
+
+
+def open_capture(source):
+    """打开视频文件或摄像头（纯数字表示摄像头设备号）"""
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    elif not isinstance(source, int) and not os.path.exists(source):
+        raise ValueError(f"视频文件不存在: {source}")
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise ValueError(f"无法打开视频源: {source}")
+    return capture
+
+
+class StreamDecoder:
+    """逐帧解码，维护跟踪区域和去重状态"""
+    def __init__(self, ladder=QRCodeEngine.DEFAULT_LADDER, roi_margin=0.5,
+                 full_scan_interval=10, dedup_seconds=5.0):
+        self.ladder = ladder
+        self.roi_margin = roi_margin                  # 跟踪区域向外扩展的比例（相对码的尺寸）
+        self.full_scan_interval = full_scan_interval  # 跟踪期间每隔多少帧做一次整帧扫描，发现新进入画面的码
+        self.dedup_seconds = dedup_seconds            # 同一内容在该时间内再次出现视为重复
+        self.tracked = []       # 上一帧识别到的码
+        self.last_seen = OrderedDict()  # (类型, 内容) -> 最后出现的流内时间（按时间排序，过期的会被清除）
+        self.since_full_scan = 0
+
+    def roi(self, width, height):
+        """上一帧所有码的外接矩形按比例扩展后的区域(x0, y0, x1, y1)"""
+        points = []
+        for symbol in self.tracked:
+            x, y, w, h = symbol.rect
+            points += list(symbol.polygon) + [(x, y), (x + w, y + h)]
+        x0, y0 = np.min(points, axis=0)
+        x1, y1 = np.max(points, axis=0)
+        margin = int(max(x1 - x0, y1 - y0) * self.roi_margin) + 16
+        return (max(0, int(x0) - margin), max(0, int(y0) - margin),
+                min(width, int(x1) + margin), min(height, int(y1) + margin))
+
+    def decode_frame(self, frame, stats=None) -> list:
+        """解码一帧：先只搜索上一帧码的附近区域，找不到或到了整帧扫描间隔时再扫描整帧"""
+        gray = QRCodeEngine.to_gray(frame)
+        height, width = gray.shape
+        symbols = []
+        if self.tracked and self.since_full_scan < self.full_scan_interval:
+            x0, y0, x1, y1 = self.roi(width, height)
+            symbols = [symbol.translated(x0, y0)
+                       for symbol in QRCodeEngine.decode_array(np.ascontiguousarray(gray[y0:y1, x0:x1]))]
+            if symbols and stats:
+                stats.roi_hits += 1
+            self.since_full_scan += 1
+        if not symbols:
+            symbols = QRCodeEngine.decode_image(gray, self.ladder).symbols
+            self.since_full_scan = 0
+            if stats:
+                stats.full_scans += 1
+        self.tracked = symbols
+        return symbols
+
+    def new_symbols(self, symbols, timestamp) -> list:
+        """返回去重窗口内首次出现的码（持续可见的码只报告一次）"""
+        # 先清除超出去重窗口的内容，长时间运行时内存不随出现过的码数增长
+        while self.last_seen:
+            key, last = next(iter(self.last_seen.items()))
+            if timestamp - last <= self.dedup_seconds:
+                break
+            del self.last_seen[key]
+        new = []
+        for symbol in symbols:
+            key = (symbol.type, symbol.data)
+            if key not in self.last_seen:
+                new.append(symbol)
+            self.last_seen[key] = timestamp
+            self.last_seen.move_to_end(key)
+        return new
+
+
+def iter_stream(source, decoder=None, max_skip=8, stats=None, is_cancelled=None):
+    """读取视频文件或摄像头并逐帧解码，对每个解码的帧生成StreamFrame
+
+    解码速度跟不上帧率时自适应跳帧：按解码耗时的滑动平均估算需要跳过的帧数，
+    跳过的帧只grab不解码像素。max_skip=0表示解码每一帧。
+    """
+    decoder = decoder or StreamDecoder()
+    stats = stats if stats is not None else StreamStats()
+    capture = open_capture(source)
+    is_camera = isinstance(source, int) or (isinstance(source, str) and source.isdigit())
+    fps = capture.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS
+    frame_interval = 1.0 / fps
+
+    start = time.perf_counter()
+    avg_decode = 0.0
+    skip = 0
+    index = -1
+    try:
+        while not (is_cancelled and is_cancelled()):
+            # 跳过的帧只做grab，不解码到像素
+            for _ in range(skip):
+                if not capture.grab():
+                    break
+                index += 1
+                stats.frames_read += 1
+            with metrics.timer('frame_read'):
+                ok, frame = capture.read()
+            if not ok:
+                break
+            index += 1
+            stats.frames_read += 1
+
+            # 文件用帧序号换算流内时间，摄像头用实际时间
+            timestamp = time.perf_counter() - start if is_camera else index * frame_interval
+            decode_start = time.perf_counter()
+            symbols = decoder.decode_frame(frame, stats)
+            elapsed = time.perf_counter() - decode_start
+            metrics.observe('decode_total', elapsed)
+            avg_decode = elapsed if stats.frames_decoded == 0 else avg_decode * 0.8 + elapsed * 0.2
+            skip = min(max_skip, max(0, int(avg_decode / frame_interval)))
+
+            new = decoder.new_symbols(symbols, timestamp)
+            stats.frames_decoded += 1
+            stats.symbols += len(symbols)
+            stats.unique += len(new)
+            stats.elapsed = time.perf_counter() - start
+            yield StreamFrame(index, timestamp, frame, symbols, new)
+    finally:
+        capture.release()
+        stats.elapsed = time.perf_counter() - start
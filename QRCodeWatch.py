@@ -0,0 +1,211 @@
+"""监视目录：发现新写完的图片后自动解码入库（Linux用inotify，其他系统或网络共享用轮询），不依赖GUI"""
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+
+
+# inotify事件掩码（见<sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0o2000000)
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+
+# inotify_event结构的固定部分：wd, mask, cookie, len
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def _load_libc():
+    """加载libc并检查是否提供inotify（非Linux系统返回None）"""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+_libc = _load_libc()
+
+
+def inotify_available() -> bool:
+    return _libc is not None
+
+
+def is_watched_file(name, extensions) -> bool:
+    """是否为需要处理的文件（跳过隐藏文件和上传中的临时文件）"""
+    return not name.startswith('.') and name.lower().endswith(extensions)
+
+
+def scan_directory(directory, extensions, recursive=False):
+    """遍历目录中需要处理的文件（按文件名排序）"""
+    try:
+        entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                if recursive and not entry.name.startswith('.'):
+                    yield from scan_directory(entry.path, extensions, recursive)
+            elif entry.is_file() and is_watched_file(entry.name, extensions):
+                yield entry.path
+        except OSError:
+            continue
+
+
+class PollingWatcher:
+    """轮询监视：每隔interval秒扫描一次目录（适用于inotify收不到远端写入的网络共享）"""
+    def __init__(self, directory, extensions, recursive=False, interval=2.0):
+        self.directory = directory
+        self.extensions = extensions
+        self.recursive = recursive
+        self.interval = interval
+        self.next_scan = 0.0
+
+    def poll(self, timeout):
+        """等待最多timeout秒，返回[(路径, 是否确认已写完)]"""
+        delay = self.next_scan - time.monotonic()
+        if delay > 0:
+            time.sleep(min(delay, timeout))
+            if delay > timeout:
+                return []
+        self.next_scan = time.monotonic() + self.interval
+        return [(path, False) for path in scan_directory(self.directory, self.extensions, self.recursive)]
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """inotify监视（通过ctypes调用libc，不需要第三方库）
+
+    IN_CLOSE_WRITE和IN_MOVED_TO表示文件已写完或已整体移入；事件队列溢出时重新扫描整个目录。
+    """
+    def __init__(self, directory, extensions, recursive=False):
+        if _libc is None:
+            raise ValueError("当前系统不支持inotify")
+        self.directory = directory
+        self.extensions = extensions
+        self.recursive = recursive
+        self.fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise ValueError(f"inotify初始化失败: {os.strerror(ctypes.get_errno())}")
+        self.paths = {}     # 监视描述符 -> 目录
+        self.rescan = []    # 需要整体扫描的目录（启动、新建子目录和队列溢出时）
+        self.add_watch(directory)
+
+    def add_watch(self, directory):
+        wd = _libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error == errno.ENOSPC:
+                raise ValueError("inotify监视数量达到上限，请增大fs.inotify.max_user_watches或使用轮询模式")
+            raise ValueError(f"无法监视目录 {directory}: {os.strerror(error)}")
+        self.paths[wd] = directory
+        self.rescan.append(directory)
+        if self.recursive:
+            for entry in os.scandir(directory):
+                if entry.is_dir(follow_symlinks=False) and not entry.name.startswith('.'):
+                    self.add_watch(entry.path)
+
+    def poll(self, timeout):
+        """等待最多timeout秒，返回[(路径, 是否确认已写完)]"""
+        found = []
+        # 先补上需要整体扫描的目录（先建监视再扫描，两者之间写入的文件不会漏掉）
+        while self.rescan:
+            directory = self.rescan.pop()
+            found += [(path, False) for path in scan_directory(directory, self.extensions)]
+        if found:
+            timeout = 0
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return found
+
+        data = os.read(self.fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                self.rescan = list(self.paths.values())
+                continue
+            directory = self.paths.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:
+                del self.paths[wd]
+                continue
+            if not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if self.recursive and mask & (IN_CREATE | IN_MOVED_TO) and not name.startswith('.'):
+                    self.add_watch(path)
+            elif is_watched_file(name, self.extensions):
+                found.append((path, bool(mask & (IN_CLOSE_WRITE | IN_MOVED_TO))))
+        return found
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def create_watcher(directory, extensions, recursive=False, poll_interval=None):
+    """poll_interval为None时优先使用inotify，不可用时退回每2秒轮询一次"""
+    if poll_interval is None and inotify_available():
+        return InotifyWatcher(directory, extensions, recursive)
+    return PollingWatcher(directory, extensions, recursive, poll_interval or 2.0)
+
+
+class FileSettler:
+    """判断文件是否已写完：收到关闭写入事件，或大小和修改时间持续settle秒不再变化"""
+    def __init__(self, settle=2.0):
+        self.settle = settle
+        self.pending = {}   # 路径 -> (大小, 修改时间, 最近一次变化的时间)
+
+    def __len__(self):
+        return len(self.pending)
+
+    def add(self, path, closed, stat, now):
+        """登记一个可能还在写入的文件，closed表示已确认写完"""
+        key = (stat.st_size, stat.st_mtime_ns)
+        previous = self.pending.get(path)
+        since = previous[2] if previous and previous[:2] == key else now
+        if closed:
+            since = now - self.settle
+        self.pending[path] = key + (since,)
+
+    def ready(self, now):
+        """返回已写完的文件[(路径, 大小, 修改时间)]并从等待列表移除"""
+        done = []
+        for path, (size, mtime_ns, since) in list(self.pending.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self.pending[path]  # 已被删除或移走
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+                self.pending[path] = (stat.st_size, stat.st_mtime_ns, now)
+            elif now - since >= self.settle and size > 0:
+                del self.pending[path]
+                done.append((path, size, mtime_ns))
+        return done
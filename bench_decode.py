@@ -0,0 +1,360 @@
+"""解码基准测试：离线生成确定性的合成图片集（二维码、EAN-13、Code 39，含模糊、噪声、旋转、透视、缩放和多码布局），
+用无界面解码路径逐张解码，报告各阶段耗时分位数、吞吐量、峰值内存和识别率，结果可写入JSON并与基线对比
+
+用法: python bench_decode.py [--corpus bench_corpus] [--per-variant 10] [--json result.json] [--baseline baseline.json]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tracemalloc
+
+import cv2
+import numpy as np
+
+import QRCodeEngine
+import QRCodeMetrics as metrics
+import QRCodeService
+
+try:
+    import resource    # 仅Unix
+except ImportError:
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+# 图片集版本：生成规则改变时递增，避免和旧图片集混用
+CORPUS_VERSION = 1
+
+# EAN-13编码表
+EAN_L = ['0001101', '0011001', '0010011', '0111101', '0100011', '0110001', '0101111', '0111011', '0110111', '0001011']
+EAN_G = ['0100111', '0110011', '0011011', '0100001', '0011101', '0111001', '0000101', '0010001', '0001001', '0010111']
+EAN_R = ['1110010', '1100110', '1101100', '1000010', '1011100', '1001110', '1010000', '1000100', '1001000', '1110100']
+EAN_PARITY = ['LLLLLL', 'LLGLGG', 'LLGGLG', 'LLGGGL', 'LGLLGG', 'LGGLLG', 'LGGGLL', 'LGLGLG', 'LGLGGL', 'LGGLGL']
+
+# Code 39编码表：9个元素（条空交替），1表示宽元素
+CODE39 = {
+    '0': '000110100', '1': '100100001', '2': '001100001', '3': '101100000', '4': '000110001',
+    '5': '100110000', '6': '001110000', '7': '000100101', '8': '100100100', '9': '001100100',
+    'A': '100001001', 'B': '001001001', 'C': '101001000', 'D': '000011001', 'E': '100011000',
+    'F': '001011000', 'G': '000001101', 'H': '100001100', 'I': '001001100', 'J': '000011100',
+    'K': '100000011', 'L': '001000011', 'M': '101000010', 'N': '000010011', 'O': '100010010',
+    'P': '001010010', 'Q': '000000111', 'R': '100000110', 'S': '001000110', 'T': '000010110',
+    'U': '110000001', 'V': '011000001', 'W': '111000000', 'X': '010010001', 'Y': '110010000',
+    'Z': '011010000', '-': '010000101', '.': '110000100', ' ': '011000100', '*': '010010100',
+}
+
+# 失真变体：(名称, 参数)；参数在生成时再加入少量随机抖动
+VARIANTS = {
+    'clean':  {},
+    'small':  {'scale': 0.45},
+    'blur':   {'blur': 1.6},
+    'noise':  {'noise': 18},
+    'rotate': {'rotate': 25},
+    'warp':   {'warp': 0.12},
+    'multi':  {'count': 3},
+    'hard':   {'scale': 0.7, 'blur': 1.0, 'noise': 10, 'rotate': 12, 'warp': 0.06},
+}
+
+SYMBOLOGIES = ('QRCODE', 'EAN13', 'CODE39')
+
+
+def render_qr(payload, module):
+    qr = cv2.QRCodeEncoder.create().encode(payload)
+    return cv2.resize(qr, None, fx=module, fy=module, interpolation=cv2.INTER_NEAREST)
+
+
+def render_bars(bits, module, height):
+    """把0/1条空序列渲染为带静区的灰度条形码"""
+    quiet = 10
+    img = np.full((height + 2 * module * 4, (len(bits) + 2 * quiet) * module), 255, np.uint8)
+    for i, bit in enumerate(bits):
+        if bit == '1':
+            x = (i + quiet) * module
+            img[module * 4:module * 4 + height, x:x + module] = 0
+    return img
+
+
+def ean13_payload(rng) -> str:
+    """随机12位数字加校验位"""
+    digits = [rng.randrange(10) for _ in range(12)]
+    checksum = sum(d * (3 if i % 2 else 1) for i, d in enumerate(digits))
+    digits.append((10 - checksum % 10) % 10)
+    return ''.join(map(str, digits))
+
+
+def render_ean13(payload, module):
+    digits = [int(c) for c in payload]
+    left = ''.join((EAN_L if parity == 'L' else EAN_G)[d] for parity, d in zip(EAN_PARITY[digits[0]], digits[1:7]))
+    right = ''.join(EAN_R[d] for d in digits[7:])
+    return render_bars('101' + left + '01010' + right + '101', module, module * 60)
+
+
+def render_code39(payload, module):
+    """Code 39：宽元素为窄元素的3倍，字符之间用一个窄空分隔"""
+    bits = []
+    for char in '*' + payload + '*':
+        for i, wide in enumerate(CODE39[char]):
+            bits.append(('1' if i % 2 == 0 else '0') * (3 if wide == '1' else 1))
+        bits.append('0')
+    return render_bars(''.join(bits)[:-1], module, module * 50)
+
+
+def render_symbol(symbology, rng):
+    """生成一个码，返回(图像, 内容)"""
+    if symbology == 'QRCODE':
+        payload = f"SF{rng.randrange(10 ** 12):012d}"
+        return render_qr(payload, rng.choice((4, 5, 6))), payload
+    if symbology == 'EAN13':
+        payload = ean13_payload(rng)
+        return render_ean13(payload, rng.choice((2, 3))), payload
+    payload = ''.join(rng.choice('0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(8))
+    return render_code39(payload, rng.choice((2, 3))), payload
+
+
+def distort(img, params, rng, nprng):
+    """按参数依次做缩放、旋转、透视变换、模糊和加噪声"""
+    if params.get('scale'):
+        scale = params['scale'] * rng.uniform(0.9, 1.1)
+        img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    if params.get('rotate'):
+        angle = rng.uniform(-params['rotate'], params['rotate'])
+        h, w = img.shape
+        matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+        cos, sin = abs(matrix[0, 0]), abs(matrix[0, 1])
+        nw, nh = int(h * sin + w * cos), int(h * cos + w * sin)
+        matrix[0, 2] += nw / 2 - w / 2
+        matrix[1, 2] += nh / 2 - h / 2
+        img = cv2.warpAffine(img, matrix, (nw, nh), flags=cv2.INTER_LINEAR, borderValue=255)
+    if params.get('warp'):
+        h, w = img.shape
+        amount = params['warp']
+        src = np.float32([[0, 0], [w, 0], [w, h], [0, h]])
+        dst = np.float32([[x + rng.uniform(-amount, amount) * w, y + rng.uniform(-amount, amount) * h]
+                          for x, y in src])
+        dst -= dst.min(axis=0)
+        size = tuple(int(v) + 1 for v in dst.max(axis=0))
+        img = cv2.warpPerspective(img, cv2.getPerspectiveTransform(src, dst), size,
+                                  flags=cv2.INTER_LINEAR, borderValue=255)
+    if params.get('blur'):
+        img = cv2.GaussianBlur(img, (0, 0), params['blur'] * rng.uniform(0.8, 1.2))
+    if params.get('noise'):
+        noise = nprng.normal(0, params['noise'], img.shape)
+        img = np.clip(img.astype(np.float32) + noise, 0, 255).astype(np.uint8)
+    return img
+
+
+def compose(symbols, rng):
+    """把一个或多个码放到白色画布上（多码时不重叠，按行排列）"""
+    margin = 40
+    width = max(640, sum(img.shape[1] for img in symbols) + margin * (len(symbols) + 1))
+    height = max(480, max(img.shape[0] for img in symbols) + margin * 2)
+    canvas = np.full((height, width), 255, np.uint8)
+    x = margin
+    for img in symbols:
+        h, w = img.shape
+        y = rng.randrange(margin // 2, max(margin // 2 + 1, height - h - margin // 2))
+        canvas[y:y + h, x:x + w] = np.minimum(canvas[y:y + h, x:x + w], img)
+        x += w + margin
+    return canvas
+
+
+def build_corpus(directory, per_variant=10, seed=0):
+    """生成图片集和清单文件（已存在且参数一致时直接复用），返回清单"""
+    manifest_path = os.path.join(directory, 'manifest.json')
+    config = {'version': CORPUS_VERSION, 'per_variant': per_variant, 'seed': seed}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('config') == config:
+            return manifest
+
+    os.makedirs(directory, exist_ok=True)
+    items = []
+    for symbology in SYMBOLOGIES:
+        for variant, params in VARIANTS.items():
+            # 每组使用独立的随机种子，增减其他组不影响这一组的图片
+            group_seed = f"{seed}:{symbology}:{variant}"
+            rng = random.Random(group_seed)
+            nprng = np.random.default_rng(rng.randrange(2 ** 32))
+            for i in range(per_variant):
+                rendered = [render_symbol(symbology, rng) for _ in range(params.get('count', 1))]
+                canvas = compose([img for img, payload in rendered], rng)
+                canvas = distort(canvas, params, rng, nprng)
+                name = f"{symbology.lower()}_{variant}_{i:03d}.png"
+                cv2.imwrite(os.path.join(directory, name), canvas)
+                items.append({'file': name, 'symbology': symbology, 'variant': variant,
+                              'payloads': [payload for img, payload in rendered]})
+
+    manifest = {'config': config, 'items': items}
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    return manifest
+
+
+def percentiles(samples) -> dict:
+    """毫秒为单位的p50/p90/p99和平均值"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000, 3)
+    return {'p50': pick(0.5), 'p90': pick(0.9), 'p99': pick(0.99),
+            'mean': round(sum(ordered) / len(ordered) * 1000, 3)}
+
+
+def peak_rss_mb():
+    """本进程的峰值常驻内存（MB）
+
+    Unix上用ru_maxrss（Linux单位为KB，macOS为字节）；Windows上用psutil的peak_wset；
+    都不可用时退回tracemalloc统计的Python分配峰值（不含OpenCV等原生内存），仍不可用时返回None。
+    """
+    if resource is not None:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return round(getattr(info, 'peak_wset', info.rss) / (1024 * 1024), 1)
+    if tracemalloc.is_tracing():
+        return round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+    return None
+
+
+# 基准中的阶段名 -> 解码路径中的计时阶段（metrics）
+STAGE_TIMERS = {'read': 'file_read', 'imdecode': 'image_decode', 'symbol_decode': 'symbol_decode'}
+
+
+def run_bench(directory, manifest, ladder=QRCodeEngine.DEFAULT_LADDER, repeat=1):
+    """逐张解码图片集：每张图只走一次完整的无界面解码路径，
+    读取、图片解码、码识别各阶段的耗时取自该路径中的计时器（码识别含分辨率阶梯的各次尝试）
+    """
+    stages = {name: [] for name in STAGE_TIMERS}
+    stages['pipeline'] = []
+    groups = {}
+    decoded = 0
+    was_enabled = metrics.is_enabled()
+    metrics.enable(True)
+    if resource is None and psutil is None:
+        tracemalloc.start()
+    QRCodeEngine.get_decoder_chain().stats.reset()
+    start = time.perf_counter()
+    try:
+        for _ in range(repeat):
+            for item in manifest['items']:
+                path = os.path.join(directory, item['file'])
+
+                # 与批处理子进程中执行的完全相同（含分辨率阶梯）
+                metrics.registry.reset()
+                t0 = time.perf_counter()
+                record = QRCodeService.decode_file_record(path, ladder)
+                stages['pipeline'].append(time.perf_counter() - t0)
+                timers = metrics.registry.snapshot()
+                for name, timer in STAGE_TIMERS.items():
+                    stages[name].append(timers.get(timer, {}).get('sum_s', 0.0))
+
+                found = {bytes.fromhex(symbol['data']).decode('utf-8', 'replace') for symbol in record['symbols']}
+                ok = set(item['payloads']) <= found
+                decoded += ok
+                group = groups.setdefault(f"{item['symbology']}/{item['variant']}", [0, 0])
+                group[0] += ok
+                group[1] += 1
+        elapsed = time.perf_counter() - start
+        rss = peak_rss_mb()
+    finally:
+        metrics.enable(was_enabled)
+        metrics.registry.reset()
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+    pipeline_total = sum(stages['pipeline'])
+    total = len(manifest['items']) * repeat
+    return {
+        'images': total,
+        'images_per_s': round(total / pipeline_total, 2) if pipeline_total else 0.0,
+        'decode_rate': round(decoded / total, 4) if total else 0.0,
+        'wall_s': round(elapsed, 2),
+        'peak_rss_mb': rss,
+        'stages_ms': {name: percentiles(samples) for name, samples in stages.items()},
+        'groups': {name: round(ok / count, 3) for name, (ok, count) in sorted(groups.items())},
+        'backends': QRCodeEngine.get_decoder_chain().stats.summary(),
+    }
+
+
+def compare(result, baseline, tolerance):
+    """与基线对比，返回回归项列表（吞吐量下降或耗时上升超过tolerance，识别率下降超过0.5%）"""
+    regressions = []
+    old, new = baseline.get('images_per_s', 0), result['images_per_s']
+    if old and new < old * (1 - tolerance):
+        regressions.append(f"吞吐量 {old} -> {new} 张/秒")
+    if result['decode_rate'] < baseline.get('decode_rate', 0) - 0.005:
+        regressions.append(f"识别率 {baseline['decode_rate']:.2%} -> {result['decode_rate']:.2%}")
+    for stage, stats in result['stages_ms'].items():
+        old_p90 = baseline.get('stages_ms', {}).get(stage, {}).get('p90')
+        if old_p90 and stats.get('p90', 0) > old_p90 * (1 + tolerance):
+            regressions.append(f"{stage} P90 {old_p90} -> {stats['p90']} ms")
+    for group, rate in result['groups'].items():
+        old_rate = baseline.get('groups', {}).get(group)
+        if old_rate is not None and rate < old_rate - 1e-9:
+            regressions.append(f"{group} 识别率 {old_rate:.0%} -> {rate:.0%}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="解码基准测试")
+    parser.add_argument('--corpus', default='bench_corpus', help='合成图片集目录（不存在时生成）')
+    parser.add_argument('--per-variant', type=int, default=10, help='每种码类型、每种失真生成的图片数')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1, help='重复解码整个图片集的次数')
+    parser.add_argument('--ladder', default='4,2,1', help='降分辨率解码阶梯')
+    parser.add_argument('--backends', default='zbar', help='解码后端（逗号分隔）')
+    parser.add_argument('--strategy', default='fallback', choices=QRCodeEngine.STRATEGIES)
+    parser.add_argument('--json', help='把结果写入JSON文件')
+    parser.add_argument('--baseline', help='与该JSON基线对比，有回归时返回非零退出码')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='吞吐量和耗时允许的相对波动')
+    args = parser.parse_args(argv)
+
+    QRCodeEngine.configure_decoders(tuple(v for v in args.backends.split(',') if v), args.strategy)
+    ladder = tuple(int(v) for v in args.ladder.split(',') if v.strip())
+
+    t0 = time.perf_counter()
+    manifest = build_corpus(args.corpus, args.per_variant, args.seed)
+    print(f"图片集: {args.corpus}（{len(manifest['items'])} 张，准备耗时 {time.perf_counter() - t0:.1f} 秒）")
+
+    result = run_bench(args.corpus, manifest, ladder, args.repeat)
+    result['config'] = {'corpus': manifest['config'], 'ladder': list(ladder), 'repeat': args.repeat,
+                        'backends': args.backends, 'strategy': args.strategy,
+                        'python': platform.python_version(), 'opencv': cv2.__version__,
+                        'machine': platform.machine(), 'cpus': os.cpu_count()}
+
+    rss = result['peak_rss_mb']
+    print(f"吞吐量 {result['images_per_s']} 张/秒，识别率 {result['decode_rate']:.1%}，"
+          f"峰值内存 {'未知' if rss is None else f'{rss} MB'}")
+    print(f"{'阶段':<14} {'P50(ms)':>9} {'P90(ms)':>9} {'P99(ms)':>9}")
+    for stage, stats in result['stages_ms'].items():
+        print(f"{stage:<14} {stats['p50']:>9.2f} {stats['p90']:>9.2f} {stats['p99']:>9.2f}")
+    print("分组识别率: " + "，".join(f"{group} {rate:.0%}" for group, rate in result['groups'].items()))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print("与基线相比出现回归:\n  " + "\n  ".join(regressions))
+            return 1
+        print("与基线相比无回归")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
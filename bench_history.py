@@ -0,0 +1,137 @@
+"""历史记录数据库基准测试：对比旧配置（无索引、回滚日志、全表加载）与当前配置的刷新和插入延迟
+
+用法: python bench_history.py [--sizes 10000,100000,1000000] [--json result.json]
+"""
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+
+import QRCodeHistory
+
+
+def make_rows(count, seed=0):
+    """生成确定性的测试记录(timestamp, content, image_path, code_type, is_favorite)"""
+    rng = random.Random(seed)
+    base = 1700000000
+    for i in range(count):
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(base + i * 7))
+        content = f"=== 识别结果 1 ===\n类型: 二维码\n内容:\nSF{rng.randrange(10**12):012d}" + "x" * rng.randrange(120)
+        yield (timestamp, content, f"/scans/{i}.jpg", 'QRCODE', 1 if rng.random() < 0.001 else 0)
+
+
+def populate(conn, count):
+    """在一个事务中写入测试数据"""
+    with conn:
+        conn.executemany(
+            "INSERT INTO history (timestamp, content, image_path, code_type, is_favorite) VALUES (?, ?, ?, ?, ?)",
+            make_rows(count)
+        )
+
+
+def timed(func, repeat):
+    """执行repeat次，返回平均耗时（毫秒）"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def bench_legacy(path, count, inserts):
+    """旧配置：默认回滚日志、无索引、刷新时全表排序并fetchall，每次插入单独提交"""
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            content TEXT,
+            image_path TEXT,
+            code_type TEXT,
+            is_favorite BOOLEAN DEFAULT 0
+        )
+    ''')
+    populate(conn, count)
+
+    def refresh():
+        conn.execute("""
+            SELECT id, timestamp, content, image_path, code_type, is_favorite
+            FROM history
+            ORDER BY is_favorite DESC, timestamp DESC
+        """).fetchall()
+
+    def insert():
+        conn.execute("INSERT INTO history (content, image_path, code_type) VALUES (?, ?, ?)",
+                     ("bench", "", "QRCODE"))
+        conn.commit()
+
+    def by_type():
+        conn.execute("SELECT COUNT(*) FROM history WHERE code_type=? AND timestamp >= ?",
+                     ('QRCODE', '2024-01-01')).fetchone()
+
+    result = {
+        'refresh_ms': timed(refresh, 3),
+        'insert_ms': timed(insert, inserts),
+        'type_filter_ms': timed(by_type, 3),
+    }
+    conn.close()
+    return result
+
+
+def bench_tuned(path, count, inserts):
+    """当前配置：WAL + 调优参数 + 索引，刷新只读取第一页"""
+    store = QRCodeHistory.HistoryStore(path)
+    populate(store.conn, count)
+    store.conn.execute("ANALYZE")
+
+    def refresh():
+        store.list_page(None, 200)
+
+    def insert():
+        store.add_result("bench", "", [])   # 与界面相同的写入路径（无码明细）
+
+    def by_type():
+        store.conn.execute("SELECT COUNT(*) FROM history WHERE code_type=? AND timestamp >= ?",
+                           ('QRCODE', '2024-01-01')).fetchone()
+
+    result = {
+        'refresh_ms': timed(refresh, 20),
+        'insert_ms': timed(insert, inserts),
+        'type_filter_ms': timed(by_type, 3),
+    }
+    store.close()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="历史记录数据库基准测试")
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='测试的记录数（逗号分隔）')
+    parser.add_argument('--inserts', type=int, default=200, help='每种配置测量的单条插入次数')
+    parser.add_argument('--dir', default=None, help='测试数据库所在目录（默认临时目录）')
+    parser.add_argument('--json', help='把结果写入JSON文件')
+    args = parser.parse_args(argv)
+
+    sizes = [int(v) for v in args.sizes.split(',') if v.strip()]
+    results = []
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        print(f"{'记录数':>10} {'配置':>6} {'刷新(ms)':>10} {'插入(ms)':>10} {'类型筛选(ms)':>12}")
+        for size in sizes:
+            for name, bench in (('旧配置', bench_legacy), ('当前', bench_tuned)):
+                path = os.path.join(tmp, f"{name}_{size}.db")
+                result = bench(path, size, args.inserts)
+                result.update(rows=size, profile=name)
+                results.append(result)
+                print(f"{size:>10} {name:>6} {result['refresh_ms']:>10.2f} "
+                      f"{result['insert_ms']:>10.3f} {result['type_filter_ms']:>12.2f}")
+                sys.stdout.flush()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
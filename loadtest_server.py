@@ -0,0 +1,118 @@
+"""HTTP解码服务压力测试：多个并发连接持续POST图片，统计吞吐量、延迟分位数和各状态码（含429）的次数
+
+用法: python loadtest_server.py [--url http://127.0.0.1:8080/decode] [--concurrency 16] [--duration 10] IMAGE [IMAGE ...]
+"""
+import sys
+import json
+import time
+import threading
+import argparse
+import http.client
+from urllib.parse import urlsplit
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class Client(threading.Thread):
+    """一个保持连接的客户端，依次发送图片直到结束时间"""
+    def __init__(self, url, images, deadline, requests, results, lock):
+        super().__init__(daemon=True)
+        self.url = urlsplit(url)
+        self.images = images
+        self.deadline = deadline
+        self.requests = requests
+        self.results = results
+        self.lock = lock
+        self.conn = None
+
+    def connect(self):
+        self.conn = http.client.HTTPConnection(self.url.hostname, self.url.port or 80, timeout=60)
+
+    def run(self):
+        self.connect()
+        sent = 0
+        while time.perf_counter() < self.deadline and (not self.requests or sent < self.requests):
+            data = self.images[sent % len(self.images)]
+            sent += 1
+            start = time.perf_counter()
+            try:
+                self.conn.request('POST', self.url.path or '/decode', body=data,
+                                  headers={'Content-Type': 'application/octet-stream'})
+                response = self.conn.getresponse()
+                body = response.read()
+                code = response.status
+                symbols = len(json.loads(body).get('symbols', [])) if code == 200 else 0
+                if response.will_close:
+                    self.conn.close()
+                    self.connect()
+            except (OSError, http.client.HTTPException):
+                code, symbols = 'error', 0
+                self.conn.close()
+                self.connect()
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.results.append((code, elapsed, symbols))
+            if code == 429:
+                time.sleep(0.05)    # 被拒绝后稍等再试，避免空转
+        self.conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP解码服务压力测试")
+    parser.add_argument('images', nargs='+', help='发送的图片文件（轮流发送）')
+    parser.add_argument('--url', default='http://127.0.0.1:8080/decode')
+    parser.add_argument('--concurrency', type=int, default=16, help='并发连接数')
+    parser.add_argument('--duration', type=float, default=10.0, help='持续时间（秒）')
+    parser.add_argument('--requests', type=int, default=0, help='每个连接发送的请求数（0表示不限，按持续时间结束）')
+    parser.add_argument('--json', help='把结果写入JSON文件')
+    args = parser.parse_args(argv)
+
+    images = []
+    for path in args.images:
+        with open(path, 'rb') as f:
+            images.append(f.read())
+
+    results = []
+    lock = threading.Lock()
+    start = time.perf_counter()
+    clients = [Client(args.url, images, start + args.duration, args.requests, results, lock)
+               for _ in range(args.concurrency)]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - start
+
+    codes = {}
+    for code, _, _ in results:
+        codes[str(code)] = codes.get(str(code), 0) + 1
+    ok = [latency for code, latency, _ in results if code == 200]
+    summary = {
+        'concurrency': args.concurrency,
+        'elapsed': round(elapsed, 2),
+        'requests': len(results),
+        'codes': codes,
+        'decoded_per_sec': round(len(ok) / elapsed, 1) if elapsed > 0 else 0.0,
+        'symbols': sum(symbols for _, _, symbols in results),
+        'p50_ms': round(percentile(ok, 0.5) * 1000, 1),
+        'p90_ms': round(percentile(ok, 0.9) * 1000, 1),
+        'p99_ms': round(percentile(ok, 0.99) * 1000, 1),
+        'max_ms': round(max(ok) * 1000, 1) if ok else 0.0,
+    }
+    print(f"{summary['requests']} 个请求，耗时 {elapsed:.1f} 秒，成功 {len(ok)} 个（{summary['decoded_per_sec']} 个/秒）")
+    print("状态码: " + "，".join(f"{code}: {count}" for code, count in sorted(codes.items())))
+    print(f"成功请求延迟: P50 {summary['p50_ms']} ms，P90 {summary['p90_ms']} ms，"
+          f"P99 {summary['p99_ms']} ms，最大 {summary['max_ms']} ms")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""测试公共配置：模块都在仓库根目录下，直接加入导入路径"""
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import QRCodeHistory
+
+
+def make_symbol(text, type='QRCODE', rect=(10, 20, 30, 40), page=0):
+    """构造写入历史记录所需的码对象（与DecodedSymbol的属性一致）"""
+    x, y, w, h = rect
+    return SimpleNamespace(type=type, data=text.encode('utf-8'), text=text, rect=rect,
+                           polygon=[(x, y), (x + w, y), (x + w, y + h), (x, y + h)],
+                           quality=1, page=page)
+
+
+def make_image(width=1600, height=1200, box=(400, 300, 200, 100)):
+    """黑底上一个白色矩形的BGR图像（测试后端把白色矩形识别为一个码）"""
+    import numpy as np
+    img = np.zeros((height, width, 3), np.uint8)
+    x, y, w, h = box
+    img[y:y + h, x:x + w] = 255
+    return img
+
+
+def bright_box_backend():
+    """测试用解码后端：把亮块的外接矩形当作一个内容为box的码，图像宽度小于min_width时识别不到
+
+    不需要zbar动态库，也不需要真实的二维码图片。
+    """
+    import numpy as np
+    import QRCodeEngine
+
+    class BrightBoxBackend(QRCodeEngine.DecoderBackend):
+        name = 'bright'
+        min_width = 0
+        data = b'box'
+
+        def decode(self, gray):
+            if gray.shape[1] < self.min_width:
+                return []
+            ys, xs = np.nonzero(gray > 128)
+            if not len(xs):
+                return []
+            x, y = int(xs.min()), int(ys.min())
+            w, h = int(xs.max()) - x + 1, int(ys.max()) - y + 1
+            return [QRCodeEngine.DecodedSymbol(type='QRCODE', data=self.data, rect=(x, y, w, h),
+                                               polygon=[(x, y), (x + w, y), (x + w, y + h), (x, y + h)])]
+    return BrightBoxBackend
+
+
+@pytest.fixture
+def bright_chain(monkeypatch):
+    """把全局解码后端替换为测试后端，返回DecoderChain（backend = chain.backends[0]）"""
+    import QRCodeEngine
+    monkeypatch.setitem(QRCodeEngine.BACKENDS, 'bright', bright_box_backend())
+    previous = QRCodeEngine._decoder_chain
+    chain = QRCodeEngine.configure_decoders(('bright',))
+    yield chain
+    QRCodeEngine.set_decoder_chain(previous)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'history.db')
+
+
+@pytest.fixture
+def store(db_path):
+    store = QRCodeHistory.HistoryStore(db_path)
+    yield store
+    store.close()
@@ -0,0 +1,131 @@
+import gzip
+import json
+import os
+
+import QRCodeArchive
+from conftest import make_symbol
+
+
+def record(id, timestamp, content, symbols=()):
+    return {'id': id, 'timestamp': timestamp, 'content': content, 'image_path': f'{id}.png',
+            'code_type': 'QRCODE', 'image_digest': None,
+            'symbols': [{'type': 'QRCODE', 'data': text.encode('utf-8').hex(), 'text': text,
+                         'rect': [0, 0, 1, 1], 'polygon': [[0, 0], [1, 0], [1, 1], [0, 1]],
+                         'quality': 1, 'page': 0} for text in symbols]}
+
+
+def read_ids(path):
+    return [json.loads(line)['id'] for line in QRCodeArchive.iter_archive(path)]
+
+
+def test_append_records_by_month(tmp_path):
+    directory = str(tmp_path / 'archives')
+    months = QRCodeArchive.append_records(directory, [record(1, '2024-01-05 10:00:00', 'a'),
+                                                      record(2, '2024-02-01 00:00:00', 'b')])
+    assert months == ['2024-01', '2024-02']
+    # 再次追加是新的gzip成员，整体仍可按一个文件读取
+    QRCodeArchive.append_records(directory, [record(3, '2024-01-20 00:00:00', 'c')])
+    files = QRCodeArchive.archive_files(directory)
+    assert [month for month, path in files] == ['2024-02', '2024-01']
+    assert read_ids(files[1][1]) == [1, 3]
+
+
+def test_iter_archive_ignores_truncated_member(tmp_path):
+    directory = str(tmp_path)
+    QRCodeArchive.append_records(directory, [record(1, '2024-01-05 10:00:00', 'a')])
+    path = QRCodeArchive.archive_path(directory, '2024-01')
+    tail = gzip.compress(b'{"id": 2}\n')
+    with open(path, 'ab') as f:
+        f.write(tail[:len(tail) // 2])
+    assert read_ids(path) == [1]
+
+
+def test_search_archives(tmp_path):
+    directory = str(tmp_path)
+    QRCodeArchive.append_records(directory, [
+        record(1, '2024-01-01 00:00:00', 'Hello World'),
+        record(2, '2024-01-02 00:00:00', 'say "hi" C:\\path\\file'),
+        record(3, '2024-02-01 00:00:00', 'hello again'),
+        record(4, '2024-02-02 00:00:00', '中文内容'),
+    ])
+    # 中途退出后重复归档的记录只返回一次
+    QRCodeArchive.append_records(directory, [record(1, '2024-01-01 00:00:00', 'Hello World')])
+
+    assert [r['id'] for r in QRCodeArchive.search_archives(directory, 'hello')] == [3, 1]
+    assert [r['id'] for r in QRCodeArchive.search_archives(directory, 'hello world')] == [1]
+    assert [r['id'] for r in QRCodeArchive.search_archives(directory, 'hello', months=['2024-01'])] == [1]
+    assert [r['id'] for r in QRCodeArchive.search_archives(directory, 'hello', limit=1)] == [3]
+    # 引号、反斜杠和非ASCII字符在原始行上经过JSON转义
+    assert [r['id'] for r in QRCodeArchive.search_archives(directory, '"hi"')] == [2]
+    assert [r['id'] for r in QRCodeArchive.search_archives(directory, 'c:\\path')] == [2]
+    assert [r['id'] for r in QRCodeArchive.search_archives(directory, '中文')] == [4]
+    assert len(QRCodeArchive.search_archives(directory, '')) == 4
+    assert QRCodeArchive.search_archives(str(tmp_path / 'missing'), 'x') == []
+
+
+def test_apply_retention_and_restore(store, db_path, tmp_path):
+    ids = [store.add_result(f"record {i}", f"{i}.png", [make_symbol(f"record {i}")]) for i in range(10)]
+    with store.conn:
+        store.conn.executemany("UPDATE history SET timestamp=? WHERE id=?",
+                               [(f"2024-0{1 + i // 5}-0{1 + i % 5} 00:00:00", id) for i, id in enumerate(ids)])
+    store.toggle_favorite_ids(ids[:1])
+    directory = str(tmp_path / 'archives')
+
+    progress = []
+    count, months = QRCodeArchive.apply_retention(db_path, directory, max_rows=3, batch_size=2,
+                                                  progress=lambda done, total: progress.append((done, total)))
+    # 保留最新的3条非收藏记录和收藏记录
+    assert count == 6
+    assert months == ['2024-01', '2024-02']
+    assert progress[-1] == (6, 6)
+    assert sorted(row[0] for row in store.list_page()) == [ids[0]] + ids[7:]
+    assert store.get_info('retention_last_run') is not None
+
+    archived = QRCodeArchive.search_archives(directory, 'record', limit=100)
+    assert sorted(r['id'] for r in archived) == ids[1:7]
+    assert archived[0]['symbols'][0]['text'] == archived[0]['content']
+
+    # 恢复是幂等的：已存在的ID跳过
+    assert QRCodeArchive.restore_records(db_path, archived) == 6
+    assert QRCodeArchive.restore_records(db_path, archived) == 0
+    assert store.count() == 10
+    restored = store.get(ids[1])
+    assert restored[:3] == ('2024-01-02 00:00:00', 'record 1', '1.png')
+    assert store.get_symbols(ids[1])[0][1] == b'record 1'
+    assert ids[1] in store.search_ids('record 1')     # 恢复的记录同步写入全文索引
+
+
+def test_due_retention_uses_saved_policy(store, db_path, tmp_path):
+    directory = str(tmp_path / 'archives')
+    for i in range(5):
+        store.add_result(f"record {i}", "", [make_symbol(f"record {i}")])
+    assert QRCodeArchive.apply_due_retention(db_path, directory) == 0     # 未设置策略
+
+    QRCodeArchive.save_policy(store, 0, 2)
+    assert QRCodeArchive.load_policy(store) == (0, 2)
+    assert QRCodeArchive.apply_due_retention(db_path, directory) == 3
+    assert QRCodeArchive.apply_due_retention(db_path, directory) == 0     # 未到下次归档时间
+    assert store.count() == 2
+    assert os.path.isdir(directory)
+
+
+def test_retention_by_age_keeps_favorites_and_stops_on_cancel(store, db_path, tmp_path):
+    ids = [store.add_result(f"record {i}", "", [make_symbol(f"record {i}")]) for i in range(6)]
+    with store.conn:
+        store.conn.execute("UPDATE history SET timestamp='2000-01-01 00:00:00' WHERE id <= ?", (ids[4],))
+    store.toggle_favorite_ids(ids[:1])
+    directory = str(tmp_path / 'archives')
+
+    # 取消时已归档的批次保留，其余留在数据库中
+    batches = []
+    count, months = QRCodeArchive.apply_retention(db_path, directory, max_age_days=30, batch_size=2,
+                                                  progress=lambda done, total: batches.append(done),
+                                                  is_cancelled=lambda: len(batches) >= 1)
+    assert (count, months) == (2, ['2000-01'])
+    assert store.count() == 4
+
+    count, months = QRCodeArchive.apply_retention(db_path, directory, max_age_days=30)
+    assert count == 2
+    # 收藏记录和未过期的记录不归档
+    assert sorted(row[0] for row in store.list_page()) == [ids[0], ids[5]]
+    assert read_ids(QRCodeArchive.archive_path(directory, '2000-01')) == ids[1:5]
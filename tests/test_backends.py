@@ -0,0 +1,117 @@
+import threading
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('cv2')
+
+import QRCodeEngine
+from conftest import make_image
+
+
+def fake_backend(name, data=None, type='QRCODE', symbologies=None, error=False, wait=None):
+    """返回固定结果的测试后端；wait为threading.Event时先等待它被设置"""
+    class FakeBackend(QRCodeEngine.DecoderBackend):
+        def decode(self, gray):
+            if wait is not None:
+                wait.wait(5)
+            if error:
+                raise RuntimeError("backend failed")
+            if data is None:
+                return []
+            return [QRCodeEngine.DecodedSymbol(type=type, data=data, rect=(0, 0, 1, 1),
+                                               polygon=[(0, 0), (1, 0), (1, 1), (0, 1)])]
+    FakeBackend.name = name
+    FakeBackend.symbologies = symbologies
+    return FakeBackend
+
+
+@pytest.fixture
+def backends(monkeypatch):
+    """注册测试后端，按名称返回后端类的字典"""
+    registered = {}
+
+    def register(name, **kwargs):
+        registered[name] = fake_backend(name, **kwargs)
+        monkeypatch.setitem(QRCodeEngine.BACKENDS, name, registered[name])
+    return register
+
+
+GRAY = np.zeros((10, 10), np.uint8)
+
+
+def test_fallback_uses_first_backend_with_result(backends):
+    backends('broken', error=True)
+    backends('empty')
+    backends('found', data=b'x')
+    backends('unused', data=b'y')
+    chain = QRCodeEngine.DecoderChain(('broken', 'empty', 'found', 'unused'))
+    assert [s.data for s in chain.decode(GRAY)] == [b'x']
+    assert chain.last_backend == 'found'
+    stats = chain.stats.summary()
+    assert stats['broken']['errors'] == 1
+    assert (stats['empty']['calls'], stats['empty']['hits']) == (1, 0)
+    assert stats['found']['wins'] == 1
+    assert 'unused' not in stats
+    assert chain.describe() == "fallback:broken,empty,found,unused"
+
+
+def test_fixed_uses_only_first_backend(backends):
+    backends('empty')
+    backends('found', data=b'x')
+    chain = QRCodeEngine.DecoderChain(('empty', 'found'), 'fixed')
+    assert chain.decode(GRAY) == [] and chain.last_backend == ''
+    assert chain.describe() == "fixed:empty"
+
+
+def test_race_returns_first_non_empty_result(backends):
+    release = threading.Event()
+    backends('slow', data=b'slow', wait=release)
+    backends('empty')
+    backends('fast', data=b'fast')
+    chain = QRCodeEngine.DecoderChain(('slow', 'empty', 'fast'), 'race')
+    try:
+        assert [s.data for s in chain.decode(GRAY)] == [b'fast']
+        assert chain.last_backend == 'fast'
+    finally:
+        release.set()
+    chain.pool.shutdown(wait=True)
+    # 较慢的后端在后台完成后同样计入统计，但不算被采用
+    stats = chain.stats.summary()
+    assert stats['slow']['calls'] == 1 and stats['slow']['wins'] == 0
+    assert stats['fast']['wins'] == 1
+
+
+def test_race_nothing_found(backends):
+    backends('empty')
+    backends('broken', error=True)
+    chain = QRCodeEngine.DecoderChain(('empty', 'broken'), 'race')
+    assert chain.decode(GRAY) == [] and chain.last_backend == ''
+
+
+def test_symbology_routing(backends):
+    backends('qr', data=b'q', symbologies={'QRCODE'})
+    backends('any', data=b'e', type='EAN13')
+    chain = QRCodeEngine.DecoderChain(('qr', 'any'), symbologies=('EAN13',))
+    # 只能识别QR码的后端被跳过
+    assert chain.describe() == "fallback:any"
+    assert [s.type for s in chain.decode(GRAY)] == ['EAN13']
+    # 结果只保留所需的码类型
+    chain = QRCodeEngine.DecoderChain(('any',), symbologies=('QRCODE',))
+    assert chain.decode(GRAY) == []
+    with pytest.raises(ValueError):
+        QRCodeEngine.DecoderChain(('qr',), symbologies=('EAN13',))
+
+
+def test_invalid_configuration():
+    with pytest.raises(ValueError):
+        QRCodeEngine.DecoderChain(('no-such-backend',))
+    with pytest.raises(ValueError):
+        QRCodeEngine.DecoderChain(('zbar',), 'fastest')
+
+
+def test_decode_result_reports_backend_and_cache_tag(bright_chain):
+    result = QRCodeEngine.decode_image(make_image(800, 600, (100, 100, 50, 50)), ladder=(1,))
+    assert result.backend == 'bright'
+    # 非默认后端组合加入缓存键，切换后端后不会命中其他后端的结果
+    assert QRCodeEngine.config_tag((1,)) == "ladder=1;fallback:bright"
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+pytest.importorskip('numpy')
+cv2 = pytest.importorskip('cv2')
+
+import bench_decode
+from conftest import make_image
+
+
+def test_percentiles():
+    assert bench_decode.percentiles([]) == {}
+    stats = bench_decode.percentiles([i / 1000 for i in range(1, 101)])
+    assert stats == {'p50': 51.0, 'p90': 91.0, 'p99': 100.0, 'mean': 50.5}
+
+
+def test_compare_reports_regressions():
+    baseline = {'images_per_s': 100, 'decode_rate': 0.9, 'stages_ms': {'pipeline': {'p90': 10.0}},
+                'groups': {'qrcode/clean': 1.0}}
+    same = {'images_per_s': 95, 'decode_rate': 0.897, 'stages_ms': {'pipeline': {'p90': 10.5}},
+            'groups': {'qrcode/clean': 1.0}}
+    assert bench_decode.compare(same, baseline, 0.1) == []
+    worse = {'images_per_s': 80, 'decode_rate': 0.8, 'stages_ms': {'pipeline': {'p90': 12.0}},
+             'groups': {'qrcode/clean': 0.9}}
+    assert len(bench_decode.compare(worse, baseline, 0.1)) == 4
+
+
+def test_build_corpus_is_deterministic_and_reused(tmp_path):
+    first = bench_decode.build_corpus(str(tmp_path / 'a'), per_variant=1, seed=3)
+    second = bench_decode.build_corpus(str(tmp_path / 'b'), per_variant=1, seed=3)
+    assert first == second
+    assert len(first['items']) == len(bench_decode.SYMBOLOGIES) * len(bench_decode.VARIANTS)
+    name = first['items'][0]['file']
+    assert (tmp_path / 'a' / name).read_bytes() == (tmp_path / 'b' / name).read_bytes()
+
+    # 参数一致时复用已有图片集，不重新生成
+    (tmp_path / 'a' / name).unlink()
+    assert bench_decode.build_corpus(str(tmp_path / 'a'), per_variant=1, seed=3) == first
+    assert not (tmp_path / 'a' / name).exists()
+    with open(tmp_path / 'a' / 'manifest.json', encoding='utf-8') as f:
+        assert json.load(f)['config']['seed'] == 3
+
+
+def test_run_bench_reports_stages_and_groups(bright_chain, tmp_path):
+    items = []
+    for i, box in enumerate([(100, 100, 50, 50), (0, 0, 0, 0)]):
+        name = f'img_{i}.png'
+        cv2.imwrite(str(tmp_path / name), make_image(640, 480, box))
+        items.append({'file': name, 'symbology': 'QRCODE', 'variant': 'clean' if i == 0 else 'blank',
+                      'payloads': ['box']})
+    result = bench_decode.run_bench(str(tmp_path), {'items': items}, ladder=(1,), repeat=2)
+    assert result['images'] == 4
+    assert result['decode_rate'] == 0.5
+    assert result['groups'] == {'QRCODE/blank': 0.0, 'QRCODE/clean': 1.0}
+    assert set(result['stages_ms']) == {'read', 'imdecode', 'symbol_decode', 'pipeline'}
+    assert result['stages_ms']['symbol_decode']['p50'] > 0
+    assert result['backends']['bright']['calls'] == 4
@@ -0,0 +1,73 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+cv2 = pytest.importorskip('cv2')
+
+import QRCodeDocument
+from conftest import make_image
+
+
+def write_tiff(path, boxes):
+    """每个box一页（None为没有码的空白页）"""
+    pages = [cv2.cvtColor(make_image(400, 300, box or (0, 0, 0, 0)), cv2.COLOR_BGR2GRAY) for box in boxes]
+    assert cv2.imwritemulti(path, pages)
+
+
+def test_is_document():
+    assert QRCodeDocument.is_document('scan.TIFF') and QRCodeDocument.is_document('a.pdf')
+    assert not QRCodeDocument.is_document('a.png')
+    assert not QRCodeDocument.is_document(b'bytes.pdf')
+
+
+def test_tiff_pages(bright_chain, tmp_path):
+    path = str(tmp_path / 'scan.tif')
+    write_tiff(path, [(10, 20, 30, 40), None, (100, 50, 60, 60)])
+    assert QRCodeDocument.page_count(path) == 3
+    assert QRCodeDocument.render_page(path, 3).shape == (300, 400)
+
+    progress = []
+    result = QRCodeDocument.decode_document(path, ladder=(1,), workers=2,
+                                            progress=lambda done, total: progress.append((done, total)))
+    assert progress == [(1, 3), (2, 3), (3, 3)]
+    assert result.attempts == 3 and (result.width, result.height) == (400, 300)
+    assert [(s.page, s.rect) for s in result.symbols] == [(1, (10, 20, 30, 40)), (3, (100, 50, 60, 60))]
+
+
+def test_iter_document_cancel_stops_submitting(bright_chain, tmp_path):
+    path = str(tmp_path / 'scan.tif')
+    write_tiff(path, [(10, 10, 20, 20)] * 6)
+    pages = []
+    for result, total in QRCodeDocument.iter_document(path, workers=2, ladder=(1,),
+                                                      is_cancelled=lambda: len(pages) >= 2):
+        pages.append(result.page)
+    assert pages == [1, 2]
+
+
+def test_unreadable_tiff(tmp_path):
+    path = tmp_path / 'broken.tif'
+    path.write_bytes(b'not a tiff')
+    with pytest.raises(ValueError):
+        QRCodeDocument.page_count(str(path))
+
+
+def test_pdf_pages(bright_chain, tmp_path):
+    if QRCodeDocument.pdf_backend() is None:
+        pytest.skip("没有可用的PDF栅格化方式（PyMuPDF或pdftoppm）")
+    fitz = pytest.importorskip('pymupdf')
+    path = str(tmp_path / 'doc.pdf')
+    doc = fitz.open()
+    for box in [(36, 36, 72, 72), None]:
+        page = doc.new_page(width=288, height=216)
+        page.draw_rect(page.rect, color=(0, 0, 0), fill=(0, 0, 0))
+        if box:
+            x, y, w, h = box
+            page.draw_rect(fitz.Rect(x, y, x + w, y + h), color=(1, 1, 1), fill=(1, 1, 1))
+    doc.save(path)
+    doc.close()
+
+    assert QRCodeDocument.page_count(path) == 2
+    result = QRCodeDocument.decode_document(path, dpi=144, ladder=(1,))
+    assert (result.width, result.height) == (576, 432)
+    assert [s.page for s in result.symbols] == [1]
+    x, y, w, h = result.symbols[0].rect
+    assert abs(x - 72) <= 2 and abs(w - 144) <= 2
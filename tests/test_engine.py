@@ -0,0 +1,242 @@
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+cv2 = pytest.importorskip('cv2')
+
+import QRCodeEngine
+from QRCodeEngine import DecodedSymbol, DecodeResult
+from conftest import make_image
+
+
+def symbol(data, rect, type='QRCODE'):
+    x, y, w, h = rect
+    return DecodedSymbol(type=type, data=data, rect=rect,
+                         polygon=[(x, y), (x + w, y), (x + w, y + h), (x, y + h)])
+
+
+def test_symbol_text_and_dict_roundtrip():
+    s = symbol('中文'.encode('utf-8'), (10, 20, 30, 40))
+    assert s.text == '中文'
+    assert symbol(b'\xff\xfe', (0, 0, 1, 1)).text == str(b'\xff\xfe')
+    assert DecodedSymbol.from_dict(s.to_dict()) == s
+    assert s.scaled(2, 3).rect == (20, 60, 60, 120)
+
+
+def test_result_dict_roundtrip():
+    result = DecodeResult(source='a.png', symbols=[symbol(b'x', (1, 2, 3, 4))], width=10, height=20,
+                          elapsed=0.5, ladder_step='1/1', attempts=1, backend='zbar')
+    restored = DecodeResult.from_dict(result.to_dict())
+    assert restored == result
+    assert "x" in result.format_text()
+
+
+def test_decode_image_array_and_file(bright_chain, tmp_path):
+    result = QRCodeEngine.decode_image(make_image(), ladder=(1,))
+    assert result.symbols[0].rect == (400, 300, 200, 100)
+    assert (result.width, result.height) == (1600, 1200)
+    assert result.source == '<ndarray>'
+
+    path = str(tmp_path / 'a.png')
+    cv2.imwrite(path, make_image(800, 600, (100, 100, 50, 50)))
+    result = QRCodeEngine.decode_image(path, ladder=(1,))
+    assert result.source == path
+    assert result.symbols[0].data == b'box'
+
+
+def test_decode_image_unreadable(tmp_path):
+    path = tmp_path / 'broken.png'
+    path.write_bytes(b'not an image')
+    with pytest.raises(ValueError):
+        QRCodeEngine.decode_image(str(path), ladder=(1,))
+
+
+def test_iter_image_files(tmp_path):
+    (tmp_path / 'sub').mkdir()
+    for name in ('b.PNG', 'a.jpg', 'notes.txt', 'sub/c.png'):
+        (tmp_path / name).write_bytes(b'x')
+    names = [p[len(str(tmp_path)) + 1:] for p in QRCodeEngine.iter_image_files(str(tmp_path))]
+    assert names == ['a.jpg', 'b.PNG']
+    names = [p[len(str(tmp_path)) + 1:] for p in QRCodeEngine.iter_image_files(str(tmp_path), recursive=True)]
+    assert names == ['a.jpg', 'b.PNG', os.path.join('sub', 'c.png')]
+
+
+def test_ladder_stops_at_first_hit_and_rescales(bright_chain):
+    result = QRCodeEngine.decode_image(make_image())
+    # 1/4时短边300小于MIN_LADDER_SIDE被跳过，1/2即识别成功
+    assert result.ladder_step == "1/2"
+    assert result.attempts == 1
+    assert (result.width, result.height) == (1600, 1200)
+    assert result.symbols[0].rect == (400, 300, 200, 100)
+    assert result.symbols[0].polygon[2] == (600, 400)
+
+
+def test_ladder_falls_back_to_full_resolution(bright_chain):
+    bright_chain.backends[0].min_width = 1600
+    result = QRCodeEngine.decode_image(make_image())
+    assert result.ladder_step == "1/1"
+    assert result.attempts == 2
+    assert result.symbols[0].rect == (400, 300, 200, 100)
+
+
+def test_ladder_from_encoded_bytes(bright_chain):
+    data = cv2.imencode('.png', make_image(2560, 1920, (800, 640, 400, 320)))[1].tobytes()
+    result = QRCodeEngine.decode_image(data)
+    assert result.ladder_step == "1/4"
+    assert (result.width, result.height) == (2560, 1920)
+    assert result.symbols[0].rect == (800, 640, 400, 320)
+
+    bright_chain.backends[0].min_width = 2560
+    result = QRCodeEngine.decode_image(data)
+    assert result.ladder_step == "1/1"
+    assert result.attempts == 3
+
+
+def test_ladder_nothing_found(bright_chain):
+    result = QRCodeEngine.decode_image(np.zeros((800, 800), np.uint8))
+    assert result.symbols == [] and result.ladder_step == ""
+    assert result.attempts == 2     # 1/4级短边小于MIN_LADDER_SIDE被跳过
+
+
+def test_iter_ladder_skips_small_levels():
+    factors = [factor for factor, gray, w, h in QRCodeEngine.iter_ladder(make_image(1000, 700), (4, 2))]
+    assert factors == [2, 1]     # 总会包含原始分辨率
+
+
+def cached_result(source, text='x' * 100):
+    return DecodeResult(source=source, symbols=[symbol(text.encode('utf-8'), (0, 0, 1, 1))], width=1, height=1)
+
+
+def test_cache_hit_and_miss(bright_chain, tmp_path):
+    cache = QRCodeEngine.DecodeCache(str(tmp_path / 'cache.db'))
+    key = cache.make_key('digest', QRCodeEngine.config_tag((4, 2, 1)))
+    assert cache.get(key) is None
+    cache.put(key, cached_result('a.png'))
+    result = cache.get(key)
+    assert result.cached and result.symbols[0].text == 'x' * 100
+    assert (cache.hits, cache.misses) == (1, 1)
+    # 解码配置不同的结果分开缓存
+    assert cache.get(cache.make_key('digest', QRCodeEngine.config_tag((1,)))) is None
+
+
+def test_cache_lru_eviction_by_entries(tmp_path):
+    cache = QRCodeEngine.DecodeCache(str(tmp_path / 'cache.db'), max_entries=3)
+    for key in 'abc':
+        cache.put(key, cached_result(key))
+    cache.get('a')      # 刷新a的使用时间，b成为最久未使用的
+    cache.put('d', cached_result('d'))
+    assert cache.entries == 3
+    assert cache.get('b') is None
+    assert all(cache.get(key) for key in 'acd')
+
+
+def test_cache_lru_eviction_by_bytes_and_reopen(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = QRCodeEngine.DecodeCache(path, max_bytes=2000)
+    for i in range(10):
+        cache.put(str(i), cached_result(str(i), 'y' * 300))
+    assert cache.total_bytes <= 2000
+    assert cache.get('0') is None and cache.get('9') is not None
+    # 覆盖同一个键不重复计数
+    entries, total = cache.entries, cache.total_bytes
+    cache.put('9', cached_result('9', 'y' * 300))
+    assert (cache.entries, cache.total_bytes) == (entries, total)
+    # 重新打开时从表中恢复计数
+    reopened = QRCodeEngine.DecodeCache(path, max_bytes=2000)
+    assert (reopened.entries, reopened.total_bytes) == (entries, total)
+    reopened.clear()
+    assert reopened.entries == 0 and reopened.get('9') is None
+
+
+def test_decode_with_cache_skips_decoding_on_hit(bright_chain, tmp_path):
+    cache = QRCodeEngine.DecodeCache(str(tmp_path / 'cache.db'))
+    data = cv2.imencode('.png', make_image(800, 600, (100, 100, 50, 50)))[1].tobytes()
+    first = QRCodeEngine.decode_with_cache(data, cache, ladder=(1,))
+    calls = bright_chain.stats.summary()['bright']['calls']
+    second = QRCodeEngine.decode_with_cache(data, cache, ladder=(1,))
+    assert not first.cached and second.cached
+    assert second.symbols == first.symbols
+    assert bright_chain.stats.summary()['bright']['calls'] == calls
+
+
+def test_make_preview_scale():
+    img = make_image(2000, 1000)
+    preview, scale = QRCodeEngine.make_preview(img, 500, 500)
+    assert preview.shape[:2] == (250, 500) and scale == 0.25
+    small = make_image(200, 100)
+    preview, scale = QRCodeEngine.make_preview(small, 500, 500, upscale=False)
+    assert preview is small and scale == 1.0
+    preview, scale = QRCodeEngine.make_preview(small, 400, 400)
+    assert preview.shape[:2] == (200, 400) and scale == 2.0
+
+
+def test_load_for_display_decodes_once(tmp_path):
+    path = str(tmp_path / 'a.png')
+    cv2.imwrite(path, make_image(1200, 800))
+    loaded = QRCodeEngine.load_for_display(path, 600, 600)
+    assert loaded.image.shape[:2] == (800, 1200)
+    assert loaded.preview.shape[:2] == (400, 600) and loaded.scale == 0.5
+    with open(path, 'rb') as f:
+        assert loaded.digest == QRCodeEngine.content_hash(f.read())
+    # 不超过显示区域的图片预览图就是原图本身
+    loaded = QRCodeEngine.load_for_display(path, 2000, 2000)
+    assert loaded.preview is loaded.image and loaded.scale == 1.0
+
+
+def test_format_and_payload_text():
+    result = DecodeResult(source='a.png', symbols=[symbol(b'first', (0, 0, 1, 1)), symbol(b'second', (0, 0, 1, 1))])
+    assert result.payload_text() == "first\nsecond"
+    assert "=== 识别结果 2 ===" in result.format_text() and "second" in result.format_text()
+
+
+def test_iter_tiles_cover_image():
+    boxes = list(QRCodeEngine.iter_tiles(1000, 700, size=400, overlap=100))
+    covered = np.zeros((700, 1000), bool)
+    for x, y, w, h in boxes:
+        assert w <= 400 and h <= 400
+        covered[y:y + h, x:x + w] = True
+    assert covered.all()
+    assert list(QRCodeEngine.iter_tiles(300, 200, size=400, overlap=100)) == [(0, 0, 300, 200)]
+    with pytest.raises(ValueError):
+        list(QRCodeEngine.iter_tiles(1000, 1000, size=100, overlap=100))
+
+
+def test_merge_symbols_dedups_overlapping_copies():
+    full = symbol(b'a', (100, 100, 50, 50))
+    partial = symbol(b'a', (100, 100, 30, 50))     # 分块边缘截断的同一个码
+    elsewhere = symbol(b'a', (500, 10, 50, 50))     # 内容相同但位置不同的另一个码
+    other_type = symbol(b'a', (100, 100, 50, 50), type='CODE128')
+    merged = QRCodeEngine.merge_symbols([partial, elsewhere, full, other_type])
+    # 按阅读顺序排列，截断的副本被去掉
+    assert merged == [elsewhere, full, other_type]
+
+
+def test_decode_tiled_merges_symbol_split_by_tiles(bright_chain):
+    img = make_image(1000, 700, (350, 250, 100, 100))
+    result = QRCodeEngine.decode_tiled(img, QRCodeEngine.TileConfig(size=400, overlap=200, workers=2))
+    assert result.attempts == len(list(QRCodeEngine.iter_tiles(1000, 700, 400, 200)))
+    assert [s.rect for s in result.symbols] == [(350, 250, 100, 100)]
+    assert result.ladder_step.startswith("分块x")
+    assert result.width == 1000 and result.backend == 'bright'
+
+
+def test_decode_tiled_cache_key(bright_chain, tmp_path):
+    tiles = QRCodeEngine.TileConfig(size=400, overlap=200, workers=2)
+    assert QRCodeEngine.config_tag(tiles=tiles).startswith("tile=400,200")
+    cache = QRCodeEngine.DecodeCache(str(tmp_path / 'cache.db'))
+    data = cv2.imencode('.png', make_image(1000, 700, (350, 250, 100, 100)))[1].tobytes()
+    first = QRCodeEngine.decode_with_cache(data, cache, tiles=tiles)
+    # 分块解码和阶梯解码的结果分开缓存
+    assert not QRCodeEngine.decode_with_cache(data, cache, ladder=(1,)).cached
+    second = QRCodeEngine.decode_with_cache(data, cache, tiles=tiles)
+    assert second.cached and second.symbols == first.symbols
+
+
+def test_make_thumbnail():
+    data = QRCodeEngine.make_thumbnail(make_image(1024, 512))
+    thumbnail = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    assert thumbnail.shape[:2] == (128, QRCodeEngine.THUMBNAIL_SIZE)
+    # 小图不放大
+    data = QRCodeEngine.make_thumbnail(make_image(100, 80, (10, 10, 20, 20)))
+    assert cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR).shape[:2] == (80, 100)
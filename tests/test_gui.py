@@ -0,0 +1,203 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+pytest.importorskip('PyQt5.QtWidgets')
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import QRCodeDecoder
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_defers_decoder_modules():
+    # 在新进程中检查（本进程中其他测试已经导入过这些模块）
+    code = ("import sys, QRCodeDecoder; "
+            "print(sorted(m for m in ('cv2', 'numpy', 'pyzbar', 'QRCodeEngine') if m in sys.modules))")
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True,
+                            env=dict(os.environ, QT_QPA_PLATFORM='offscreen'), check=True).stdout
+    assert output.strip() == "[]"
+
+
+def test_lazy_module_loads_once():
+    lazy = QRCodeDecoder.LazyModule('json')
+    assert lazy.load_time is None
+    assert lazy.dumps([1]) == "[1]"
+    assert lazy.load_time is not None
+    assert 'dumps' in vars(lazy)    # 之后直接从实例属性读取
+    assert lazy.load() is sys.modules['json']
+
+
+def test_load_thumbnails_scales_to_icon_size(tmp_path):
+    cv2 = pytest.importorskip('cv2')
+    import QRCodeHistory
+    from conftest import make_image
+
+    db_path = str(tmp_path / 'history.db')
+    QRCodeHistory.HistoryStore(db_path).close()
+    cache = QRCodeHistory.ThumbnailCache(db_path)
+    try:
+        cache.put('wide', cv2.imencode('.jpg', make_image(256, 128))[1].tobytes())
+        cache.put('broken', b'not a jpeg')
+        images = QRCodeDecoder.load_thumbnails(cache, ['wide', 'broken', 'missing'], 48)
+    finally:
+        cache.close()
+    # 无法解码的缩略图不返回，由模型记入无缩略图集合
+    assert set(images) == {'wide'}
+    assert (images['wide'].width(), images['wide'].height()) == (48, 24)
+
+
+@pytest.fixture
+def qapp():
+    from PyQt5.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
+
+
+def label_for(width, height):
+    """内容区域（去掉边距后）为width x height的预览控件"""
+    label = QRCodeDecoder.PreviewLabel()
+    margin = 2 * QRCodeDecoder.PreviewLabel.MARGIN
+    label.resize(width + margin, height + margin)
+    return label
+
+
+def blank_image(width, height):
+    from PyQt5.QtGui import QImage
+    image = QImage(width, height, QImage.Format_RGB32)
+    image.fill(0)
+    return image
+
+
+def test_small_image_is_not_upscaled(qapp):
+    label = label_for(400, 300)
+    label.set_image(blank_image(100, 50))
+    pixmap = label.scaled_pixmap()
+    assert (pixmap.width(), pixmap.height()) == (100, 50)
+    assert list(label.scaled_cache) == [None]
+    # 能完整显示时各种控件尺寸共用原尺寸的图
+    label.resize(600, 500)
+    assert label.scaled_pixmap() is pixmap
+
+    label.set_image(blank_image(100, 50), upscale=True)
+    pixmap = label.scaled_pixmap()
+    assert (pixmap.width(), pixmap.height()) == (580, 290)     # 铺满580 x 480的内容区域
+
+
+def test_large_image_scaled_once_per_size(qapp):
+    label = label_for(400, 300)
+    label.set_image(blank_image(1600, 900))
+    pixmap = label.scaled_pixmap()
+    assert (pixmap.width(), pixmap.height()) == (400, 225)
+    assert label.scaled_pixmap() is pixmap
+    for width in range(300, 1000, 100):
+        label.resize(width, 300)
+        label.scaled_pixmap()
+    assert len(label.scaled_cache) == QRCodeDecoder.PreviewLabel.CACHE_SIZES
+
+
+def test_symbols_drawn_in_display_coordinates(qapp):
+    from PyQt5.QtGui import QColor
+    symbol = QRCodeDecoder.QRCodeEngine.DecodedSymbol(
+        type='QRCODE', data=b'x', rect=(400, 200, 400, 200),
+        polygon=[(400, 200), (800, 200), (800, 400), (400, 400)])
+    label = label_for(400, 300)
+    # 预览图为原图的1/4，标记坐标按原图给出
+    label.set_image(blank_image(400, 150), scale=0.25, symbols=[symbol])
+    image = label.grab().toImage()
+    x0 = QRCodeDecoder.PreviewLabel.MARGIN
+    y0 = QRCodeDecoder.PreviewLabel.MARGIN + (300 - 150) // 2
+    # 标记框的左边在显示坐标(100, 50)处
+    edge = QColor(image.pixel(x0 + 100, y0 + 75))
+    assert edge.green() > 150 and edge.red() < 100
+    assert QColor(image.pixel(x0 + 20, y0 + 20)).green() < 50
+
+
+def run_and_collect(worker):
+    """在当前线程中直接执行QRunnable，收集各信号的参数"""
+    emitted = {}
+    for name in ('progress', 'finished', 'error'):
+        getattr(worker.signals, name).connect(lambda *args, name=name: emitted.setdefault(name, []).append(args))
+    worker.run()
+    return emitted
+
+
+def test_task_worker_progress_cancel_and_error(qapp):
+    def task(total, progress, is_cancelled):
+        done = 0
+        while done < total and not is_cancelled():
+            done += 1
+            progress(done, total)
+        return done
+
+    emitted = run_and_collect(QRCodeDecoder.TaskWorker(task, 3))
+    assert emitted['progress'] == [(1, 3), (2, 3), (3, 3)] and emitted['finished'] == [(3,)]
+
+    worker = QRCodeDecoder.TaskWorker(task, 3)
+    worker.cancel()
+    assert run_and_collect(worker)['finished'] == [(0,)]
+
+    def failing(progress, is_cancelled):
+        raise ValueError("磁盘已满")
+    emitted = run_and_collect(QRCodeDecoder.TaskWorker(failing))
+    assert emitted['error'] == [("磁盘已满",)] and 'finished' not in emitted
+
+
+def test_decode_worker_reports_result_or_nothing_when_cancelled(qapp, bright_chain, tmp_path):
+    cv2 = pytest.importorskip('cv2')
+    from conftest import make_image
+
+    path = str(tmp_path / 'a.png')
+    cv2.imwrite(path, make_image(800, 600, (100, 100, 50, 50)))
+    loaded = QRCodeDecoder.QRCodeEngine.load_for_display(path, 400, 400)
+    emitted = run_and_collect(QRCodeDecoder.DecodeWorker(7, loaded))
+    job_id, result, digest = emitted['finished'][0]
+    assert job_id == 7 and digest == loaded.digest
+    assert result.symbols[0].rect == (100, 100, 50, 50)
+    assert emitted['progress'][-1] == (7, 100, "解码完成")
+
+    worker = QRCodeDecoder.DecodeWorker(8, loaded)
+    worker.signals.progress.connect(lambda *args: worker.cancel())
+    assert 'finished' not in run_and_collect(worker)
+
+
+def test_qimage_to_gray_handles_row_padding_without_copy(qapp):
+    np = pytest.importorskip('numpy')
+    from PyQt5.QtGui import QImage
+
+    # 宽度为奇数时每行按4字节对齐，bytesPerLine大于宽度
+    image = QImage(101, 40, QImage.Format_Grayscale8)
+    image.fill(0)
+    for x in range(10, 30):
+        image.setPixel(x, 5, 0xffffffff)
+    assert image.bytesPerLine() > image.width()
+    gray_image, gray = QRCodeDecoder.qimage_to_gray(image)
+    assert gray.shape == (40, 101)
+    assert gray_image is image      # 已是灰度格式时不转换
+    assert (gray[5, 10:30] == 255).all() and gray[5, 30] == 0 and gray[6].max() == 0
+    # 数组直接引用QImage的内存
+    assert gray.ctypes.data == int(image.constBits())
+
+    rgb = QImage(33, 10, QImage.Format_RGB32)
+    rgb.fill(0xffffffff)
+    gray_image, gray = QRCodeDecoder.qimage_to_gray(rgb)
+    assert gray_image.format() == QImage.Format_Grayscale8 and gray.min() == 255
+
+    with pytest.raises(ValueError):
+        QRCodeDecoder.qimage_to_gray(QImage())
+
+
+def test_clipboard_image_decoded_at_full_resolution(qapp, bright_chain):
+    from PyQt5.QtGui import QImage
+
+    image = QImage(2000, 1500, QImage.Format_RGB32)
+    image.fill(0)
+    for y in range(700, 720):
+        for x in range(1200, 1220):
+            image.setPixel(x, y, 0xffffffff)
+    emitted = run_and_collect(QRCodeDecoder.DecodeWorker(1, image))
+    job_id, result, digest = emitted['finished'][0]
+    assert (result.width, result.height) == (2000, 1500)
+    assert result.symbols[0].rect == (1200, 700, 20, 20)
+    assert digest == ''     # 未启用缓存时不计算哈希
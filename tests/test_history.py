@@ -0,0 +1,397 @@
+import os
+import csv
+import gzip
+import json
+import sqlite3
+import datetime
+import collections
+
+import pytest
+
+import QRCodeHistory
+from conftest import make_symbol
+
+
+# 最早版本（程序内建表）的历史记录结构：有的旧数据库还没有code_type和is_favorite列
+BASELINE_SCHEMAS = {
+    'original': """
+        CREATE TABLE history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            content TEXT,
+            image_path TEXT
+        )
+    """,
+    '1.0.0': """
+        CREATE TABLE history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            content TEXT,
+            image_path TEXT,
+            code_type TEXT,
+            is_favorite BOOLEAN DEFAULT 0
+        )
+    """,
+}
+
+
+def add(store, text, type='QRCODE', image_path='a.png', digest=None):
+    return store.add_result(text, image_path, [make_symbol(text, type)], digest)
+
+
+def set_timestamps(store, timestamps):
+    """按{id: 时间}改写记录时间（CURRENT_TIMESTAMP精度只到秒）"""
+    with store.conn:
+        store.conn.executemany("UPDATE history SET timestamp=? WHERE id=?",
+                               [(timestamp, id) for id, timestamp in timestamps.items()])
+
+
+@pytest.mark.parametrize('schema', sorted(BASELINE_SCHEMAS))
+def test_migrate_from_baseline(db_path, schema):
+    conn = sqlite3.connect(db_path)
+    conn.execute(BASELINE_SCHEMAS[schema])
+    if schema == '1.0.0':
+        conn.execute("CREATE TABLE db_info (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute("INSERT INTO db_info (key, value) VALUES ('version', '1.0.0')")
+    conn.executemany("INSERT INTO history (content, image_path) VALUES (?, ?)",
+                     [("运单号 SF1234567890", "old1.png"), ("https://example.com", "old2.png")])
+    conn.commit()
+    conn.close()
+
+    store = QRCodeHistory.HistoryStore(db_path)
+    try:
+        assert store.get_info('version') == QRCodeHistory.SCHEMA_VERSION
+        columns = {row[1] for row in store.conn.execute("PRAGMA table_info(history)")}
+        assert {'code_type', 'is_favorite', 'image_digest'} <= columns
+        indexes = {row[0] for row in store.conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+        assert {'idx_history_list', 'idx_history_digest', 'idx_symbols_text'} <= indexes
+        tables = {row[0] for row in store.conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        assert {'history_symbols', 'watch_checkpoint', 'thumbnails'} <= tables
+        assert store.conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+
+        # 旧记录保留，迁移后的库可以正常写入
+        assert store.count() == 2
+        assert [row[2] for row in store.list_page()] == ["https://example.com", "运单号 SF1234567890"]
+        add(store, "新记录")
+    finally:
+        store.close()
+
+    # 再次打开时不重复迁移
+    store = QRCodeHistory.HistoryStore(db_path)
+    try:
+        assert store.count() == 3
+    finally:
+        store.close()
+
+
+def test_list_page_keyset(store):
+    ids = [add(store, f"item {i:02d}") for i in range(25)]
+    set_timestamps(store, {id: f"2024-01-{1 + i // 3:02d} 12:00:00" for i, id in enumerate(ids)})
+    with store.conn:
+        store.conn.execute("UPDATE history SET is_favorite=1 WHERE id IN (?, ?)", (ids[3], ids[4]))
+
+    expected = store.list_page(limit=100)
+    assert len(expected) == 25
+    # 收藏在前，其余按时间、ID倒序
+    assert [row[0] for row in expected[:2]] == [ids[4], ids[3]]
+    assert [row[0] for row in expected[2:5]] == [ids[24], ids[23], ids[22]]
+
+    pages, after_key = [], None
+    while True:
+        page = store.list_page(after_key, limit=10)
+        if not page:
+            break
+        pages.extend(page)
+        last = page[-1]
+        after_key = (last[3], last[1], last[0])
+    assert pages == expected
+
+
+def test_list_page_preview(store):
+    add(store, "x" * 500)
+    rows = store.list_page(preview_chars=20)
+    assert len(rows[0][2]) == 20
+
+
+def test_exists_by_image_digest(store):
+    add(store, "payload", digest="d1")
+    assert store.exists("payload", "a.png", "d1")
+    assert not store.exists("payload", "a.png", "d2")
+    assert not store.exists("payload", "b.png", "d1")
+    assert not store.exists("other", "a.png", "d1")
+    assert not store.exists("payload", "a.png", None)
+    plan = " ".join(row[-1] for row in store.conn.execute(
+        "EXPLAIN QUERY PLAN SELECT 1 FROM history WHERE image_digest=? AND image_path=? AND content=?",
+        ("d1", "a.png", "payload")))
+    assert "idx_history_digest" in plan
+
+
+def test_delete_ids(store):
+    ids = [add(store, f"record {i}") for i in range(5)]
+    assert store.delete_ids(ids[:2]) == 2
+    assert store.count() == 3
+    # 码明细同步删除
+    assert store.conn.execute("SELECT COUNT(*) FROM history_symbols").fetchone()[0] == 3
+
+    assert store.delete_ids() == 3
+    assert store.count() == 0
+    assert store.conn.execute("SELECT COUNT(*) FROM history_symbols").fetchone()[0] == 0
+
+    # 清空后删除触发器已恢复
+    new_id = add(store, "again")
+    store.delete_ids([new_id])
+    assert store.conn.execute("SELECT COUNT(*) FROM history_symbols").fetchone()[0] == 0
+
+
+def test_toggle_favorite_ids(store):
+    ids = [add(store, f"record {i}") for i in range(3)]
+    assert store.toggle_favorite_ids(ids[:2]) == 2
+    favorites = {row[0]: row[3] for row in store.list_page()}
+    assert favorites == {ids[0]: 1, ids[1]: 1, ids[2]: 0}
+    assert store.toggle_favorite_ids() == 3
+    favorites = {row[0]: row[3] for row in store.list_page()}
+    assert favorites == {ids[0]: 0, ids[1]: 0, ids[2]: 1}
+
+
+def test_clear_and_reclaim_free_pages(store, db_path):
+    for i in range(200):
+        add(store, f"record {i} " + "x" * 1000)
+    store.clear()
+    assert store.count() == 0
+    assert store.conn.execute("PRAGMA freelist_count").fetchone()[0] > 0
+    progress = []
+    freed = QRCodeHistory.reclaim_free_pages(db_path, progress=lambda done, total: progress.append(done))
+    assert freed > 0 and progress[-1] == freed
+    assert store.conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
+
+
+def read_export(path, fmt, compress):
+    opener = gzip.open if compress else open
+    with opener(path, 'rt', encoding='utf-8', newline='') as f:
+        if fmt == 'csv':
+            rows = list(csv.reader(f))
+            assert rows[0] == ['时间戳', '内容', '类型']
+            return [row[1] for row in rows[1:]]
+        if fmt == 'json':
+            return [item['content'] for item in json.load(f)]
+        return [json.loads(line)['content'] for line in f]
+
+
+@pytest.mark.parametrize('compress', [False, True])
+@pytest.mark.parametrize('fmt', QRCodeHistory.EXPORT_FORMATS)
+def test_export_formats(store, db_path, tmp_path, fmt, compress):
+    contents = ['第一条', 'with "quotes", commas\nand newline', 'EAN']
+    ids = [add(store, text, 'EAN13' if text == 'EAN' else 'QRCODE') for text in contents]
+    set_timestamps(store, {id: f"2024-01-0{i + 1} 00:00:00" for i, id in enumerate(ids)})
+    path = str(tmp_path / f'out.{fmt}')
+
+    progress = []
+    count, max_id = QRCodeHistory.export_history(db_path, path, fmt, compress, chunk_size=2,
+                                                 progress=lambda done, total: progress.append((done, total)))
+    assert (count, max_id) == (3, ids[-1])
+    assert progress[-1] == (3, 3)
+    assert read_export(path, fmt, compress) == contents
+
+    # 增量导出和按码类型筛选
+    assert QRCodeHistory.export_history(db_path, path, fmt, compress, since_id=ids[0]) == (2, ids[-1])
+    assert read_export(path, fmt, compress) == contents[1:]
+    assert QRCodeHistory.export_history(db_path, path, fmt, compress, code_type='EAN13') == (1, ids[-1])
+    assert read_export(path, fmt, compress) == ['EAN']
+
+
+def test_export_cancel_removes_partial_file(store, db_path, tmp_path):
+    add(store, "x")
+    path = tmp_path / 'out.csv'
+    assert QRCodeHistory.export_history(db_path, str(path), is_cancelled=lambda: True) is None
+    assert not path.exists()
+    assert not (tmp_path / 'out.csv.part').exists()
+    with pytest.raises(ValueError):
+        QRCodeHistory.export_history(db_path, str(path), 'xml')
+
+
+def test_search_condition_short_terms_fall_back_to_like(store):
+    if not store.fts_trigram:
+        pytest.skip("SQLite不支持trigram分词")
+    condition, params = store.search_condition("abc de")
+    assert "MATCH" in condition and "LIKE" in condition
+    assert params == ('"abc"', '%de%')
+
+    condition, params = store.search_condition("de")
+    assert "MATCH" not in condition
+
+
+def test_search_results(store):
+    a = add(store, "abc123")
+    b = add(store, "xyz ab")
+    c = add(store, "100%_off")
+    d = add(store, "中文运单号")
+    assert sorted(store.search_ids("ab")) == [a, b]
+    assert store.search_ids("abc") == [a]
+    assert store.search_ids("ab 123") == [a]
+    # LIKE的通配符按字面匹配
+    assert store.search_ids("%_") == [c]
+    assert store.search_ids("运单") == [d]
+    assert store.search_ids('"') == []
+
+
+def test_search_tracks_list_and_delete(store):
+    add(store, "x" * 500)
+    hello = add(store, "hello world")
+    assert [row[2] for row in store.list_page(query="world")] == ["hello world"]
+    # 删除记录时全文索引同步删除（包括清空全部后重建的触发器）
+    store.delete_ids([hello])
+    assert store.search_ids("world") == []
+    store.delete_ids()
+    again = add(store, "world again")
+    assert store.search_ids("world") == [again]
+    store.delete_ids([again])
+    assert store.search_ids("world") == []
+
+
+def test_symbols_and_payload_content(store):
+    symbols = [make_symbol("first", 'QRCODE', (1, 2, 3, 4)), make_symbol("second", 'EAN13', page=2)]
+    id = store.add_result("first\nsecond", "a.png", symbols, "d1")
+    assert store.get(id)[1] == "first\nsecond"
+    rows = store.get_symbols(id)
+    assert [(type, data, rect, page) for type, data, rect, polygon, quality, page in rows] == [
+        ('QRCODE', b'first', (1, 2, 3, 4), 0), ('EAN13', b'second', (10, 20, 30, 40), 2)]
+    assert rows[0][3] == [(1, 2), (4, 2), (4, 6), (1, 6)]
+    add(store, "first")
+    assert store.find_payload("first", limit=1) == [id]
+    assert len(store.find_payload("first")) == 2
+    assert store.symbol_types() == [('QRCODE', 2), ('EAN13', 1)]
+
+
+def test_migrate_formatted_content_to_payloads(db_path):
+    store = QRCodeHistory.HistoryStore(db_path)
+    formatted = "=== 识别结果 1 ===\n类型: QR码\n内容:\nfirst\n\n=== 识别结果 2 ===\n类型: QR码\n内容:\nsecond"
+    id = store.add_result(formatted, "a.png", [make_symbol("first"), make_symbol("second")])
+    old = store.add_result("没有码明细的旧记录", "b.png", [])
+    with store.conn:
+        store.set_info('version', '1.7.0')
+    store.close()
+
+    store = QRCodeHistory.HistoryStore(db_path)
+    try:
+        assert store.get(id)[1] == "first\nsecond"
+        assert store.get(old)[1] == "没有码明细的旧记录"
+        assert store.search_ids("识别结果") == []
+        assert store.search_ids("second") == [id]
+    finally:
+        store.close()
+
+
+def test_backup_defaults_next_to_database(store, db_path, tmp_path):
+    add(store, "backed up")
+    backup_file, removed = QRCodeHistory.backup_database(db_path, keep=2)
+    assert os.path.dirname(backup_file) == str(tmp_path / 'backups')
+    assert removed == []
+    conn = sqlite3.connect(backup_file)
+    try:
+        assert conn.execute("SELECT content FROM history").fetchall() == [("backed up",)]
+    finally:
+        conn.close()
+
+
+def test_backups_in_same_instant_get_unique_names(store, db_path, tmp_path, monkeypatch):
+    class FixedDatetime(datetime.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return cls(2024, 5, 6, 7, 8, 9, 123456)
+    monkeypatch.setattr(datetime, 'datetime', FixedDatetime)
+    files = [QRCodeHistory.backup_database(db_path, keep=3)[0] for _ in range(4)]
+    names = [os.path.basename(path) for path in files]
+    assert names[:2] == ['qrcode_history_20240506_070809_123456.db', 'qrcode_history_20240506_070809_123456_001.db']
+    assert len(set(names)) == 4
+    # 按文件名排序即为创建顺序，轮换删除的是最早的一份
+    remaining = sorted(os.listdir(tmp_path / 'backups'))
+    assert remaining == names[1:]
+    assert not [name for name in remaining if name.endswith('.part')]
+
+
+def test_optimize_legacy_database_vacuums_with_file_temp_store(db_path, monkeypatch):
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE history (id INTEGER PRIMARY KEY, content TEXT)")
+    conn.executemany("INSERT INTO history (content) VALUES (?)", [("x" * 1000,)] * 200)
+    conn.execute("DELETE FROM history WHERE id % 2 = 0")
+    conn.commit()
+    conn.close()
+
+    statements = []
+    connect = QRCodeHistory.connect
+
+    def traced_connect(*args, **kwargs):
+        conn = connect(*args, **kwargs)
+        conn.set_trace_callback(statements.append)
+        return conn
+    monkeypatch.setattr(QRCodeHistory, 'connect', traced_connect)
+
+    freed, vacuumed = QRCodeHistory.optimize_database(db_path)
+    assert vacuumed
+    assert statements.index("PRAGMA temp_store=FILE") < statements.index("VACUUM")
+    conn = sqlite3.connect(db_path)
+    try:
+        assert QRCodeHistory.auto_vacuum_mode(conn) == 2
+        assert conn.execute("SELECT COUNT(*) FROM history").fetchone()[0] == 100
+    finally:
+        conn.close()
+    # 已是增量回收模式时不再VACUUM
+    assert QRCodeHistory.optimize_database(db_path)[1] is False
+
+
+def test_vacuum_space_checks_temp_and_database_dirs(db_path, tmp_path, monkeypatch):
+    sqlite3.connect(db_path).execute("CREATE TABLE t (x)").connection.close()
+    size = os.path.getsize(db_path)
+    temp_dir = tmp_path / 'tmp'
+    temp_dir.mkdir()
+    monkeypatch.setenv('SQLITE_TMPDIR', str(temp_dir))
+    assert QRCodeHistory.vacuum_temp_dir() == str(temp_dir)
+
+    free = {}
+    monkeypatch.setattr(QRCodeHistory.shutil, 'disk_usage',
+                        lambda path: collections.namedtuple('usage', 'free')(free.get(str(path), 0)))
+    # 临时目录和数据库在同一磁盘上，需要两倍数据库大小
+    free[str(temp_dir)] = size * 1.5
+    with pytest.raises(ValueError, match='tmp'):
+        QRCodeHistory.check_vacuum_space(db_path)
+    free[str(temp_dir)] = size * 3
+    QRCodeHistory.check_vacuum_space(db_path)
+
+
+def test_thumbnail_cache_lru(db_path, monkeypatch):
+    store = QRCodeHistory.HistoryStore(db_path)
+    store.close()
+    clock = iter(range(1000))
+    monkeypatch.setattr(QRCodeHistory.time, 'time', lambda: next(clock))
+    cache = QRCodeHistory.ThumbnailCache(db_path, max_bytes=300)
+    try:
+        for digest in 'abc':
+            cache.put(digest, digest.encode() * 100)
+        assert cache.total_bytes == 300
+        assert cache.get_many(['a', 'missing']) == {'a': b'a' * 100}   # 刷新a的使用时间
+        cache.put('d', b'd' * 100)
+        # b成为最久未使用的被淘汰
+        assert not cache.contains('b') and all(cache.contains(digest) for digest in 'acd')
+        assert cache.total_bytes == 300
+        # 覆盖同一个键按新旧大小之差计数
+        cache.put('a', b'a' * 50)
+        assert cache.total_bytes == 250 and cache.get('a') == b'a' * 50
+
+        with cache.conn:
+            cache.conn.execute("DELETE FROM thumbnails")
+        cache.reload_totals()
+        assert cache.total_bytes == 0
+    finally:
+        cache.close()
+
+
+def test_clear_removes_thumbnails(store, db_path):
+    cache = QRCodeHistory.ThumbnailCache(db_path)
+    try:
+        cache.put('d1', b'jpeg')
+        add(store, "x", digest='d1')
+        store.clear()
+        cache.reload_totals()
+        assert not cache.contains('d1') and cache.total_bytes == 0
+    finally:
+        cache.close()
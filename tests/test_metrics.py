@@ -0,0 +1,131 @@
+import json
+
+import pytest
+
+import QRCodeMetrics as metrics
+
+
+@pytest.fixture
+def registry():
+    return metrics.MetricsRegistry()
+
+
+def parse_prometheus(text):
+    """{(指标名, 阶段, le): 值}"""
+    values = {}
+    for line in text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        name, value = line.rsplit(' ', 1)
+        labels = {}
+        if '{' in name:
+            name, label_text = name[:-1].split('{')
+            labels = dict(item.split('=') for item in label_text.split(','))
+            labels = {key: val.strip('"') for key, val in labels.items()}
+        values[(name, labels.get('stage'), labels.get('le'))] = float(value)
+    return values
+
+
+def test_histogram_buckets():
+    histogram = metrics.Histogram()
+    for seconds in (0.0001, 0.0005, 0.003, 0.003, 0.2, 30.0):
+        histogram.observe(seconds)
+    counts = histogram.counts
+    assert len(counts) == len(metrics.BUCKETS) + 1
+    # 桶上界包含等于上界的值（le语义）
+    assert counts[metrics.BUCKETS.index(0.0005)] == 2
+    assert counts[metrics.BUCKETS.index(0.005)] == 2
+    assert counts[metrics.BUCKETS.index(0.25)] == 1
+    assert counts[-1] == 1
+    snapshot = histogram.snapshot()
+    assert snapshot['count'] == 6 and sum(snapshot['buckets']) == 6
+    assert snapshot['window_buckets'] == snapshot['buckets']
+    assert snapshot['max_ms'] == 30000.0
+    assert snapshot['p50_ms'] == 3.0
+
+
+def test_histogram_window_is_bounded():
+    histogram = metrics.Histogram()
+    for _ in range(metrics.WINDOW + 10):
+        histogram.observe(0.001)
+    histogram.observe(1.0)
+    snapshot = histogram.snapshot()
+    assert snapshot['window'] == metrics.WINDOW
+    assert snapshot['count'] == metrics.WINDOW + 11
+    assert sum(snapshot['buckets']) == metrics.WINDOW + 11
+
+
+def test_prometheus_output(registry):
+    for seconds in (0.001, 0.002, 0.5):
+        registry.observe('symbol_decode', seconds)
+    registry.observe('file_read', 20.0)
+    text = registry.to_prometheus()
+    assert text.startswith("# HELP qrcode_stage_seconds")
+    assert "# TYPE qrcode_stage_seconds histogram" in text
+    values = parse_prometheus(text)
+
+    bucket = 'qrcode_stage_seconds_bucket'
+    assert values[(bucket, 'symbol_decode', '0.001')] == 1
+    assert values[(bucket, 'symbol_decode', '0.0025')] == 2
+    assert values[(bucket, 'symbol_decode', '0.5')] == 3
+    assert values[(bucket, 'symbol_decode', '+Inf')] == 3
+    assert values[(bucket, 'file_read', '10.0')] == 0
+    assert values[(bucket, 'file_read', '+Inf')] == 1
+    assert values[('qrcode_stage_seconds_count', 'symbol_decode', None)] == 3
+    assert values[('qrcode_stage_seconds_sum', 'symbol_decode', None)] == pytest.approx(0.503)
+    # 桶计数单调不减
+    for stage in ('symbol_decode', 'file_read'):
+        counts = [values[(bucket, stage, le)] for le in [repr(b) for b in metrics.BUCKETS] + ['+Inf']]
+        assert counts == sorted(counts)
+
+
+def test_dump_formats(registry, tmp_path):
+    registry.observe('decode_total', 0.01)
+    registry.dump(str(tmp_path / 'metrics.prom'))
+    registry.dump(str(tmp_path / 'metrics.json'))
+    assert 'qrcode_stage_seconds_count{stage="decode_total"} 1' in (tmp_path / 'metrics.prom').read_text('utf-8')
+    data = json.loads((tmp_path / 'metrics.json').read_text('utf-8'))
+    assert data['stages']['decode_total']['count'] == 1
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_drain_and_merge(registry):
+    child = metrics.MetricsRegistry()
+    child.observe('symbol_decode', 0.01)
+    child.observe('symbol_decode', 0.02)
+    child.observe('file_read', 0.001)
+    samples = child.drain()
+    assert samples == {'symbol_decode': [0.01, 0.02], 'file_read': [0.001]}
+    assert child.drain() == {}
+
+    registry.observe('symbol_decode', 0.03)
+    registry.merge(json.loads(json.dumps(samples)))     # 经过进程间序列化
+    snapshot = registry.snapshot()
+    assert snapshot['symbol_decode']['count'] == 3
+    assert snapshot['symbol_decode']['sum_s'] == pytest.approx(0.06)
+    assert snapshot['file_read']['count'] == 1
+
+
+def test_timer_disabled_is_shared_null(monkeypatch):
+    monkeypatch.setattr(metrics, '_enabled', False)
+    assert metrics.timer('a') is metrics.timer('b')
+    monkeypatch.setattr(metrics, 'registry', metrics.MetricsRegistry())
+    metrics.enable()
+    with metrics.timer('stage'):
+        pass
+    metrics.observe('other', 0.5)
+    assert set(metrics.registry.snapshot()) == {'stage', 'other'}
+
+
+def test_service_metrics_roundtrip(monkeypatch):
+    QRCodeService = pytest.importorskip('QRCodeService')
+    monkeypatch.setattr(metrics, 'registry', metrics.MetricsRegistry())
+    monkeypatch.setattr(QRCodeService, '_collect_metrics', True)
+    metrics.registry.observe('symbol_decode', 0.01)
+    # 子进程：样本随结果带出，本地统计清空
+    record = QRCodeService.attach_metrics({'symbols': []})
+    assert record['metrics'] == {'symbol_decode': [0.01]}
+    assert metrics.registry.snapshot() == {}
+    # 主进程：并入统计，结果中不再带metrics字段
+    assert QRCodeService.merge_metrics(record) == {'symbols': []}
+    assert metrics.registry.snapshot()['symbol_decode']['count'] == 1
@@ -0,0 +1,118 @@
+import json
+import time
+import threading
+import http.client
+import multiprocessing
+
+import pytest
+
+cv2 = pytest.importorskip('cv2')
+
+import QRCodeServer
+from conftest import make_image
+
+# 子进程继承主进程中替换好的测试后端（fork）
+pytestmark = pytest.mark.skipif(multiprocessing.get_start_method() != 'fork',
+                                reason="测试后端只能通过fork传给子进程")
+
+SLOW_SECONDS = 1.5
+
+
+def png(width, height=300):
+    return cv2.imencode('.png', make_image(width, height, (50, 50, 100, 100)))[1].tobytes()
+
+
+@pytest.fixture
+def server(bright_chain, tmp_path):
+    """一个进程、不排队（只有1个名额）、超时0.5秒的服务；宽度超过500的图片解码需要SLOW_SECONDS秒"""
+    backend = bright_chain.backends[0]
+    decode = backend.decode
+
+    def slow_decode(gray):
+        if gray.shape[1] > 500:
+            time.sleep(SLOW_SECONDS)
+        return decode(gray)
+    backend.decode = slow_decode
+
+    server = QRCodeServer.DecodeServer(('127.0.0.1', 0), workers=1, max_queue=0, ladder=(1,),
+                                       history_path=str(tmp_path / 'history.db'), timeout=0.5)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def request(server, method, path, body=None, headers=None):
+    conn = http.client.HTTPConnection(*server.server_address, timeout=10)
+    try:
+        conn.request(method, path, body=body, headers=headers or {})
+        response = conn.getresponse()
+        data = response.read()
+        content_type = response.getheader('Content-Type', '')
+        return response.status, json.loads(data) if 'json' in content_type else data.decode('utf-8'), response
+    finally:
+        conn.close()
+
+
+def wait_for(condition, deadline=10.0):
+    """等待条件成立（响应计数在响应发出后才更新，名额在解码结束后才释放）"""
+    end = time.monotonic() + deadline
+    while not condition() and time.monotonic() < end:
+        time.sleep(0.02)
+    assert condition()
+
+
+def test_decode_and_save(server):
+    status, body, _ = request(server, 'POST', '/decode', png(400), {'X-Source': 'scanner-1'})
+    assert status == 200
+    assert [symbol['rect'] for symbol in body['symbols']] == [[50, 50, 100, 100]]
+    assert body['history_id'] == 1
+    assert server.store.get(1)[1:3] == ('box', 'scanner-1')
+
+
+def test_timeout_keeps_slot_until_decode_finishes(server):
+    start = time.monotonic()
+    status, body, _ = request(server, 'POST', '/decode', png(800))
+    assert status == 504 and time.monotonic() - start < SLOW_SECONDS
+    # 子进程仍在解码，名额没有释放，新请求立即被拒绝
+    status, body, response = request(server, 'POST', '/decode', png(400))
+    assert status == 429 and response.getheader('Retry-After') == '1'
+    wait_for(lambda: server.health()['responses'] == {'429': 1, '504': 1})
+    wait_for(lambda: server.health()['active'] == 0)
+    status, body, _ = request(server, 'POST', '/decode', png(400))
+    assert status == 200
+
+
+def test_full_server_rejects_concurrent_request(server):
+    results = []
+    slow = threading.Thread(target=lambda: results.append(request(server, 'POST', '/decode', png(800))[0]))
+    slow.start()
+    wait_for(lambda: server.health()['active'] == 1)
+    # 连接可以复用：429时请求体已被读出丢弃
+    conn = http.client.HTTPConnection(*server.server_address, timeout=10)
+    try:
+        for _ in range(2):
+            conn.request('POST', '/decode', body=png(400))
+            response = conn.getresponse()
+            response.read()
+            assert response.status == 429
+    finally:
+        conn.close()
+    slow.join()
+    assert results == [504]
+
+
+def test_request_validation(server):
+    assert request(server, 'POST', '/other', b'x')[0] == 404
+    assert request(server, 'POST', '/decode', b'')[0] == 413
+    server.max_bytes = 10
+    assert request(server, 'POST', '/decode', png(400))[0] == 413
+    server.max_bytes = QRCodeServer.DEFAULT_MAX_BYTES
+    status, body, _ = request(server, 'POST', '/decode', b'not an image')
+    assert status == 422 and body['error']
+    status, body, _ = request(server, 'GET', '/health')
+    assert status == 200 and body['capacity'] == 1 and body['decoders'] == 'fallback:bright'
+    status, text, _ = request(server, 'GET', '/metrics')
+    assert 'qrcode_http_capacity 1' in text
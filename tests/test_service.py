@@ -0,0 +1,44 @@
+import io
+import json
+import multiprocessing
+
+import pytest
+
+cv2 = pytest.importorskip('cv2')
+
+import QRCodeService
+from conftest import make_image
+
+# 子进程继承主进程中替换好的测试后端（fork）
+pytestmark = pytest.mark.skipif(multiprocessing.get_start_method() != 'fork',
+                                reason="测试后端只能通过fork传给子进程")
+
+
+def write_images(directory, count):
+    directory.mkdir(exist_ok=True)
+    for i in range(count):
+        box = (50, 50, 100, 100) if i % 2 == 0 else (0, 0, 0, 0)    # 奇数张为空白图
+        cv2.imwrite(str(directory / f'{i:02d}.png'), make_image(400, 400, box))
+    (directory / 'broken.png').write_bytes(b'not an image')
+    (directory / 'notes.txt').write_text('skip')
+
+
+def test_run_batch_outputs_ndjson(bright_chain, tmp_path):
+    write_images(tmp_path / 'scans', 6)
+    out, err = io.StringIO(), io.StringIO()
+    stats = QRCodeService.run_batch(str(tmp_path / 'scans'), workers=2, out=out, err=err, ladder=(1,))
+
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert len(records) == 7
+    assert [r['source'].rsplit('/', 1)[-1] for r in records] == [f'{i:02d}.png' for i in range(6)] + ['broken.png']
+    assert records[0]['symbols'][0]['text'] == 'box'
+    assert records[0]['symbols'][0]['rect'] == [50, 50, 100, 100]
+    assert records[1]['symbols'] == []
+    assert records[-1]['error']
+    assert (stats['files'], stats['decoded'], stats['symbols'], stats['errors']) == (7, 3, 3, 1)
+    assert "已处理 7 个文件" in err.getvalue()
+
+
+def test_run_batch_missing_directory(tmp_path):
+    with pytest.raises(ValueError):
+        QRCodeService.run_batch(str(tmp_path / 'missing'))
@@ -0,0 +1,61 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+cv2 = pytest.importorskip('cv2')
+
+import QRCodeStream
+from conftest import make_image, make_symbol
+
+
+def test_new_symbols_dedup_window():
+    decoder = QRCodeStream.StreamDecoder(dedup_seconds=5.0)
+    a, b = make_symbol("a"), make_symbol("b")
+    assert decoder.new_symbols([a], 0.0) == [a]
+    # 持续可见的码只报告一次，每次出现都会刷新最后出现时间
+    assert decoder.new_symbols([a, b], 4.0) == [b]
+    assert decoder.new_symbols([a], 8.5) == []
+    # 超出去重窗口后再次出现视为新码，过期的内容被清除
+    assert decoder.new_symbols([], 14.0) == []
+    assert list(decoder.last_seen) == []
+    assert decoder.new_symbols([b], 14.5) == [b]
+    # 类型不同的相同内容分开去重
+    assert decoder.new_symbols([make_symbol("b", 'EAN13')], 15.0) != []
+
+
+def test_decode_frame_tracks_roi(bright_chain):
+    decoder = QRCodeStream.StreamDecoder(ladder=(1,), full_scan_interval=2)
+    stats = QRCodeStream.StreamStats()
+    frame = make_image(800, 600, (100, 100, 50, 50))
+    for _ in range(4):
+        symbols = decoder.decode_frame(frame, stats)
+        # 在跟踪区域中识别到的码坐标换算回整帧
+        assert symbols[0].rect == (100, 100, 50, 50)
+    # 第1帧整帧扫描，之后两帧在跟踪区域中找到，到了间隔再整帧扫描一次
+    assert (stats.full_scans, stats.roi_hits) == (2, 2)
+    # 码离开跟踪区域时退回整帧扫描
+    symbols = decoder.decode_frame(make_image(800, 600, (600, 400, 50, 50)), stats)
+    assert symbols[0].rect == (600, 400, 50, 50)
+    assert stats.full_scans == 3
+
+
+def test_iter_stream_video_file(bright_chain, tmp_path):
+    path = str(tmp_path / 'clip.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10.0, (320, 240))
+    if not writer.isOpened():
+        pytest.skip("OpenCV不支持写入MJPG视频")
+    for i in range(20):
+        # 前10帧是同一个码，之后画面为空
+        writer.write(make_image(320, 240, (100, 80, 60, 60)) if i < 10 else make_image(320, 240, (0, 0, 0, 0)))
+    writer.release()
+
+    stats = QRCodeStream.StreamStats()
+    frames = list(QRCodeStream.iter_stream(path, QRCodeStream.StreamDecoder(ladder=(1,)), max_skip=0, stats=stats))
+    assert [frame.index for frame in frames] == list(range(20))
+    assert frames[1].time == pytest.approx(0.1)
+    assert sum(len(frame.new_symbols) for frame in frames) == stats.unique == 1
+    assert stats.frames_read == stats.frames_decoded == 20
+
+
+def test_open_capture_missing_file(tmp_path):
+    with pytest.raises(ValueError):
+        QRCodeStream.open_capture(str(tmp_path / 'missing.avi'))
@@ -0,0 +1,128 @@
+import os
+
+import pytest
+
+import QRCodeHistory
+import QRCodeWatch
+from conftest import make_symbol
+
+
+def write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+    return os.stat(path)
+
+
+def test_settler_waits_until_stable(tmp_path):
+    path = str(tmp_path / 'a.png')
+    stat = write(path, b'1234')
+    settler = QRCodeWatch.FileSettler(settle=2.0)
+    settler.add(path, False, stat, now=100.0)
+    assert len(settler) == 1
+    assert settler.ready(101.0) == []
+
+    # 大小变化后重新计时
+    write(path, b'12345678')
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert settler.ready(101.5) == []
+    assert settler.ready(103.0) == []
+    stat = os.stat(path)
+    assert settler.ready(103.5) == [(path, 8, stat.st_mtime_ns)]
+    assert len(settler) == 0
+
+
+def test_settler_close_write_is_ready_immediately(tmp_path):
+    path = str(tmp_path / 'a.png')
+    stat = write(path, b'data')
+    settler = QRCodeWatch.FileSettler(settle=2.0)
+    settler.add(path, True, stat, now=50.0)
+    assert settler.ready(50.0) == [(path, 4, stat.st_mtime_ns)]
+
+
+def test_settler_skips_empty_and_deleted_files(tmp_path):
+    empty = str(tmp_path / 'empty.png')
+    gone = str(tmp_path / 'gone.png')
+    settler = QRCodeWatch.FileSettler(settle=1.0)
+    settler.add(empty, True, write(empty, b''), now=0.0)
+    settler.add(gone, False, write(gone, b'x'), now=0.0)
+    os.remove(gone)
+    assert settler.ready(10.0) == []
+    assert len(settler) == 1     # 空文件继续等待写入
+
+
+def test_settler_repeated_events_keep_start_time(tmp_path):
+    path = str(tmp_path / 'a.png')
+    stat = write(path, b'data')
+    settler = QRCodeWatch.FileSettler(settle=2.0)
+    settler.add(path, False, stat, now=0.0)
+    settler.add(path, False, stat, now=1.5)    # 内容未变的重复事件
+    assert settler.ready(2.0) == [(path, 4, stat.st_mtime_ns)]
+
+
+def test_scan_directory_filters_extensions(tmp_path):
+    (tmp_path / 'sub').mkdir()
+    for name in ('a.png', 'b.JPG', 'c.txt', 'sub/d.png'):
+        write(str(tmp_path / name), b'x')
+    found = {os.path.relpath(path, tmp_path) for path in
+             QRCodeWatch.scan_directory(str(tmp_path), ('.png', '.jpg'))}
+    assert found == {'a.png', 'b.JPG'}
+    found = {os.path.relpath(path, tmp_path) for path in
+             QRCodeWatch.scan_directory(str(tmp_path), ('.png', '.jpg'), recursive=True)}
+    assert found == {'a.png', 'b.JPG', os.path.join('sub', 'd.png')}
+
+
+def test_checkpoint_survives_restart(store, db_path, tmp_path):
+    directory = str(tmp_path)
+    decoded, failed = os.path.join(directory, 'a.png'), os.path.join(directory, 'b.png')
+    store.add_results([("code", decoded, [make_symbol("code")])],
+                      [(decoded, 10, 1000), (failed, 20, 2000)])
+    store.close()
+
+    reopened = QRCodeHistory.HistoryStore(db_path)
+    try:
+        done = reopened.watch_checkpoints(directory)
+        assert done == {decoded: (10, 1000), failed: (20, 2000)}
+        # 文件被改写后记录新的检查点
+        reopened.add_results([], [(failed, 30, 3000)])
+        assert reopened.watch_checkpoints(directory)[failed] == (30, 3000)
+        assert reopened.count() == 1
+    finally:
+        reopened.close()
+
+
+def test_watch_checkpoints_by_directory_prefix(store, tmp_path):
+    directory = tmp_path / 'scans'
+    inside = str(directory / 'a.png')
+    sibling = str(tmp_path / 'scans2' / 'b.png')
+    ids = store.add_results([("code", inside, [make_symbol("code")])],
+                            [(inside, 10, 100), (sibling, 20, 200)])
+    assert len(ids) == 1
+    # 名称以目录名开头的相邻目录不算在内
+    assert store.watch_checkpoints(str(directory)) == {inside: (10, 100)}
+    history_id = store.conn.execute("SELECT history_id FROM watch_checkpoint WHERE path=?",
+                                    (inside,)).fetchone()[0]
+    assert history_id == ids[0]
+
+
+def test_polling_watcher_rescans_after_interval(tmp_path):
+    write(str(tmp_path / 'a.png'), b'x')
+    watcher = QRCodeWatch.PollingWatcher(str(tmp_path), ('.png',), interval=60.0)
+    assert watcher.poll(0) == [(str(tmp_path / 'a.png'), False)]
+    # 未到下次扫描时间时只等待timeout秒
+    assert watcher.poll(0.01) == []
+
+
+@pytest.mark.skipif(not QRCodeWatch.inotify_available(), reason="当前系统不支持inotify")
+def test_inotify_watcher_reports_close_write(tmp_path):
+    write(str(tmp_path / 'old.png'), b'x')
+    watcher = QRCodeWatch.InotifyWatcher(str(tmp_path), ('.png',))
+    try:
+        # 启动时先扫描已有文件
+        assert watcher.poll(0) == [(str(tmp_path / 'old.png'), False)]
+        write(str(tmp_path / 'new.png'), b'data')
+        write(str(tmp_path / '.hidden.png'), b'data')
+        events = watcher.poll(1.0)
+        assert (str(tmp_path / 'new.png'), True) in events
+        assert all(not os.path.basename(path).startswith('.') for path, closed in events)
+    finally:
+        watcher.close()